@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+
+
+class AssetCache:
+    """
+    A persistent store for page assets (stylesheets, images, fonts) shared between snapshots.
+
+    Asset bodies are stored content-addressed in `<cache_dir>/blobs/<sha256>`, so the same
+    logo served under several URLs is stored once. An index maps each URL to its blob and
+    to the validators (ETag, Last-Modified) needed for conditional requests. Least recently
+    used assets are evicted once the blobs exceed `max_bytes`.
+
+    Blobs are written outside the lock of the index, so storing a large asset does not
+    block lookups of other threads.
+
+    Attributes:
+    ----------
+    cache_dir : str or None
+        Directory of the cache. The cache is disabled while it is None.
+    max_bytes : int
+        Size budget for all stored blobs.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, cache_dir=None, max_bytes=200 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = {}
+        self._dirty = False
+        self.cache_dir = None
+        self.set_cache_dir(cache_dir)
+
+    @property
+    def enabled(self):
+        return self.cache_dir is not None
+
+    def set_cache_dir(self, cache_dir):
+        """Switch the cache to another directory (None disables it) and load its index."""
+        with self._lock:
+            self._flush()
+            self.cache_dir = cache_dir
+            self._index = {}
+            if cache_dir:
+                try:
+                    with open(os.path.join(cache_dir, self.INDEX_FILE), 'r', encoding='utf-8') as f:
+                        self._index = json.load(f)
+                except (OSError, ValueError):
+                    self._index = {}
+
+    def lookup(self, url):
+        """Return the index entry for `url` if its blob is still present, else None."""
+        with self._lock:
+            if not self.enabled:
+                return None
+            entry = self._index.get(url)
+            if entry and os.path.exists(self._blob_path(entry["hash"])):
+                return dict(entry)
+            return None
+
+    def is_fresh(self, entry):
+        """True if the entry may be used without asking the server (Cache-Control max-age)."""
+        return entry.get("expires", 0) > time.time()
+
+    def conditional_headers(self, entry):
+        """Request headers to revalidate the entry with a conditional GET."""
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, entry):
+        """Return the stored body of the entry, or None if the blob vanished."""
+        try:
+            with open(self._blob_path(entry["hash"]), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        self._touch(entry)
+        return content
+
+    def link_into(self, entry, directory):
+        """
+        Hard-link the entry's blob into `directory` (or copy it where links are not possible)
+        and return the new path, or None if the blob vanished. The new file stays valid when
+        the cache evicts the blob or is cleared.
+        """
+        target = os.path.join(directory, uuid.uuid4().hex)
+        with self._lock:
+            if not self.enabled:
+                return None
+            blob_path = self._blob_path(entry["hash"])
+            try:
+                os.link(blob_path, target)
+                linked = True
+            except OSError:
+                linked = False
+        if not linked:
+            try:
+                shutil.copyfile(blob_path, target)
+            except OSError:
+                if os.path.exists(target):
+                    os.remove(target)
+                return None
+        self._touch(entry)
+        return target
+
+    def _touch(self, entry):
+        with self._lock:
+            if entry["url"] in self._index:
+                self._index[entry["url"]]["last_used"] = time.time()
+                self._dirty = True
+
+    def revalidated(self, entry, headers):
+        """
+        Refresh validators and freshness of an entry after a 304 Not Modified response.
+        A 304 may leave out headers (RFC 7232), those keep their stored values.
+        """
+        validators = self._validators(headers)
+        if "Cache-Control" not in headers:
+            del validators["expires"]
+        with self._lock:
+            stored = self._index.get(entry["url"])
+            if stored:
+                stored.update((name, value) for name, value in validators.items() if value is not None)
+                stored["last_used"] = time.time()
+                self._dirty = True
+
+    def store(self, url, content, headers, encoding):
+        """Store a freshly downloaded asset, unless the server forbids it."""
+        self._store(url, hashlib.sha256(content).hexdigest(), len(content), lambda f: f.write(content),
+                    headers, encoding)
+
+    def store_file(self, url, path, digest, headers, encoding):
+        """Like store, for an asset downloaded into the file `path` with the given SHA-256."""
+        def copy(f):
+            with open(path, 'rb') as source:
+                shutil.copyfileobj(source, f)
+
+        self._store(url, digest, os.path.getsize(path), copy, headers, encoding)
+
+    def _store(self, url, digest, size, write, headers, encoding):
+        if not self.enabled or "no-store" in headers.get("Cache-Control", "").lower():
+            return
+        with self._lock:
+            cache_dir = self.cache_dir
+            blob_path = self._blob_path(digest) if cache_dir else None
+        if blob_path is None:
+            return
+        # The body is written outside the lock, only the rename and the index update hold it
+        tmp_path = None
+        if not os.path.exists(blob_path):
+            tmp_path = blob_path + f".{uuid.uuid4().hex}.tmp"
+            try:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                with open(tmp_path, 'wb') as f:
+                    write(f)
+            except OSError as e:
+                print(f"asset_cache.store: Failed to store asset {url}. Error: {e}")
+                self._remove_file(tmp_path)
+                return
+        entry = {
+            "url": url,
+            "hash": digest,
+            "size": size,
+            "content_type": headers.get("Content-Type"),
+            "encoding": encoding,
+            "last_used": time.time(),
+        }
+        entry.update(self._validators(headers))
+        with self._lock:
+            if self.cache_dir != cache_dir:
+                # The cache moved to another directory meanwhile
+                self._remove_file(tmp_path)
+                return
+            try:
+                if tmp_path is not None:
+                    os.replace(tmp_path, blob_path)
+            except OSError as e:
+                print(f"asset_cache.store: Failed to store asset {url}. Error: {e}")
+                self._remove_file(tmp_path)
+                return
+            self._index[url] = entry
+            self._dirty = True
+            self._evict()
+
+    def flush(self):
+        """Write the index to disk if it changed."""
+        with self._lock:
+            self._flush()
+
+    def clear(self):
+        """Remove all cached assets."""
+        with self._lock:
+            if self.cache_dir:
+                for entry in self._index.values():
+                    self._remove_blob(entry["hash"])
+            self._index = {}
+            self._dirty = True
+            self._flush()
+
+    def _validators(self, headers):
+        validators = {
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "expires": 0,
+        }
+        cache_control = headers.get("Cache-Control", "").lower()
+        max_age = re.search(r'max-age=(\d+)', cache_control)
+        if max_age and "no-cache" not in cache_control:
+            validators["expires"] = time.time() + int(max_age.group(1))
+        return validators
+
+    def _blob_path(self, digest):
+        return os.path.join(self.cache_dir, "blobs", digest)
+
+    def _evict(self):
+        # Blobs can be shared between URLs, so the budget is counted per blob
+        blob_sizes = {}
+        references = Counter()
+        for entry in self._index.values():
+            blob_sizes[entry["hash"]] = entry["size"]
+            references[entry["hash"]] += 1
+        total = sum(blob_sizes.values())
+        if total <= self.max_bytes:
+            return
+        for entry in sorted(self._index.values(), key=lambda e: e["last_used"]):
+            if total <= self.max_bytes:
+                break
+            del self._index[entry["url"]]
+            references[entry["hash"]] -= 1
+            if references[entry["hash"]] == 0:
+                self._remove_blob(entry["hash"])
+                total -= entry["size"]
+
+    def _remove_blob(self, digest):
+        self._remove_file(self._blob_path(digest))
+
+    def _remove_file(self, path):
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _flush(self):
+        if not self.cache_dir or not self._dirty:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+            with open(index_path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(index_path + ".tmp", index_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"asset_cache.flush: Failed to write index. Error: {e}")
+
+
+# Shared instance, the GUI points it to the working folder
+asset_cache = AssetCache()
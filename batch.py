@@ -0,0 +1,304 @@
+"""
+Headless batch mode: generate job applications for a list of job ad URLs without the GUI.
+
+Usage:
+    python batch.py urls.txt [--working-folder DIR] [--template TEMPLATE.dotx] [--instructions TEXT]
+
+The URLs file contains one URL per line, empty lines and lines starting with '#' are ignored.
+Every URL runs through the stages fetch -> prompt -> generate -> snapshot -> document. The
+stages overlap: while one ad waits for ChatGPT, the next ones are already being fetched.
+Each stage has its own concurrency limit. A JSON report with the status and the stage
+timings of every URL is written to the working folder, the trace of every URL (see
+tracing.py) is appended to .traces.jsonl in the working folder.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from asset_cache import asset_cache
+from content_compactor import DEFAULT_TOKEN_BUDGET
+from job_application_generator import generate_job_application
+from page_cache import page_cache
+from response_cache import response_cache
+from fetch_policy import fetch_policy
+from html_document import configure_parser
+from frame_capture import configure_frames
+from tracing import DEFAULT_TRACE_FILE, Trace, activate, append_jsonl, span
+from utils import (load_settings, extract_job_ad_from_url, build_prompt, build_job_query,
+                   extract_meta_information, build_output_filename)
+from webpage_saver import save_webpage
+from snapshot_archive import DEFAULT_FORMAT, SNAPSHOT_FORMATS
+
+STAGES = ("fetch", "prompt", "generate", "snapshot", "document")
+DEFAULT_CONCURRENCY = {"fetch": 2, "prompt": 1, "generate": 3, "snapshot": 2, "document": 1}
+
+
+class BatchJob:
+    """State and results of one URL in a batch run."""
+
+    def __init__(self, index, url):
+        self.index = index
+        self.url = url
+        self.status = "pending"
+        self.error = None
+        self.warnings = []
+        self.timings = {}
+        self.files = {}
+        self.tokens = None
+        self.job_ad_content = None
+        self.prompt = None
+        self.job_application = None
+        self.basename = None
+        self.started = None
+        self.finished = None
+        self.trace = Trace("batch", url=url)
+        self.done = threading.Event()
+
+    def to_dict(self):
+        return {
+            "url": self.url,
+            "status": self.status,
+            "error": self.error,
+            "warnings": self.warnings,
+            "timings": {stage: round(seconds, 3) for stage, seconds in self.timings.items()},
+            "total": round(self.finished - self.started, 3) if self.started and self.finished else None,
+            "files": self.files,
+            "job_ad_tokens": self.tokens,
+        }
+
+
+class BatchPipeline:
+    """
+    Runs BatchJobs through the stages, every stage on its own thread pool.
+
+    A job is handed to the next stage as soon as its current stage is finished, so
+    different jobs are in different stages at the same time.
+    """
+
+    def __init__(self, job_query, working_folder, word_template=None, concurrency=None,
+                 token_budget=DEFAULT_TOKEN_BUDGET, force=False, snapshot_format=DEFAULT_FORMAT):
+        self.job_query = job_query
+        self.force = force
+        self.working_folder = working_folder
+        self.word_template = word_template
+        self.token_budget = token_budget
+        self.snapshot_format = snapshot_format
+        concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        self.executors = {
+            stage: ThreadPoolExecutor(max_workers=concurrency[stage], thread_name_prefix=f"batch_{stage}")
+            for stage in STAGES
+        }
+        # File names used by the jobs of this run, see _claim_basename
+        self._basenames = set()
+        self._basenames_lock = threading.Lock()
+
+    def run(self, urls):
+        """Process all URLs and return the list of finished BatchJobs."""
+        jobs = [BatchJob(index, url) for index, url in enumerate(urls, start=1)]
+        try:
+            for job in jobs:
+                job.started = time.monotonic()
+                self._submit(job, STAGES[0])
+            for job in jobs:
+                job.done.wait()
+        finally:
+            for executor in self.executors.values():
+                executor.shutdown(wait=True)
+        return jobs
+
+    def _submit(self, job, stage):
+        self.executors[stage].submit(self._run_stage, job, stage)
+
+    def _run_stage(self, job, stage):
+        job.status = stage
+        start = time.monotonic()
+        try:
+            with activate(job.trace):
+                getattr(self, f"_stage_{stage}")(job)
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{stage}: {e}"
+            print(f"batch._run_stage: [{job.index}] {stage} failed for {job.url}. Error: {e}")
+        finally:
+            job.timings[stage] = time.monotonic() - start
+
+        next_index = STAGES.index(stage) + 1
+        if job.status != "failed" and next_index < len(STAGES):
+            self._submit(job, STAGES[next_index])
+        else:
+            if job.status != "failed":
+                job.status = "done"
+            job.finished = time.monotonic()
+            job.trace.finish(status=job.status)
+            print(f"batch._run_stage: [{job.index}] {job.status} after {job.finished - job.started:.1f}s: {job.url}")
+            job.done.set()
+
+    def _stage_fetch(self, job):
+        job.job_ad_content, _, compaction_stats = extract_job_ad_from_url(job.url, self.token_budget)
+        job.tokens = {"before": compaction_stats["tokens_before"], "after": compaction_stats["tokens_after"]}
+
+    def _stage_prompt(self, job):
+        with span("prompt") as prompt_span:
+            job.prompt = build_prompt(self.job_query, job.job_ad_content, job.url)
+            prompt_span.add(bytes=len(job.prompt.encode("utf-8")))
+
+    def _stage_generate(self, job):
+        job.job_application = generate_job_application(job.prompt, force=self.force)
+        company_name, job_title = extract_meta_information(job.job_application)
+        if company_name and job_title:
+            basename = build_output_filename(company_name, job_title, extension="")
+        else:
+            job.warnings.append("Company name and job title not found in the response.")
+            basename = f"bewerbung_{datetime.now():%Y%m%d}_{job.index}"
+        job.basename = self._claim_basename(job, basename)
+
+        text_path = os.path.join(self.working_folder, f"{job.basename}.txt")
+        with open(text_path, 'w', encoding='utf-8') as f:
+            f.write(job.job_application)
+        job.files["text"] = text_path
+
+    def _claim_basename(self, job, basename):
+        """Return `basename`, or with a number appended if another job of this run already uses it."""
+        with self._basenames_lock:
+            claimed = basename
+            number = 2
+            while claimed.casefold() in self._basenames:
+                claimed = f"{basename}_{number}"
+                number += 1
+            self._basenames.add(claimed.casefold())
+        if claimed != basename:
+            job.warnings.append(f"Another URL of this batch produced the file name {basename}, saved as {claimed}.")
+        return claimed
+
+    def _stage_snapshot(self, job):
+        snapshot_path = os.path.join(self.working_folder, f"{job.basename}{SNAPSHOT_FORMATS[self.snapshot_format]}")
+        success, error = save_webpage(job.url, snapshot_path, snapshot_format=self.snapshot_format)
+        if success:
+            job.files["snapshot"] = snapshot_path
+        else:
+            # The application itself is still usable without the snapshot
+            job.warnings.append(f"Snapshot failed: {error}")
+
+    def _stage_document(self, job):
+        if not self.word_template:
+            return
+        docx_path = os.path.join(self.working_folder, f"{job.basename}.docx")
+        if os.path.exists(docx_path):
+            job.warnings.append(f"Word document {docx_path} already exists, not overwritten.")
+            return
+        # Imported here, Word automation is not available on every platform
+        from word_document import create_word_document
+        success, error = create_word_document(self.word_template, docx_path, job.job_application)
+        if success:
+            job.files["document"] = docx_path
+        else:
+            job.warnings.append(error)
+
+
+def read_urls(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith('#')]
+
+
+def write_report(jobs, report_path, wall_time):
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "wall_time": round(wall_time, 3),
+        "succeeded": sum(1 for job in jobs if job.status == "done"),
+        "failed": sum(1 for job in jobs if job.status == "failed"),
+        "jobs": [job.to_dict() for job in jobs],
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n{'#':>3}  {'status':<7}" + "".join(f"{stage:>10}" for stage in STAGES) + "  url")
+    for job in jobs:
+        timings = "".join(
+            f"{job.timings[stage]:>9.1f}s" if stage in job.timings else f"{'-':>10}" for stage in STAGES
+        )
+        print(f"{job.index:>3}  {job.status:<7}{timings}  {job.url}")
+    # The spans of all URLs in one table
+    combined = Trace("batch", urls=len(jobs))
+    for job in jobs:
+        for job_span in job.trace.spans:
+            combined.add(job_span)
+    combined.duration = wall_time
+    print("\n" + combined.summary())
+
+    print(f"\nbatch.write_report: {report['succeeded']} succeeded, {report['failed']} failed "
+          f"in {wall_time:.1f}s. Report written to {report_path}")
+
+
+def main(argv=None):
+    settings = load_settings()
+    parser = argparse.ArgumentParser(description="Generate job applications for a list of job ad URLs.")
+    parser.add_argument("urls_file", help="Text file with one job ad URL per line.")
+    parser.add_argument("--working-folder", default=settings.get("working_folder"),
+                        help="Folder for the generated files (default: working folder from settings.json).")
+    parser.add_argument("--template", default=settings.get("word_template"),
+                        help="Word template with the [BEWERBUNGSTEXT] placeholder (default: from settings.json).")
+    parser.add_argument("--instructions", default="", help="Additional instructions for all applications.")
+    parser.add_argument("--token-budget", type=int, default=settings.get("token_budget", DEFAULT_TOKEN_BUDGET),
+                        help="Maximum tokens of job ad content per prompt, 0 for no limit (default: %(default)s).")
+    parser.add_argument("--snapshot-format", choices=list(SNAPSHOT_FORMATS),
+                        default=settings.get("snapshot_format", DEFAULT_FORMAT),
+                        help="Format of the page snapshot (default: %(default)s).")
+    parser.add_argument("--force", action="store_true", help="Ignore cached ChatGPT responses and send new requests.")
+    parser.add_argument("--report", help="Path of the JSON report (default: batch_report_<timestamp>.json in the working folder).")
+    parser.add_argument("--trace-file", default=settings.get("trace_file"),
+                        help=f"JSONL file the traces are appended to (default: {DEFAULT_TRACE_FILE} in the working folder).")
+    for stage in STAGES:
+        parser.add_argument(f"--{stage}-workers", type=int, default=DEFAULT_CONCURRENCY[stage],
+                            help=f"Concurrency of the {stage} stage (default: {DEFAULT_CONCURRENCY[stage]}).")
+    args = parser.parse_args(argv)
+
+    if not args.working_folder or not os.path.isdir(args.working_folder):
+        parser.error("A valid working folder is required (--working-folder or settings.json).")
+
+    if args.snapshot_format not in SNAPSHOT_FORMATS:
+        parser.error(f"Unknown snapshot format '{args.snapshot_format}' in settings.json.")
+
+    urls = read_urls(args.urls_file)
+    if not urls:
+        parser.error(f"No URLs found in {args.urls_file}.")
+
+    page_cache.set_disk_dir(os.path.join(args.working_folder, ".page_cache"))
+    asset_cache.set_cache_dir(os.path.join(args.working_folder, ".asset_cache"))
+    response_cache.set_cache_dir(os.path.join(args.working_folder, ".response_cache"))
+    fetch_policy.set_cache_dir(os.path.join(args.working_folder, ".fetch_policy"))
+    fetch_policy.enabled = settings.get("static_fetch", True)
+    try:
+        configure_parser(settings.get("html_parser"))
+        configure_frames(max_depth=settings.get("iframe_max_depth"), allow=settings.get("iframe_allow"),
+                         deny=settings.get("iframe_deny"))
+    except ValueError as e:
+        parser.error(str(e))
+
+    concurrency = {stage: getattr(args, f"{stage}_workers") for stage in STAGES}
+    pipeline = BatchPipeline(build_job_query(settings.get("job_query", ""), args.instructions),
+                             args.working_folder, args.template, concurrency, args.token_budget, args.force,
+                             args.snapshot_format)
+
+    print(f"batch.main: Processing {len(urls)} URLs with concurrency {concurrency}")
+    start = time.monotonic()
+    jobs = pipeline.run(urls)
+    report_path = args.report or os.path.join(args.working_folder, f"batch_report_{datetime.now():%Y%m%d_%H%M%S}.json")
+    write_report(jobs, report_path, time.monotonic() - start)
+    trace_file = args.trace_file or os.path.join(args.working_folder, DEFAULT_TRACE_FILE)
+    for job in jobs:
+        append_jsonl(job.trace, trace_file)
+    fetch_policy.report()
+    return 0 if all(job.status == "done" for job in jobs) else 1
+
+
+if __name__ == "__main__":
+    # Needed for the PDF process pool in the PyInstaller build
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Offline benchmarks: a local job portal stand-in, an OpenAI stub and the benchmark runner."""
@@ -0,0 +1,193 @@
+"""
+A local stand-in for job portals.
+
+FixtureServer serves generated job ads on 127.0.0.1, so the benchmarks need no network:
+    /static.html    server-rendered ad with JobPosting JSON-LD (static fast path)
+    /spa.html       app shell that renders the ad with JavaScript (needs the browser)
+    /iframes.html   ad in an iframe that contains another iframe
+    /heavy.html     many stylesheets with @import and url() images, large images and a repeated logo
+    /pdf.html       short page that links the ad as a multi-page PDF
+Assets are served with an ETag and answer conditional requests with 304. `latency` adds
+a delay to every response.
+"""
+import hashlib
+import random
+import struct
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SCENARIOS = ("static", "spa", "iframes", "heavy", "pdf")
+
+AD_PARAGRAPHS = [
+    "Die Muster AG ist ein führender Anbieter von Softwarelösungen für die Logistikbranche.",
+    "Zur Verstärkung unseres Teams in Zürich suchen wir per sofort oder nach Vereinbarung eine/n",
+    "Softwareentwickler/in Python (80-100%)",
+    "Ihre Aufgaben: Sie entwickeln und betreiben Webanwendungen und Schnittstellen, arbeiten eng mit "
+    "dem Produktmanagement zusammen und übernehmen Verantwortung für Qualität und Betrieb.",
+    "Ihr Profil: Abgeschlossenes Studium in Informatik oder vergleichbare Ausbildung, mehrjährige "
+    "Erfahrung mit Python, SQL und Cloud-Plattformen, gute Deutsch- und Englischkenntnisse.",
+    "Wir bieten: Flexible Arbeitszeiten, Homeoffice, moderne Infrastruktur und ein motiviertes Team.",
+    "Interessiert? Wir freuen uns auf Ihre Bewerbung an jobs@muster.example.",
+]
+
+
+def ad_html(repeat=4):
+    """The text of the job ad as HTML paragraphs."""
+    return "".join(f"<p>{paragraph}</p>" for paragraph in AD_PARAGRAPHS * repeat)
+
+
+def page(body, head=""):
+    return (f'<!DOCTYPE html><html lang="de"><head><meta charset="utf-8"><title>Stelle</title>{head}</head>'
+            f'<body>{body}</body></html>')
+
+
+def png_image(size, seed=0):
+    """A PNG of roughly `size` bytes. The pixels are random, so it does not compress; a different seed gives a different image."""
+    rng = random.Random(f"{seed}:{size}")
+    width = 256
+    height = max(1, size // (width * 3))
+    rows = b"".join(b"\x00" + bytes(rng.getrandbits(8) for _ in range(width * 3)) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 0)) + chunk(b"IEND", b"")
+
+
+def pdf_document(pages):
+    """A PDF with `pages` pages of ad text."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    page_ids = []
+    for number in range(pages):
+        lines = [f"Seite {number + 1}"] + [p.encode("latin-1", "replace").decode("latin-1") for p in AD_PARAGRAPHS]
+        text = " ".join(f"({line.replace('(', '[').replace(')', ']')}) Tj T*" for line in lines)
+        stream = f"BT /F1 9 Tf 12 TL 40 800 Td {text} ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        content_id = len(objects)
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>")
+        page_ids.append(len(objects))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] /Count {pages} >>"
+
+    output = b"%PDF-1.4\n"
+    offsets = []
+    for number, content in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{content}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    output += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return output
+
+
+def build_routes():
+    """Return a dict path -> (content type, body bytes)."""
+    html = "text/html; charset=utf-8"
+    routes = {}
+    json_ld = ('<script type="application/ld+json">{"@context": "https://schema.org", "@type": "JobPosting", '
+               '"title": "Softwareentwickler/in Python"}</script>')
+    routes["/static.html"] = (html, page(f"<main><h1>Softwareentwickler/in</h1>{ad_html()}</main>", json_ld))
+
+    escaped_ad = ad_html().replace('"', '\\"')
+    routes["/spa.html"] = (html, page(
+        '<div id="root"></div><noscript>Bitte aktivieren Sie JavaScript.</noscript>'
+        f'<script>setTimeout(function () {{ document.getElementById("root").innerHTML = "{escaped_ad}"; }}, 200);</script>'))
+
+    routes["/iframes.html"] = (html, page('<h1>Stellenangebot</h1><iframe src="/frames/outer.html"></iframe>'))
+    routes["/frames/outer.html"] = (html, page(f'{ad_html(2)}<iframe src="/frames/inner.html"></iframe>'))
+    routes["/frames/inner.html"] = (html, page(f"<h2>Benefits</h2>{ad_html(1)}"))
+
+    stylesheets = ""
+    for number in range(10):
+        routes[f"/css/{number}.css"] = ("text/css", (
+            f'@import url("/css/{number}-base.css") screen;\n'
+            + "".join(f".logo-{number}-{i} {{ background: url(/img/bg-{number}-{i}.png); }}\n" for i in range(5))
+        ))
+        routes[f"/css/{number}-base.css"] = ("text/css", f"/* base {number} */ body {{ margin: {number}px; }}\n")
+        for i in range(5):
+            routes[f"/img/bg-{number}-{i}.png"] = ("image/png", png_image(20 * 1024, f"bg-{number}-{i}"))
+        stylesheets += f'<link rel="stylesheet" href="/css/{number}.css">'
+    images = ""
+    for number in range(30):
+        routes[f"/img/photo-{number}.png"] = ("image/png", png_image(100 * 1024, f"photo-{number}"))
+        images += f'<img src="/img/photo-{number}.png" alt="Foto {number}">'
+    # Portals repeat small images (logos, icons) in every job card
+    routes["/img/logo.png"] = ("image/png", png_image(8 * 1024, "logo"))
+    images += '<img src="/img/logo.png" alt="Logo">' * 20
+    routes["/heavy.html"] = (html, page(f"<main>{ad_html()}{images}</main>", stylesheets))
+
+    routes["/files/stelle.pdf"] = ("application/pdf", pdf_document(30))
+    routes["/pdf.html"] = (html, page('<h1>Stellenangebot</h1><p>Details im PDF:</p><a href="/files/stelle.pdf">Inserat (PDF)</a>'))
+
+    return {path: (content_type, body.encode("utf-8") if isinstance(body, str) else body)
+            for path, (content_type, body) in routes.items()}
+
+
+class FixtureServer:
+    """
+    Serves the fixtures on a free port of 127.0.0.1 in a background thread.
+
+    Usage:
+        with FixtureServer(latency=0.05) as server:
+            url = server.url("static")
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.routes = build_routes()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fixture_server", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def url(self, scenario):
+        return f"{self.base_url}/{scenario}.html"
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                route = server.routes.get(self.path.split("?")[0])
+                if route is None:
+                    self.send_error(404)
+                    return
+                content_type, body = route
+                etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
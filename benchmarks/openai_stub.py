@@ -0,0 +1,115 @@
+"""
+An OpenAI compatible chat completions endpoint for the benchmarks.
+
+OpenAIStub answers POST /v1/chat/completions with a fixed job application, streamed
+(server-sent events) or in one response. `first_token_latency` delays the first chunk,
+`tokens_per_second` paces the following ones, so the generate stage takes a known time.
+The letter contains the TSV line the metadata stage looks for.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPONSE_TEXT = (
+    "Sehr geehrte Damen und Herren\n\n"
+    "Mit grossem Interesse habe ich Ihr Inserat als Softwareentwickler/in Python gelesen. "
+    "In meiner bisherigen Tätigkeit habe ich Webanwendungen entwickelt und betrieben und dabei "
+    "eng mit Produktmanagement und Betrieb zusammengearbeitet.\n\n"
+    "Gerne überzeuge ich Sie in einem persönlichen Gespräch.\n\n"
+    "Freundliche Grüsse\n\n"
+    "01.01.2025\tMuster AG\tZürich\tSoftwareentwickler Python\thttps://jobs.example/stelle\n"
+)
+
+
+class OpenAIStub:
+    """
+    Serves the stub on a free port of 127.0.0.1 in a background thread.
+
+    Usage:
+        with OpenAIStub(first_token_latency=0.5, tokens_per_second=50) as stub:
+            api_base = stub.api_base
+    """
+
+    def __init__(self, first_token_latency=0.5, tokens_per_second=50.0, response_text=RESPONSE_TEXT):
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.response_text = response_text
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="openai_stub", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+    @property
+    def api_base(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/v1"
+
+    def tokens(self):
+        """Split the response into word-sized chunks like the API streams them."""
+        chunks = []
+        for word in self.response_text.split(" "):
+            chunks.append(word + " ")
+        chunks[-1] = chunks[-1][:-1]
+        return chunks
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                with stub._lock:
+                    stub.requests += 1
+                if not self.path.endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                model = request.get("model", "stub")
+                prompt_tokens = sum(len(m.get("content", "")) // 4 + 1 for m in request.get("messages", []))
+                tokens = stub.tokens()
+                time.sleep(stub.first_token_latency)
+
+                if request.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    self._event({"role": "assistant"}, model, None)
+                    for token in tokens:
+                        self._event({"content": token}, model, None)
+                        time.sleep(1 / stub.tokens_per_second)
+                    self._event({}, model, "stop")
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    return
+
+                time.sleep(len(tokens) / stub.tokens_per_second)
+                body = json.dumps({
+                    "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": stub.response_text}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                              "total_tokens": prompt_tokens + len(tokens)},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _event(self, delta, model, finish_reason):
+                chunk = {"id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,233 @@
+"""
+Offline benchmarks of a complete generation run.
+
+Usage (from the repository root):
+    python -m benchmarks.run_benchmarks [--runs N] [--scenario NAME ...] [--output FILE]
+    python -m benchmarks.run_benchmarks --output new.json --compare benchmark_results.json
+
+Every scenario of benchmarks.fixture_server is run through the GenerationPipeline of the
+GUI against the local fixture server and the OpenAI stub, with cold caches and a
+generated .dotx template. The median of N runs is recorded per scenario: the time of
+every stage and of the whole run, the peak of Python memory allocations (measured in an
+extra run with tracemalloc), the size of snapshot and Word document and the number of
+requests to the fixture server.
+
+The results are written as JSON. With --compare, the new results are compared with an
+earlier file and the command fails if a scenario got slower, needs more memory or
+produces a bigger snapshot by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from datetime import datetime
+
+from asset_cache import asset_cache
+from fetch_policy import fetch_policy
+from openai_client import RateBudget, configure_client
+from page_cache import page_cache
+from pdf_extractor import clear_memo
+from pipeline import GenerationPipeline
+from response_cache import response_cache
+from snapshot_archive import DEFAULT_FORMAT, SNAPSHOT_FORMATS
+from benchmarks.fixture_server import SCENARIOS, FixtureServer
+from benchmarks.openai_stub import OpenAIStub
+
+DEFAULT_RUNS = 3
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_TOLERANCE = 0.2
+# Differences below these are noise, not regressions
+MIN_SECONDS_DIFFERENCE = 0.05
+MIN_KIB_DIFFERENCE = 256
+JOB_QUERY = "Schreibe ein Bewerbungsschreiben für das folgende Stelleninserat."
+
+
+def write_template(path):
+    """Write a minimal .dotx template with the [BEWERBUNGSTEXT] placeholder."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        package.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml"/>'
+            '</Types>'))
+        package.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/'
+            'officeDocument" Target="word/document.xml"/></Relationships>'))
+        package.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+            '<w:p><w:r><w:t>Max Muster, Musterstrasse 1, 8000 Zürich</w:t></w:r></w:p>'
+            '<w:p><w:r><w:t>[BEWERBUNGSTEXT]</w:t></w:r></w:p><w:sectPr/></w:body></w:document>'))
+
+
+def reset_caches():
+    """Make the next run cold: no page, asset, response or PDF caches and no learned fetch policy."""
+    page_cache.set_disk_dir(None)
+    page_cache.clear()
+    asset_cache.set_cache_dir(None)
+    response_cache.set_cache_dir(None)
+    fetch_policy.set_cache_dir(None)
+    clear_memo()
+
+
+def run_once(url, working_folder, template, server, snapshot_format):
+    """Run the pipeline once in a new folder inside `working_folder`. Returns a dict of measurements."""
+    reset_caches()
+    # A fresh folder, the pipeline keeps the documents of an earlier run instead of rendering them
+    run_folder = tempfile.mkdtemp(prefix="run_", dir=working_folder)
+    requests_before = server.requests
+    pipeline = GenerationPipeline(url, JOB_QUERY, run_folder, word_template=template,
+                                  snapshot_format=snapshot_format)
+    start = time.perf_counter()
+    result = pipeline.run()
+    total = time.perf_counter() - start
+    files = result.files
+    return {
+        "status": result.status,
+        "error": result.error,
+        "warnings": result.warnings,
+        "total": total,
+        "stages": dict(result.timings),
+        "snapshot_bytes": os.path.getsize(files["snapshot"]) if "snapshot" in files else None,
+        "document_bytes": os.path.getsize(files["document"]) if "document" in files else None,
+        "requests": server.requests - requests_before,
+    }
+
+
+def run_scenario(name, server, runs, snapshot_format=DEFAULT_FORMAT):
+    """Run a scenario `runs` times plus once with tracemalloc. Returns the median measurements."""
+    with tempfile.TemporaryDirectory(prefix=f"benchmark_{name}_") as working_folder:
+        template = os.path.join(working_folder, "vorlage.dotx")
+        write_template(template)
+        url = server.url(name)
+        measurements = [run_once(url, working_folder, template, server, snapshot_format) for _ in range(runs)]
+
+        tracemalloc.start()
+        try:
+            run_once(url, working_folder, template, server, snapshot_format)
+            memory_peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    last = measurements[-1]
+    stages = sorted({stage for m in measurements for stage in m["stages"]})
+    return {
+        "url": url,
+        "status": last["status"],
+        "error": last["error"],
+        "warnings": last["warnings"],
+        "total": statistics.median(m["total"] for m in measurements),
+        "stages": {stage: statistics.median(m["stages"].get(stage, 0.0) for m in measurements) for stage in stages},
+        "memory_peak_kib": memory_peak / 1024,
+        "snapshot_bytes": last["snapshot_bytes"],
+        "document_bytes": last["document_bytes"],
+        "requests": last["requests"],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, tolerance):
+    """Print old and new measurements side by side. Returns the list of regressions."""
+    regressions = []
+    print(f"\n{'scenario':<10} {'metric':<18} {'before':>14} {'after':>14} {'change':>8}")
+    for name, scenario in new["scenarios"].items():
+        previous = old.get("scenarios", {}).get(name)
+        if previous is None:
+            print(f"{name:<10} (new scenario)")
+            continue
+        metrics = [("total", previous["total"], scenario["total"], MIN_SECONDS_DIFFERENCE, "s")]
+        metrics += [(f"stage {stage}", previous["stages"].get(stage), seconds, MIN_SECONDS_DIFFERENCE, "s")
+                    for stage, seconds in scenario["stages"].items()]
+        metrics.append(("memory peak", previous["memory_peak_kib"], scenario["memory_peak_kib"],
+                        MIN_KIB_DIFFERENCE, "KiB"))
+        metrics.append(("snapshot size", previous["snapshot_bytes"], scenario["snapshot_bytes"], 0, "B"))
+        for metric, before, after, min_difference, unit in metrics:
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            regressed = after > before * (1 + tolerance) and after - before > min_difference
+            flag = "  <-- regression" if regressed else ""
+            print(f"{name:<10} {metric:<18} {f'{before:.2f}{unit}':>14} {f'{after:.2f}{unit}':>14} {change:>+8.0%}{flag}")
+            if regressed:
+                regressions.append(f"{name}: {metric}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the offline benchmarks of a complete generation run.")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Runs per scenario, the median counts.")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="Scenario to run, can be repeated (default: all).")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="Path of the JSON results (default: %(default)s).")
+    parser.add_argument("--compare", help="JSON results of an earlier revision to compare with.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed relative increase before a metric counts as regression (default: %(default)s).")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay of every fixture response in seconds.")
+    parser.add_argument("--first-token-latency", type=float, default=0.5, help="Delay of the stub's first token.")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="Streaming speed of the stub.")
+    parser.add_argument("--snapshot-format", choices=list(SNAPSHOT_FORMATS), default=DEFAULT_FORMAT,
+                        help="Format of the page snapshot (default: %(default)s).")
+    args = parser.parse_args(argv)
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "settings": {"latency": args.latency, "first_token_latency": args.first_token_latency,
+                     "tokens_per_second": args.tokens_per_second, "snapshot_format": args.snapshot_format},
+        "scenarios": {},
+    }
+    with FixtureServer(latency=args.latency) as server, \
+            OpenAIStub(args.first_token_latency, args.tokens_per_second) as stub:
+        # No rate limit, the stub answers every request
+        configure_client(api_key="benchmark", api_base=stub.api_base,
+                         budget=RateBudget(requests_per_minute=10 ** 6, tokens_per_minute=10 ** 9))
+        for name in args.scenario or SCENARIOS:
+            print(f"run_benchmarks: scenario {name}")
+            results["scenarios"][name] = run_scenario(name, server, args.runs, args.snapshot_format)
+
+    print(f"\n{'scenario':<10} {'status':<10} {'total':>8} {'memory':>10} {'snapshot':>10} {'requests':>9}")
+    for name, scenario in results["scenarios"].items():
+        snapshot = f"{scenario['snapshot_bytes'] / 1024:.0f}KiB" if scenario["snapshot_bytes"] else "-"
+        print(f"{name:<10} {scenario['status']:<10} {scenario['total']:>7.2f}s {scenario['memory_peak_kib']:>7.0f}KiB "
+              f"{snapshot:>10} {scenario['requests']:>9}")
+        for warning in scenario["warnings"]:
+            print(f"{'':<10} warning: {warning}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"run_benchmarks: results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(json.load(f), results, args.tolerance)
+        if regressions:
+            print(f"run_benchmarks: FAIL {len(regressions)} regressions: {', '.join(regressions)}")
+            return 1
+        print("run_benchmarks: OK, no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Peak memory of saving a snapshot, for pages of growing weight.
+
+Usage (from the repository root):
+    python -m benchmarks.snapshot_memory [--image-kib KIB ...] [--images N] [--format NAME ...]
+
+For every page weight, a page with N distinct images of the given size is served by the
+fixture server and saved with save_webpage in every snapshot format. The peak of Python
+memory allocations (tracemalloc) is printed next to the snapshot size, together with the
+peak of the previous approach that builds the whole snapshot as one string
+(inline_resources).
+
+Snapshots are streamed to disk, so their peak must not grow with the weight of the page:
+the command fails if the peak for the heaviest page is more than MAX_PEAK_GROWTH times
+the peak for the lightest page. The number of images stays the same, as every asset
+needs a little bookkeeping memory of its own.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.fixture_server import FixtureServer, ad_html, page, png_image
+from benchmarks.run_benchmarks import reset_caches
+from snapshot_archive import SNAPSHOT_FORMATS
+from webpage_saver import fetch_page, inline_resources, save_webpage
+
+# The smallest images are larger than snapshot_archive.COPY_CHUNK_SIZE, below it the
+# chunks that are copied and encoded are smaller and so is the peak
+DEFAULT_IMAGE_KIB = (200, 800, 3200)
+DEFAULT_IMAGES = 10
+# The default pages grow 16 times heavier. The peak still varies somewhat with how many
+# downloads are in flight at once, each holds a chunk of resource_fetcher.DOWNLOAD_CHUNK_SIZE
+MAX_PEAK_GROWTH = 2.0
+
+
+def add_weighted_page(server, images, image_kib):
+    """Serve a page with `images` distinct images of `image_kib` KiB. Returns its URL."""
+    markup = ""
+    for number in range(images):
+        path = f"/weight/{image_kib}/{number}.png"
+        server.routes[path] = ("image/png", png_image(image_kib * 1024, path))
+        markup += f'<img src="{path}" alt="Bild {number}">'
+    server.routes[f"/weight-{image_kib}.html"] = ("text/html; charset=utf-8",
+                                                  page(f"<main>{ad_html()}{markup}</main>").encode("utf-8"))
+    return f"{server.base_url}/weight-{image_kib}.html"
+
+
+def measure(func):
+    """Run `func` and return (seconds, peak bytes of Python allocations)."""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def save_in_memory(url, path):
+    """The previous approach: the whole snapshot as one string, written at once."""
+    html, _ = fetch_page(url)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(inline_resources(html, url))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the peak memory of saving snapshots of growing weight.")
+    parser.add_argument("--image-kib", type=int, action="append", help="Size of the images in KiB, one page "
+                        f"per size, can be repeated (default: {', '.join(map(str, DEFAULT_IMAGE_KIB))}).")
+    parser.add_argument("--images", type=int, default=DEFAULT_IMAGES, help="Images per page (default: %(default)s).")
+    parser.add_argument("--format", action="append", choices=list(SNAPSHOT_FORMATS),
+                        help="Snapshot format to measure, can be repeated (default: all).")
+    args = parser.parse_args(argv)
+    sizes = sorted(args.image_kib or DEFAULT_IMAGE_KIB)
+    formats = args.format or list(SNAPSHOT_FORMATS)
+
+    rows = []
+    peaks = {snapshot_format: [] for snapshot_format in formats}
+    with FixtureServer() as server, tempfile.TemporaryDirectory(prefix="snapshot_memory_") as folder:
+        # Once unmeasured, so lazy imports and first-time setup do not count for the lightest page
+        reset_caches()
+        save_webpage(add_weighted_page(server, 1, 1), os.path.join(folder, "warmup.html"))
+        for image_kib in sizes:
+            url = add_weighted_page(server, args.images, image_kib)
+            runs = [(snapshot_format, lambda path, f=snapshot_format: save_webpage(url, path, snapshot_format=f))
+                    for snapshot_format in formats]
+            runs.append(("in memory", lambda path: save_in_memory(url, path)))
+            for name, save in runs:
+                reset_caches()
+                # The page itself is fetched beforehand, only saving it is measured
+                fetch_page(url)
+                path = os.path.join(folder, f"weight-{image_kib}-{name.replace(' ', '_')}")
+                seconds, peak = measure(lambda: save(path))
+                rows.append((args.images * image_kib, name, os.path.getsize(path), peak, seconds))
+                if name in peaks:
+                    peaks[name].append(peak)
+
+    print(f"\n{'images':>8} {'format':<10} {'snapshot':>10} {'peak':>10} {'time':>7}")
+    for images_kib, name, snapshot_bytes, peak, seconds in rows:
+        print(f"{images_kib:>5}KiB {name:<10} {snapshot_bytes / 1024:>7.0f}KiB {peak / 1024:>7.0f}KiB {seconds:>6.2f}s")
+
+    failed = [name for name, values in peaks.items() if values[-1] > values[0] * MAX_PEAK_GROWTH]
+    if failed:
+        print(f"snapshot_memory: FAIL peak memory grows with the page weight for: {', '.join(failed)}")
+        return 1
+    print(f"snapshot_memory: OK, peak memory of the heaviest page within {MAX_PEAK_GROWTH}x of the lightest")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class BrowserPool:
+    """
+    A pool of warm headless browser sessions.
+
+    Starting Chrome takes several seconds, so instead of launching a new browser for
+    every page, sessions are kept alive and leased out to callers. A session is reset
+    before it goes back into the pool and is recycled (quit and replaced) after it has
+    served `max_pages` pages or when it crashed during use.
+
+    Attributes:
+    ----------
+    driver_factory : callable
+        A function without arguments that launches and returns a new webdriver instance.
+    max_size : int
+        The maximum number of browser sessions alive at the same time.
+    max_pages : int
+        The number of pages a session may load before it is recycled.
+    """
+
+    def __init__(self, driver_factory, max_size=2, max_pages=25):
+        self.driver_factory = driver_factory
+        self.max_size = max_size
+        self.max_pages = max_pages
+
+        self._lock = threading.Condition()
+        self._idle = []          # list of [driver, pages_served]
+        self._leased = 0
+        self._closed = False
+
+        # Counters exposed through stats()
+        self._launched = 0
+        self._recycled = 0
+        self._crashed = 0
+        self._leases = 0
+        self._pages = 0
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Lease a browser session from the pool.
+
+        Usage:
+            with pool.lease() as driver:
+                driver.get(url)
+
+        If the body raises, the session is considered crashed if it no longer responds,
+        and is replaced by a fresh one on the next lease.
+        """
+        entry = self._acquire(timeout)
+        healthy = True
+        try:
+            yield entry[0]
+        except Exception:
+            healthy = self._is_alive(entry[0])
+            raise
+        finally:
+            entry[1] += 1
+            self._release(entry, healthy)
+
+    def _acquire(self, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed.")
+                if self._idle:
+                    entry = self._idle.pop()
+                    self._leased += 1
+                    self._leases += 1
+                    return entry
+                if self._leased + len(self._idle) < self.max_size:
+                    # Reserve the slot before launching outside of the lock
+                    self._leased += 1
+                    self._leases += 1
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a free browser session.")
+                self._lock.wait(remaining)
+
+        try:
+            print("browser_pool.BrowserPool: launching headless browser")
+            driver = self.driver_factory()
+        except Exception:
+            with self._lock:
+                self._leased -= 1
+                self._lock.notify()
+            raise
+        with self._lock:
+            self._launched += 1
+        return [driver, 0]
+
+    def _release(self, entry, healthy):
+        driver, pages_served = entry
+        with self._lock:
+            self._pages += 1
+        if healthy:
+            healthy = self._reset(driver)
+
+        recycle = not healthy or pages_served >= self.max_pages or self._closed
+        if recycle:
+            self._quit(driver)
+
+        with self._lock:
+            self._leased -= 1
+            if not healthy:
+                self._crashed += 1
+            elif recycle:
+                self._recycled += 1
+            else:
+                self._idle.append(entry)
+            self._lock.notify()
+
+    def _reset(self, driver):
+        """Clear state left behind by the previous page. Returns False if the session is broken."""
+        try:
+            driver.delete_all_cookies()
+            driver.get("about:blank")
+            return True
+        except Exception as e:
+            print(f"browser_pool.BrowserPool: session reset failed, recycling it. Error: {e}")
+            return False
+
+    def _is_alive(self, driver):
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            print(f"browser_pool.BrowserPool: failed to quit browser session. Error: {e}")
+
+    def stats(self):
+        """Return a dictionary with the current size and health counters of the pool."""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "idle": len(self._idle),
+                "leased": self._leased,
+                "launched": self._launched,
+                "recycled": self._recycled,
+                "crashed": self._crashed,
+                "leases": self._leases,
+                "pages": self._pages,
+            }
+
+    def close(self):
+        """Quit all idle sessions. Leased sessions are quit as soon as they are returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._lock.notify_all()
+        for driver, _ in idle:
+            self._quit(driver)
@@ -0,0 +1,33 @@
+import threading
+
+
+class OperationCancelled(Exception):
+    """Raised by CancelToken.raise_if_cancelled() after the user cancelled an operation."""
+
+
+class CancelToken:
+    """
+    A flag to cancel a running background operation cooperatively.
+
+    The GUI thread calls cancel(); the worker calls raise_if_cancelled() between its steps
+    and stops with OperationCancelled. Steps that cannot be interrupted (e.g. a page load
+    in the browser) finish, but their result is discarded.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled("Operation cancelled.")
+
+    def wait(self, timeout):
+        """Sleep for `timeout` seconds or until cancelled. Returns True if cancelled."""
+        return self._event.wait(timeout)
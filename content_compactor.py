@@ -0,0 +1,145 @@
+import re
+import threading
+
+# Default maximum number of tokens of job ad content sent to ChatGPT
+DEFAULT_TOKEN_BUDGET = 4000
+TOKENIZER_MODEL = "gpt-4o"
+
+# Elements that never contain the job ad itself
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "svg", "nav", "aside", "button", "iframe"]
+BOILERPLATE_ROLES = {"navigation", "banner", "contentinfo", "search", "dialog", "alertdialog"}
+# id/class tokens of cookie banners, menus, footers, share buttons etc.
+BOILERPLATE_PATTERN = re.compile(
+    r'(^|[-_ ])(cookies?|consent|gdpr|cmp|cmpbox\d*|onetrust|usercentrics|navbar|nav|navigation|menu|'
+    r'footer|breadcrumbs?|newsletter|social|share|sharing|skip-?links?)([-_ ]|$)',
+    re.IGNORECASE,
+)
+# Forms are only boilerplate if they are small (search, login, newsletter); on some portals
+# one form wraps the whole page
+SMALL_FORM_TEXT_LENGTH = 500
+# If less than this much text survives the boilerplate removal, the heuristics were too greedy
+MIN_MAIN_TEXT_LENGTH = 200
+TRUNCATION_MARKER = "[...]"
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """Count the tokens of `text` with the tokenizer of the model, or estimate them without tiktoken."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _get_encoding():
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                import tiktoken  # optional, falls back to an estimate if it is not installed
+                _encoding = tiktoken.encoding_for_model(TOKENIZER_MODEL)
+            except ImportError:
+                _encoding = False
+            except Exception as e:
+                print(f"content_compactor._get_encoding: tokenizer not available, estimating tokens. Error: {e}")
+                _encoding = False
+        return _encoding or None
+
+
+def _is_boilerplate(tag):
+    if tag.name in ("header", "footer") and not tag.find_parent(["article", "main"]):
+        return True
+    if (tag.get("role") or "").lower() in BOILERPLATE_ROLES:
+        return True
+    if tag.get("aria-hidden") == "true":
+        return True
+    if tag.name == "form" and len(tag.get_text(strip=True)) < SMALL_FORM_TEXT_LENGTH:
+        return True
+    identifiers = " ".join([tag.get("id") or ""] + list(tag.get("class") or []))
+    return bool(identifiers.strip()) and BOILERPLATE_PATTERN.search(identifiers) is not None
+
+
+def extract_main_text(soup):
+    """
+    Return the text of a parsed page without navigation, cookie banners, footers and scripts.
+
+    The soup is not modified, so the same tree can be used for the snapshot. If the
+    heuristics remove (almost) everything, the plain text of the page is returned instead.
+    """
+    fallback_text = _visible_text(soup, skip_boilerplate=False)
+    main_text = _visible_text(soup, skip_boilerplate=True)
+    if len(main_text.strip()) < MIN_MAIN_TEXT_LENGTH:
+        return fallback_text
+    return main_text
+
+
+def _visible_text(soup, skip_boilerplate):
+    """Join the strings of the tree like soup.get_text("\n"), leaving out boilerplate subtrees."""
+    from bs4.element import NavigableString, PreformattedString, Tag
+
+    parts = []
+    stack = [soup]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Tag):
+            if node.name in BOILERPLATE_TAGS:
+                continue
+            if skip_boilerplate and node.name not in ("html", "body", "[document]") and _is_boilerplate(node):
+                continue
+            stack.extend(reversed(node.contents))
+        elif isinstance(node, NavigableString) and not isinstance(node, PreformattedString):
+            # Comments, CDATA and doctypes are not part of the text
+            parts.append(str(node))
+    return "\n".join(parts)
+
+
+def _lines(text):
+    for line in text.splitlines():
+        line = " ".join(line.split())
+        if line:
+            yield line
+
+
+def compact_sections(sections, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Join the text sections of a job ad (main page, iframes, PDFs) into compact prompt content.
+
+    Whitespace is normalized, lines that already appeared in an earlier section (or
+    earlier in the same one) are dropped and the result is cut at `token_budget` tokens.
+    Returns a tuple (text, stats).
+    """
+    seen = set()
+    kept = []
+    duplicates = 0
+    for text in sections:
+        for line in _lines(text):
+            key = line.casefold()
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            kept.append(line)
+
+    compact_text = "\n".join(kept)
+    truncated = False
+    if token_budget and count_tokens(compact_text) > token_budget:
+        truncated = True
+        budget_left = token_budget - count_tokens(TRUNCATION_MARKER)
+        selected = []
+        for line in kept:
+            line_tokens = count_tokens(line + "\n")
+            if line_tokens > budget_left:
+                break
+            selected.append(line)
+            budget_left -= line_tokens
+        compact_text = "\n".join(selected + [TRUNCATION_MARKER])
+
+    stats = {
+        "tokens_after": count_tokens(compact_text),
+        "token_budget": token_budget,
+        "duplicate_lines": duplicates,
+        "truncated": truncated,
+    }
+    return compact_text, stats
@@ -0,0 +1,159 @@
+"""
+Renders Word documents from .dotx/.docx templates without Word.
+
+A template is an OOXML package (a zip file). The paragraph in word/document.xml that
+contains the placeholder is replaced by one paragraph per line of the text, all other
+parts of the package are copied unchanged. Templates are parsed once and kept in
+`template_cache`, so rendering a document only joins strings and writes the zip file.
+"""
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from xml.sax.saxutils import escape, unescape
+
+DOCUMENT_PART = "word/document.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+TEMPLATE_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml"
+DOCUMENT_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"
+# Template files that can be rendered natively, other formats need Word
+SUPPORTED_EXTENSIONS = (".docx", ".dotx")
+
+# Self-closing (empty) paragraphs are not matched, the match would run on to the next </w:p>
+PARAGRAPH_PATTERN = re.compile(r'<w:p(?:\s[^>]*[^/])?>.*?</w:p>', re.DOTALL)
+PARAGRAPH_PROPERTIES_PATTERN = re.compile(r'<w:pPr>.*?</w:pPr>', re.DOTALL)
+RUN_PATTERN = re.compile(r'<w:r(?:\s[^>]*)?>.*?</w:r>', re.DOTALL)
+RUN_PROPERTIES_PATTERN = re.compile(r'<w:rPr>.*?</w:rPr>', re.DOTALL)
+TEXT_PATTERN = re.compile(r'<w:t(?:\s[^>]*)?>(.*?)</w:t>', re.DOTALL)
+
+
+class DocxTemplate:
+    """
+    A parsed template.
+
+    The document part is split into the XML before and after the placeholder paragraph,
+    together with the paragraph and run properties of that paragraph, so the inserted
+    text keeps the formatting of the placeholder. Text around the placeholder in the same
+    paragraph is kept, mixed formatting inside that paragraph is not.
+
+    Raises ValueError if the file is not a valid OOXML package.
+    """
+
+    def __init__(self, path, placeholder):
+        self.path = path
+        self.placeholder = placeholder
+        try:
+            with zipfile.ZipFile(path) as package:
+                self.parts = [(info, package.read(info)) for info in package.infolist()]
+        except (OSError, zipfile.BadZipFile) as e:
+            raise ValueError(f"Cannot read the template {path}: {e}")
+
+        parts = dict((info.filename, data) for info, data in self.parts)
+        for name in (DOCUMENT_PART, CONTENT_TYPES_PART):
+            if name not in parts:
+                raise ValueError(f"The template {path} has no {name}.")
+        document = parts[DOCUMENT_PART].decode("utf-8")
+        self.content_types = parts[CONTENT_TYPES_PART].decode("utf-8").replace(
+            TEMPLATE_CONTENT_TYPE, DOCUMENT_CONTENT_TYPE)
+
+        self.found = False
+        self.head = document
+        self.tail = ""
+        self.paragraph_properties = ""
+        self.run_properties = ""
+        self.text_before = ""
+        self.text_after = ""
+        for match in PARAGRAPH_PATTERN.finditer(document):
+            paragraph = match.group(0)
+            text = "".join(unescape(t) for t in TEXT_PATTERN.findall(paragraph))
+            if placeholder not in text:
+                continue
+            self.found = True
+            self.head = document[:match.start()]
+            self.tail = document[match.end():]
+            self.text_before, self.text_after = text.split(placeholder, 1)
+            properties = PARAGRAPH_PROPERTIES_PATTERN.search(paragraph)
+            if properties:
+                self.paragraph_properties = properties.group(0)
+                paragraph = paragraph.replace(self.paragraph_properties, "", 1)
+            for run in RUN_PATTERN.findall(paragraph):
+                if TEXT_PATTERN.search(run):
+                    run_properties = RUN_PROPERTIES_PATTERN.search(run)
+                    self.run_properties = run_properties.group(0) if run_properties else ""
+                    break
+            break
+
+    def render_document(self, text):
+        """Return the document part with the placeholder replaced by `text`."""
+        if not self.found:
+            return self.head
+        lines = (self.text_before + text + self.text_after).split("\n")
+        return self.head + "".join(self._paragraph(line) for line in lines) + self.tail
+
+    def _paragraph(self, line):
+        runs = []
+        for index, segment in enumerate(line.split("\t")):
+            if index:
+                runs.append(f"<w:r>{self.run_properties}<w:tab/></w:r>")
+            if segment:
+                runs.append(f'<w:r>{self.run_properties}<w:t xml:space="preserve">{escape(segment)}</w:t></w:r>')
+        return f"<w:p>{self.paragraph_properties}{''.join(runs)}</w:p>"
+
+    def render(self, output_path, text):
+        """Write a .docx file with the placeholder replaced by `text`. Returns False if the placeholder is missing."""
+        document = self.render_document(text).encode("utf-8")
+        with zipfile.ZipFile(output_path, "w") as package:
+            for info, data in self.parts:
+                if info.filename == DOCUMENT_PART:
+                    data = document
+                elif info.filename == CONTENT_TYPES_PART:
+                    data = self.content_types.encode("utf-8")
+                package.writestr(info, data)
+        return self.found
+
+
+class TemplateCache:
+    """
+    Keeps parsed templates in memory.
+
+    A template is parsed again when its file changed (modification time or size). The
+    least recently used templates are dropped beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._templates = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, placeholder):
+        """Return the DocxTemplate for `path`. Raises ValueError if it cannot be parsed."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        key = (path, placeholder)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._templates.get(key)
+            if cached is not None and cached[0] == signature:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            self.misses += 1
+
+        template = DocxTemplate(path, placeholder)
+        with self._lock:
+            self._templates[key] = (signature, template)
+            self._templates.move_to_end(key)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+
+# Parsed templates shared by the GUI and the batch mode
+template_cache = TemplateCache()
@@ -0,0 +1,185 @@
+"""
+Decides per domain whether a page can be fetched with a plain HTTP request or needs the
+headless browser.
+
+Many job boards serve complete server-rendered HTML, loading them in Chrome only costs
+time. webpage_saver.fetch_page therefore tries a static fetch first, checks the result
+with assess_static_html and falls back to the browser if the page looks incomplete.
+
+The outcome is recorded per domain. A domain whose static results were incomplete
+several times in a row goes straight to the browser and is only probed statically again
+every REPROBE_INTERVAL fetches. For every domain the chosen path and the time saved
+compared to the browser (negative for static attempts that had to fall back) are kept.
+"""
+import json
+import os
+import re
+import threading
+from urllib.parse import urlsplit
+
+STATIC_PATH = "static"
+BROWSER_PATH = "browser"
+
+# A static page is complete with this much visible text...
+MIN_TEXT_LENGTH = 1500
+# ...or this much if it describes a JobPosting in JSON-LD. The JSON-LD alone is not enough,
+# text extraction and snapshot drop scripts, so the ad must be in the visible HTML
+MIN_JOB_POSTING_TEXT_LENGTH = 500
+# ...if the text is not drowned in markup and scripts (visible characters per HTML character)
+MIN_TEXT_DENSITY = 0.01
+# Incomplete static results in a row until a domain goes straight to the browser
+LEARN_AFTER_FAILURES = 3
+# Every n-th fetch of a browser-only domain is tried statically again
+REPROBE_INTERVAL = 20
+# Assumed browser time of a domain without measurements
+DEFAULT_BROWSER_SECONDS = 5.0
+# Weight of a new browser time in the running average
+BROWSER_SECONDS_SMOOTHING = 0.3
+
+JSON_LD_JOB_POSTING_PATTERN = re.compile(
+    r'<script[^>]+application/ld\+json[^>]*>[^<]*"@type"\s*:\s*"JobPosting"', re.IGNORECASE)
+SPA_SHELL_PATTERNS = (
+    # Empty mount points of React, Vue, Next.js and Nuxt
+    re.compile(r'<div[^>]+id=["\'](?:root|app|__next|__nuxt)["\'][^>]*>\s*</div>', re.IGNORECASE),
+    # Angular
+    re.compile(r'<app-root[^>]*>\s*</app-root>', re.IGNORECASE),
+    re.compile(r'<noscript[^>]*>[^<]*(?:enable|activate|aktivieren)[^<]*javascript', re.IGNORECASE),
+)
+INVISIBLE_PATTERN = re.compile(r'<(script|style|noscript|template)\b.*?</\1\s*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r'<[^>]+>')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def assess_static_html(html):
+    """
+    Decide whether statically fetched HTML is complete enough to skip the browser.
+
+    Returns a tuple (complete, reason).
+    """
+    text = WHITESPACE_PATTERN.sub(" ", TAG_PATTERN.sub(" ", INVISIBLE_PATTERN.sub(" ", html))).strip()
+    density = len(text) / max(len(html), 1)
+    for pattern in SPA_SHELL_PATTERNS:
+        if pattern.search(html) and len(text) < MIN_TEXT_LENGTH:
+            return False, "JavaScript app shell"
+    job_posting = JSON_LD_JOB_POSTING_PATTERN.search(html) is not None
+    if len(text) < (MIN_JOB_POSTING_TEXT_LENGTH if job_posting else MIN_TEXT_LENGTH):
+        return False, f"only {len(text)} characters of text"
+    if density < MIN_TEXT_DENSITY:
+        return False, f"text density {density:.3f}"
+    return True, f"{len(text)} characters of text{' and JobPosting JSON-LD' if job_posting else ''}"
+
+
+class FetchPolicy:
+    """
+    Per-domain statistics of static and browser fetches, stored as JSON in `cache_dir`.
+
+    Attributes:
+    ----------
+    cache_dir : str or None
+        Directory of the policy file. Without it the statistics are kept in memory only.
+    enabled : bool
+        If False, every page is fetched with the browser.
+    """
+
+    FILE_NAME = "domains.json"
+
+    def __init__(self, cache_dir=None, enabled=True):
+        self.cache_dir = None
+        self.enabled = enabled
+        self._domains = {}
+        self._lock = threading.Lock()
+        self.set_cache_dir(cache_dir)
+
+    def set_cache_dir(self, cache_dir):
+        """Switch to another directory and load the statistics stored there."""
+        with self._lock:
+            self.cache_dir = cache_dir
+            self._domains = {}
+            if not cache_dir:
+                return
+            try:
+                with open(os.path.join(cache_dir, self.FILE_NAME), 'r', encoding='utf-8') as f:
+                    self._domains = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def choose(self, url):
+        """Return STATIC_PATH if a static fetch should be tried for `url`, otherwise BROWSER_PATH."""
+        if not self.enabled:
+            return BROWSER_PATH
+        with self._lock:
+            domain = self._domain(url)
+            if domain["rejected_in_row"] < LEARN_AFTER_FAILURES:
+                return STATIC_PATH
+            domain["skipped"] += 1
+            return STATIC_PATH if domain["skipped"] % REPROBE_INTERVAL == 0 else BROWSER_PATH
+
+    def record_static(self, url, seconds, complete, reason):
+        """Record a static fetch that took `seconds` and was `complete` or had to fall back."""
+        with self._lock:
+            domain = self._domain(url)
+            if complete:
+                domain["static"] += 1
+                domain["rejected_in_row"] = 0
+                domain["time_saved"] += domain["browser_seconds"] - seconds
+                domain["last_path"] = STATIC_PATH
+            else:
+                domain["rejected"] += 1
+                domain["rejected_in_row"] += 1
+                domain["time_saved"] -= seconds
+            domain["last_reason"] = reason
+            self._save()
+
+    def record_browser(self, url, seconds):
+        """Record a browser fetch that took `seconds`."""
+        with self._lock:
+            domain = self._domain(url)
+            domain["browser"] += 1
+            if domain["browser"] == 1:
+                domain["browser_seconds"] = seconds
+            else:
+                domain["browser_seconds"] += BROWSER_SECONDS_SMOOTHING * (seconds - domain["browser_seconds"])
+            domain["last_path"] = BROWSER_PATH
+            self._save()
+
+    def stats(self):
+        """Return a copy of the statistics per domain."""
+        with self._lock:
+            return {name: dict(domain) for name, domain in self._domains.items()}
+
+    def report(self):
+        """Print the chosen path and the time saved per domain."""
+        domains = self.stats()
+        if not domains:
+            return
+        print(f"{'domain':<40} {'path':<8} {'static':>6} {'browser':>7} {'rejected':>8} {'saved':>9}")
+        for name, domain in sorted(domains.items(), key=lambda item: item[1]["time_saved"], reverse=True):
+            print(f"{name:<40} {domain['last_path'] or '-':<8} {domain['static']:>6} {domain['browser']:>7} "
+                  f"{domain['rejected']:>8} {domain['time_saved']:>8.1f}s")
+
+    def _domain(self, url):
+        name = urlsplit(url).hostname or ""
+        domain = self._domains.get(name)
+        if domain is None:
+            domain = self._domains[name] = {
+                "static": 0, "browser": 0, "rejected": 0, "rejected_in_row": 0, "skipped": 0,
+                "browser_seconds": DEFAULT_BROWSER_SECONDS, "time_saved": 0.0,
+                "last_path": None, "last_reason": None,
+            }
+        return domain
+
+    def _save(self):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            path = os.path.join(self.cache_dir, self.FILE_NAME)
+            with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                json.dump(self._domains, f, indent=2)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            print(f"fetch_policy.FetchPolicy: Cannot save the fetch policy. Error: {e}")
+
+
+# Statistics shared by all fetches of this process
+fetch_policy = FetchPolicy()
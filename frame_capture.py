@@ -0,0 +1,189 @@
+"""
+Capture the iframes of a job ad.
+
+A rendered page's iframes are read from the browser session that rendered the page, by
+switching into each frame, instead of loading every iframe in a new session. Pages
+fetched with a plain HTTP request get their iframes with plain HTTP requests as well.
+Either way the result is a dict {iframe URL: HTML} with all frames of the page, nested
+frames included, that text extraction and snapshot look up by frame_key of the resolved
+`src`, so the key does not depend on how the browser normalized the URL.
+
+Which frames are captured is configured with configure_frames:
+    max_depth  levels of nested iframes, 1 captures only the frames of the page itself
+               and 0 none at all (default 2)
+    allow      hosts whose frames are captured, all hosts if empty (default)
+    deny       hosts whose frames are never captured (default: ad, tracking, social
+               media and video hosts)
+A host pattern matches the host and its subdomains. Every frame URL is captured once per
+page, which also ends frame cycles.
+"""
+from urllib.parse import quote, urljoin, urlsplit, urlunsplit
+
+from html_document import get_document
+from tracing import span
+
+DEFAULT_DENY = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "adservice.google.com",
+    "facebook.com",
+    "twitter.com",
+    "x.com",
+    "youtube.com",
+    "youtube-nocookie.com",
+    "vimeo.com",
+)
+
+# Characters left as they are when frame_key quotes path and query, '%' keeps existing escapes
+URL_SAFE_CHARACTERS = "%/:@!$&'()*+,;=-._~?"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+frame_config = {
+    "max_depth": 2,
+    "allow": (),
+    "deny": DEFAULT_DENY,
+}
+
+
+def configure_frames(max_depth=None, allow=None, deny=None):
+    """Update the frame configuration. None keeps the current value. Raises ValueError for a negative depth."""
+    if max_depth is not None:
+        if int(max_depth) < 0:
+            raise ValueError(f"iframe_max_depth must be 0 or more, got {max_depth}.")
+        frame_config["max_depth"] = int(max_depth)
+    if allow is not None:
+        frame_config["allow"] = tuple(_host_pattern(pattern) for pattern in allow)
+    if deny is not None:
+        frame_config["deny"] = tuple(_host_pattern(pattern) for pattern in deny)
+
+
+def frame_allowed(url, depth):
+    """Return True if the frame `url` at nesting level `depth` (1 for frames of the page) may be captured."""
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or depth > frame_config["max_depth"]:
+        return False
+    host = (parts.hostname or "").lower()
+    if any(_host_matches(host, pattern) for pattern in frame_config["deny"]):
+        return False
+    allow = frame_config["allow"]
+    return not allow or any(_host_matches(host, pattern) for pattern in allow)
+
+
+def frame_key(url):
+    """
+    Normalize a frame URL the way browsers do: lowercase scheme and host, no default port,
+    no fragment, '/' as empty path and non-ASCII characters and spaces percent-encoded.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc += f":{parts.port}"
+    if parts.username:
+        netloc = f"{parts.username}{':' + parts.password if parts.password else ''}@{netloc}"
+    path = quote(parts.path or "/", safe=URL_SAFE_CHARACTERS)
+    return urlunsplit((scheme, netloc, path, quote(parts.query, safe=URL_SAFE_CHARACTERS), ""))
+
+
+def capture_frames(driver, url):
+    """
+    Return the HTML of the frames of the page loaded in `driver` as a dict {iframe URL: HTML}.
+
+    The driver is switched into every allowed frame and back, it is on the top-level page
+    again when this returns.
+    """
+    from selenium.common.exceptions import WebDriverException
+    from selenium.webdriver.common.by import By
+
+    frames = {}
+    seen = {frame_key(url)}
+
+    def walk(depth):
+        for element in driver.find_elements(By.TAG_NAME, "iframe"):
+            try:
+                # The src property is already resolved against the frame's document
+                frame_url = element.get_attribute("src")
+            except WebDriverException:
+                continue
+            if not frame_url or not frame_allowed(frame_url, depth):
+                continue
+            frame_url = frame_key(frame_url)
+            if frame_url in seen:
+                continue
+            seen.add(frame_url)
+            try:
+                driver.switch_to.frame(element)
+            except WebDriverException as e:
+                print(f"frame_capture.capture_frames: Cannot switch to frame {frame_url}. Error: {e}")
+                continue
+            try:
+                frames[frame_url] = driver.page_source
+                walk(depth + 1)
+            except WebDriverException as e:
+                print(f"frame_capture.capture_frames: Cannot read frame {frame_url}. Error: {e}")
+            finally:
+                driver.switch_to.parent_frame()
+
+    with span("frames", url=url, source="browser") as frames_span:
+        try:
+            walk(1)
+        finally:
+            driver.switch_to.default_content()
+        frames_span.add(bytes=sum(len(html) for html in frames.values()), items=len(frames))
+    _report(url, frames, seen)
+    return frames
+
+
+def collect_frames(document, fetch):
+    """
+    Return the frames of a page fetched without a browser as a dict {iframe URL: HTML}.
+
+    `document` is the HtmlDocument of the page. `fetch` is called with the URL of every
+    allowed frame and returns its HTML or None. The frames are parsed with get_document,
+    so the consumers reuse the trees.
+    """
+    url = document.url
+    frames = {}
+    seen = {frame_key(url)}
+
+    def walk(page_url, soup, depth):
+        for iframe in soup.find_all('iframe'):
+            src = iframe.get('src')
+            if not src:
+                continue
+            frame_url = frame_key(urljoin(page_url, src))
+            if frame_url in seen or not frame_allowed(frame_url, depth):
+                continue
+            seen.add(frame_url)
+            frame_html = fetch(frame_url)
+            if frame_html is not None:
+                frames[frame_url] = frame_html
+                with get_document(frame_url, frame_html).reading() as frame_soup:
+                    walk(frame_url, frame_soup, depth + 1)
+
+    with span("frames", url=url, source="static") as frames_span:
+        with document.reading() as soup:
+            walk(url, soup, 1)
+        frames_span.add(bytes=sum(len(html) for html in frames.values()), items=len(frames))
+    _report(url, frames, seen)
+    return frames
+
+
+def _report(url, frames, seen):
+    # `seen` holds the page itself and every allowed frame URL, captured or not
+    if len(seen) > 1:
+        print(f"frame_capture: captured {len(frames)} of {len(seen) - 1} allowed frames of {url}")
+
+
+def _host_pattern(pattern):
+    """Accept 'example.com' as well as 'https://example.com/...' and return the host."""
+    pattern = pattern.strip().lower()
+    if "://" in pattern:
+        pattern = urlsplit(pattern).hostname or ""
+    return pattern.lstrip(".")
+
+
+def _host_matches(host, pattern):
+    return host == pattern or host.endswith("." + pattern)
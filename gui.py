@@ -1,22 +1,33 @@
 ## gui.py
 import os
-import re
+import queue
 import sys
 import threading
+import time
 import tkinter as tk
 import tkinter.font as tkFont
 from tkinter import filedialog, messagebox, ttk
 import webbrowser
-from job_application_generator import generate_job_application
-from utils import extract_job_ad_from_url, load_settings, save_settings, api_key_file_present
-from webpage_saver import save_webpage
-import win32com.client as win32  # Für die Interaktion mit Word
-from text_redirector import TextRedirector
-import pythoncom
-import win32com.client as win32
+from utils import (extract_job_ad_from_url, load_settings, save_settings, api_key_file_present,
+                   build_prompt, build_job_query, extract_meta_information)
+from page_settle import configure_settle
+from page_cache import page_cache
+from content_compactor import DEFAULT_TOKEN_BUDGET
+from asset_cache import asset_cache
+from response_cache import response_cache
+from fetch_policy import fetch_policy
+from html_document import configure_parser
+from frame_capture import configure_frames
+from cancellation import CancelToken, OperationCancelled
+from pipeline import GenerationPipeline
+from tracing import DEFAULT_TRACE_FILE
+from snapshot_archive import DEFAULT_FORMAT, SNAPSHOT_FORMATS
+from text_redirector import LogSink, TextRedirector
 
 class JobAppGeneratorApp:
     HELP_URL = "https://github.com/schbrongx"  # Set the default help URL
+    OUTPUT_FLUSH_MS = 50  # Interval in which streamed text is appended to the output field
+    PREFETCH_TTL = 600  # Seconds a previewed job ad is reused for generating, the ad may change
 
     def __init__(self, root):
         print("gui.__init__: Initializing")
@@ -27,6 +38,19 @@ class JobAppGeneratorApp:
         # Load settings from settings.json
         self.settings = load_settings()
 
+        # Configure how long the headless browser waits for pages to be ready
+        try:
+            configure_settle(strategy=self.settings.get("settle_strategy"),
+                             timeout=self.settings.get("settle_timeout"),
+                             selector=self.settings.get("settle_selector"))
+            configure_parser(self.settings.get("html_parser"))
+            configure_frames(max_depth=self.settings.get("iframe_max_depth"),
+                             allow=self.settings.get("iframe_allow"),
+                             deny=self.settings.get("iframe_deny"))
+        except ValueError as e:
+            print(f"gui.__init__: {e}")
+        fetch_policy.enabled = self.settings.get("static_fetch", True)
+
         # Create the menu bar
         self.create_menu_bar()
 
@@ -35,6 +59,7 @@ class JobAppGeneratorApp:
         self.working_folder_frame.pack(anchor="w", pady=5)
 
         current_folder = self.settings.get("working_folder", None)
+        self._set_cache_folders(current_folder)
         self.working_folder_label = tk.Label(self.working_folder_frame, text=f"Working folder: {self._get_short_path(current_folder)}")
         self.working_folder_label.pack(side=tk.LEFT, padx=5)
 
@@ -66,6 +91,17 @@ class JobAppGeneratorApp:
         self.execute_button = tk.Button(self.button_frame, text="Generate", command=self.run_generate_thread)
         self.execute_button.pack(side=tk.LEFT, padx=10)
 
+        # Progress indicator with cancel button for background operations, hidden while idle
+        self.progress_frame = tk.Frame(self.root)
+        self.progress_label = tk.Label(self.progress_frame, text="")
+        self.progress_label.pack(side=tk.LEFT, padx=5)
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode="indeterminate", length=200)
+        self.progress_bar.pack(side=tk.LEFT, padx=5)
+        self.cancel_button = tk.Button(self.progress_frame, text="Cancel", command=self.cancel_operation)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_token = None
+        self.prefetched_job_ad = None
+
         # Checkbox: Open Word document after generating
         self.open_after_var = tk.BooleanVar()
         self.open_after_var.set(self.settings.get("open_word_after_generating", False))  # Load from settings
@@ -74,6 +110,12 @@ class JobAppGeneratorApp:
                                                   command=self.save_checkbox_state)
         self.open_after_checkbox.pack(side=tk.LEFT, padx=10)
 
+        # Checkbox: Ignore the response cache and send a new request to ChatGPT
+        self.force_regenerate_var = tk.BooleanVar(value=False)
+        self.force_regenerate_checkbox = tk.Checkbutton(self.button_frame, text="Force regenerate",
+                                                        variable=self.force_regenerate_var, onvalue=True, offvalue=False)
+        self.force_regenerate_checkbox.pack(side=tk.LEFT, padx=10)
+
 
         # Label for additional instructions field
         self.instructions_label = tk.Label(self.root, text="Zusätzliche Anweisungen", anchor="w")
@@ -110,8 +152,11 @@ class JobAppGeneratorApp:
         self.root.grid_columnconfigure(0, weight=1)
 
         # sys.stdout umleiten, um alle print-Ausgaben in das log_text-Feld zu schreiben
-        sys.stdout = TextRedirector(self.log_text)
-        sys.stderr = TextRedirector(self.log_text)
+        # Alle Ausgaben laufen über eine Queue, das Log-Feld wird nur vom Tk-Thread beschrieben
+        self.log_sink = LogSink(self.log_text, max_lines=self.settings.get("log_max_lines", 2000),
+                                log_file=self.settings.get("log_file"))
+        sys.stdout = TextRedirector(self.log_sink)
+        sys.stderr = TextRedirector(self.log_sink)
 
         # check if ChatGPT API key file is present
         if not api_key_file_present():
@@ -130,6 +175,13 @@ class JobAppGeneratorApp:
             return shortened_path
         return path or "None"
 
+    def _set_cache_folders(self, folder):
+        """Keep the on-disk page, asset and response caches and the fetch policy in the working folder, if there is one."""
+        page_cache.set_disk_dir(os.path.join(folder, ".page_cache") if folder else None)
+        asset_cache.set_cache_dir(os.path.join(folder, ".asset_cache") if folder else None)
+        response_cache.set_cache_dir(os.path.join(folder, ".response_cache") if folder else None)
+        fetch_policy.set_cache_dir(os.path.join(folder, ".fetch_policy") if folder else None)
+
     def open_help(self):
         """Open the Help URL in the default web browser."""
         webbrowser.open(self.HELP_URL)
@@ -145,6 +197,13 @@ class JobAppGeneratorApp:
         settings_menu.add_command(label="Clear Working Folder", command=self.clear_working_folder)
         settings_menu.add_command(label="Select Word Template", command=self.select_word_template)
         settings_menu.add_command(label="Clear Word Template", command=self.clear_word_template)
+        settings_menu.add_command(label="Clear Response Cache", command=self.clear_response_cache)
+        snapshot_menu = tk.Menu(settings_menu, tearoff=0)
+        self.snapshot_format_var = tk.StringVar(value=self.settings.get("snapshot_format", DEFAULT_FORMAT))
+        for snapshot_format, extension in SNAPSHOT_FORMATS.items():
+            snapshot_menu.add_radiobutton(label=f"{snapshot_format.upper()} ({extension})", value=snapshot_format,
+                                          variable=self.snapshot_format_var, command=self.save_snapshot_format)
+        settings_menu.add_cascade(label="Snapshot Format", menu=snapshot_menu)
         menu_bar.add_cascade(label="Settings", menu=settings_menu)
 
         # Help Menu
@@ -154,10 +213,15 @@ class JobAppGeneratorApp:
 
         self.root.config(menu=menu_bar)
 
+    def save_snapshot_format(self):
+        """Save the selected snapshot format to the settings."""
+        self.settings["snapshot_format"] = self.snapshot_format_var.get()
+        save_settings(self.settings)
+        print(f"gui.save_snapshot_format: Snapshot format set to {self.settings['snapshot_format']}")
+
     def log_message(self, message):
         """Fügt eine Nachricht im Log-Ausgabefeld hinzu."""
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)  # Scrollt automatisch nach unten, wenn neue Nachrichten hinzugefügt werden
+        self.log_sink.write(message + "\n")
 
     def save_checkbox_state(self):
         """Save the state of the 'Open Word document after generating' checkbox to the settings."""
@@ -208,6 +272,7 @@ class JobAppGeneratorApp:
         if folder:
             self.settings["working_folder"] = folder
             save_settings(self.settings)
+            self._set_cache_folders(folder)
             # Update the label with the short version of the path
             self.working_folder_label.config(text=f"Working folder: {self._get_short_path(folder)}")
 
@@ -215,13 +280,19 @@ class JobAppGeneratorApp:
         """Clears the working folder setting."""
         self.settings["working_folder"] = None
         save_settings(self.settings)
+        self._set_cache_folders(None)
         self.working_folder_label.config(text="Working folder: None")
 
+    def clear_response_cache(self):
+        """Remove all cached ChatGPT responses."""
+        response_cache.clear()
+        print("gui.clear_response_cache: Response cache cleared.")
+
     def select_word_template(self):
         """Allow the user to select a Word template and save it in the settings."""
         template_path = filedialog.askopenfilename(
             title="Select Word Template",
-            filetypes=[("Word Templates", "*.dotx"), ("All Files", "*.*")]
+            filetypes=[("Word Templates", "*.dotx *.docx"), ("All Files", "*.*")]
         )
         if template_path:
             self.settings["word_template"] = template_path
@@ -237,43 +308,63 @@ class JobAppGeneratorApp:
 
     def _generate_prompt(self, job_query, job_ad_content, job_ad_url):
         """Generate a structured prompt for ChatGPT to generate a job application in Swiss German spelling."""
-        print("gui._generate_prompt: Setting prompt-variable")
-        prompt = (
-            f"Du bist ein hilfreicher Assistent, der eine Bewerbung verfassen soll.\n"
-            f"Die erste Zeile deiner Antwort muss zwingend folgende Felder im TSV format (tab seperated values) enhalten:\n"
-            f"- Heutiges Datum im Format dd.mm.yyyy\n"
-            f"- Firmenname\n"
-            f"- URL der ausgeschriebenen Stelle (Job Ad URL)\n"
-            f"- Stellentitel/Job Titel\n"
-            f"- Vorname, Nachname und Email der Kontaktperson bei der Firma\n\n"
-            f"Bitte schreibe eine professionelle und überzeugende Bewerbung, die auf diese Stelle zugeschnitten ist."
-            f"\n\nBefolge ausserdem unbedingt die folgenden zusätzlichen Anweisungen:\n"
-            f"\n\n*** Zusätzliche Anweisungen***\n{job_query}"
-            f"\n\n*** Hier ist die ursprüngliche URL der Stellenauschhreibung (Job Ad UR)L**\n{job_ad_url}"
-            f"\n\n ** Hier ist der Inhalt des Inserates: (Job Ad Inhalt) **\n{job_ad_content}"
-        )
-        return re.sub(r'\n\s*\n+', '\n\n', prompt)
+        return build_prompt(job_query, job_ad_content, job_ad_url)
+
+    def _get_token_budget(self):
+        """Maximum number of tokens of job ad content in the prompt, 0 disables the limit."""
+        return self.settings.get("token_budget", DEFAULT_TOKEN_BUDGET)
+
+    def _get_job_query(self):
+        """Combine the saved job query with the additional instructions of the text field."""
+        return build_job_query(self.settings.get("job_query", ""), self.instructions_text.get("1.0", tk.END))
 
     def preview_query(self):
-        """Preview the query that will be sent to ChatGPT."""
+        """Preview the query that will be sent to ChatGPT. The job ad is fetched in a background thread."""
         print(f"gui.preview_query: Opening preview query window.")
         if not self.job_ad_var.get():
             messagebox.showerror("Error", "Please provide the job ad URL.")
             return
 
+        # Read all inputs on the Tk thread, the worker must not touch the widgets
         job_ad_url = self.job_ad_var.get()
-        job_ad_content, _ = extract_job_ad_from_url(job_ad_url)
+        job_query = self._get_job_query()
+        token_budget = self._get_token_budget()
+
+        cancel_token = CancelToken()
+        self.disable_buttons()
+        self.show_progress("Fetching job ad for preview...", cancel_token)
+        thread = threading.Thread(target=self._preview_worker,
+                                  args=(job_ad_url, job_query, token_budget, cancel_token), daemon=True)
+        thread.start()
+
+    def _preview_worker(self, job_ad_url, job_query, token_budget, cancel_token):
+        """Fetch the job ad and build the prompt, then hand the result to the Tk thread."""
+        try:
+            job_ad_content, _, compaction_stats = extract_job_ad_from_url(job_ad_url, token_budget, cancel_token)
+            cancel_token.raise_if_cancelled()
+            prompt = self._generate_prompt(job_query, job_ad_content, job_ad_url)
+        except OperationCancelled:
+            print("gui.preview_query: Preview cancelled.")
+            self.root.after(0, self.finish_background_operation)
+            return
+        except Exception as e:
+            print(f"gui.preview_query: {str(e)}")
+            self.root.after(0, self.finish_background_operation)
+            self.root.after(0, messagebox.showerror, "Error", f"Failed to fetch job ad content:\n{str(e)}")
+            return
+        self.root.after(0, self._show_preview, job_ad_url, token_budget, job_ad_content, compaction_stats, prompt)
 
-        job_query = self.settings.get("job_query", "")
-        additional_instructions = "\n# Weitere zusätzliche Anweisungen: \n" + self.instructions_text.get("1.0", tk.END).strip() 
-        job_query = job_query + "\n" + additional_instructions
-        prompt = self._generate_prompt(job_query, job_ad_content, job_ad_url)
+    def _show_preview(self, job_ad_url, token_budget, job_ad_content, compaction_stats, prompt):
+        """Display the preview window. Runs on the Tk thread."""
+        self.finish_background_operation()
+        # A following "Generate" for the same URL reuses the fetched content for a while
+        self.prefetched_job_ad = (job_ad_url, token_budget, job_ad_content, time.monotonic())
 
         # Display the preview in a resizable window
         self.preview_window = tk.Toplevel(self.root)
         self.preview_window.title("Query Preview")
         self.preview_window.geometry("600x400")
-        self.preview_window.rowconfigure(0, weight=1)
+        self.preview_window.rowconfigure(1, weight=1)
         self.preview_window.columnconfigure(0, weight=1)
 
         # Bind the Escape key to close the window
@@ -281,221 +372,187 @@ class JobAppGeneratorApp:
 
         self.preview_window.focus_set()
 
+        # Show how much the job ad content was compacted
+        token_info = (f"Job Ad Inhalt: {compaction_stats['tokens_before']} Tokens vor, "
+                      f"{compaction_stats['tokens_after']} Tokens nach der Kürzung (Budget: {compaction_stats['token_budget']})")
+        if compaction_stats["truncated"]:
+            token_info += ", gekürzt"
+        tk.Label(self.preview_window, text=token_info, anchor="w").grid(row=0, column=0, columnspan=2, sticky="we", padx=5)
+
         preview_textbox = tk.Text(self.preview_window)
         preview_textbox.insert(tk.END, prompt)
-        preview_textbox.grid(row=0, column=0, sticky="nsew")
+        preview_textbox.grid(row=1, column=0, sticky="nsew")
 
         scrollbar = tk.Scrollbar(self.preview_window, command=preview_textbox.yview)
         preview_textbox.config(yscrollcommand=scrollbar.set)
-        scrollbar.grid(row=0, column=1, sticky="ns")
+        scrollbar.grid(row=1, column=1, sticky="ns")
 
 
     def run_generate_thread(self):
-        """Run the generate_application in a separate thread to avoid blocking Tkinter main loop."""
-        print("gui.run_generate_thread: Disabling buttons, starting thread")
-        self.disable_buttons()
-        self.clear_output_text("Generating... Please wait...")
-        # Start the background task
-        thread = threading.Thread(target=self.generate_application)
-        thread.start()
-
-
-    def generate_application(self):
-        """Generate the job application asynchronously and save job ad content as a file."""
-        print("gui.generate_application: Starting application generation...")
-
+        """Run the generation pipeline in a separate thread."""
         job_ad_url = self.job_ad_var.get()
         if not job_ad_url:
-            self.display_error("Please provide the job ad URL.")
-            self.enable_buttons()
-            print("gui.generate_application: Error: No job ad URL provided.")
-            return
-
-        print(f"Job Ad URL: {job_ad_url}")
-        job_ad_content = self.fetch_job_ad_content(job_ad_url)
-        if not job_ad_content:
-            self.enable_buttons()
-            print("gui.generate_application: Error: Failed to fetch job ad content.")
+            messagebox.showerror("Error", "Please provide the job ad URL.")
+            print("gui.run_generate_thread: Error: No job ad URL provided.")
             return
-
-        job_query = self.settings.get("job_query", "")
-        additional_instructions = "\n# Weitere zusätzliche Anweisungen: \n" + self.instructions_text.get("1.0", tk.END).strip() 
-        job_query = job_query + "\n" + additional_instructions
-        print(f"gui.generate_application: Job Query: {job_query}")
-        prompt = self._generate_prompt(job_query, job_ad_content, job_ad_url)
-        print(f"gui.generate_application: Prompt generated: {prompt}")
-
-        # Generate the job application with ChatGPT
-        try:
-            print("gui.generate_application: Sending request to ChatGPT API...")
-            job_application = generate_job_application(prompt)
-            print("gui.generate_application: Response from ChatGPT received.")
-            # Update the UI with job application on the main thread
-            self.clear_output_text(job_application)
-
-        except Exception as e:
-            print(f"An unexpected error occurred: {str(e)}")
-        finally:
-            self.enable_buttons()
-
-        # Extract company_name and job_title from ChatGPT response
-        company_name, job_title = self.extract_meta_information(job_application)
-        print(f"gui.generate_application: Extracted company name: {company_name}, job title: {job_title}")
-
-        # Construct filename: {company_name}_{job_title}.mhtml
-        if company_name and job_title:
-            filename = f"{company_name}_{job_title}.html".replace(' ', '_')
-            filename = re.sub(r'[<>:"/\\|?*%#@!&$^]', '', filename)
-            filepath = os.path.join(self.settings.get("working_folder", ""), filename)
-
-        success, error = save_webpage(job_ad_url, filepath)
-        if success:
-            print(f"gui.save_webpage_in_main_thread: Webpage saved successfully as {filepath}.")
-            self.create_word_document_from_template(filepath, job_application)
-        else:
-            print(f"gui.save_webpage_in_main_thread: Failed to save webpage: {error}")
-
-
-    def create_word_document_from_template(self, html_filepath, generated_text):
-        """Create a Word document from the template and replace placeholder text with generated content."""
-        print(f"gui.create_word_document_from_template: Create word document in working path folder and insert GTP reply.")
- 
-        pythoncom.CoInitialize()
-
         working_folder = self.settings.get("working_folder")
-        word_template = self.settings.get("word_template")
-    
-        if not working_folder or not word_template:
-            print(f"\ngui.create_word_document_from_template: Error: No working folder or word template specified.\n")
-            return
-        
-        if not os.path.exists(working_folder):
-            print(f"\ngui.create_word_document_from_template: Error: Working folder does not exist.\n")
-            return
-    
-        if not os.path.exists(word_template):
-            print(f"\ngui.create_word_document_from_template: Error: Word template does not exist.\n")
+        if not working_folder:
+            messagebox.showerror("Error", "Please select a working folder.")
+            print("gui.run_generate_thread: Error: No working folder selected.")
             return
-    
-        html_filename = os.path.basename(html_filepath).replace('.html', '')
-        word_docx_path = os.path.join(working_folder, f"{html_filename}.docx")
-    
-        if os.path.exists(word_docx_path):
-            overwrite = messagebox.askyesno(
-                "Datei existiert bereits",
-                f"Die Datei {html_filename}.docx existiert bereits. Möchten Sie sie überschreiben?"
-            )
-            if not overwrite:
-                print(f"gui.create_word_document_from_template: Skipped creating Word document: {word_docx_path}")
-                return
 
-        try:
-            print("gui.create_word_document_from_template: Trying to generate word document.")
-            word_app = win32.Dispatch("Word.Application")
-            word_app.Visible = False  # Word im Hintergrund starten
-    
-            doc = word_app.Documents.Add(word_template)
-    
-            print("gui.create_word_document_from_template: Trying to Replace placeholder text in word document with ChatGPT's text.")
-            self.replace_placeholder_in_word(doc, "[BEWERBUNGSTEXT]", generated_text)
-
-            doc.SaveAs(word_docx_path)
-            doc.Close()
-    
-            print(f"gui.create_word_document_from_template: Word document created: {word_docx_path}")
-
-            if self.open_after_var.get():
-                print(f"Opening Word document: {word_docx_path}")
-                os.startfile(word_docx_path)  # This will open the Word document
-    
-        except Exception as e:
-            print(f"gui.create_word_document_from_template: Error creating Word document: {str(e)}")
-        finally:
-            word_app.Quit()
-            pythoncom.CoUninitialize()
-
-
-    def replace_placeholder_in_word(self, doc, placeholder, replacement_text):
-        """Replaces the placeholder text in a Word document with the given replacement text."""
-        # Suche im gesamten Dokument nach dem Platzhalter
-        find = doc.Content.Find
-        find.Text = placeholder
-    
-        # Entferne den Platzhalter [BEWERBUNGSTEXT], wenn er gefunden wurde
-        find.Execute(Replace=0)  # wdReplaceNone = 0    
-
-        # Füge den generierten Text an der Position des Platzhalters ein
-        if find.Found:
-            range_obj = find.Parent
-            # Lösche den Platzhalter
-            range_obj.Text = ""
-            # Füge den generierten Text in Abschnitten ein, um Längenbeschränkungen zu vermeiden
-            for paragraph in replacement_text.split("\n"):
-                range_obj.InsertAfter(paragraph + "\n")
-        else:
-            self.output_text.insert(tk.END, f"\nPlaceholder '{placeholder}' not found.\n")
-   
-
-    def run_generate_thread(self):
-        """Run the generate_application in a separate thread."""
-        print("gui.run_generate_thread: Disabling buttons, starting thread")
-
-        job_ad_url = self.job_ad_var.get()
-        
         # Add URL to the history if not already present
         if job_ad_url not in self.settings["last_urls"]:
             self.settings["last_urls"].append(job_ad_url)
             # make sure the list has a maximum of 10 entries
             self.settings["last_urls"] = self.settings["last_urls"][-10:]
             save_settings(self.settings)
-        
+
+        # Read all inputs on the Tk thread, the pipeline must not touch the widgets
+        token_budget = self._get_token_budget()
+        job_ad_content = None
+        if (self.prefetched_job_ad and self.prefetched_job_ad[:2] == (job_ad_url, token_budget)
+                and time.monotonic() - self.prefetched_job_ad[3] < self.PREFETCH_TTL):
+            job_ad_content = self.prefetched_job_ad[2]
+        cancel_token = CancelToken()
+        pipeline = GenerationPipeline(
+            job_ad_url,
+            self._get_job_query(),
+            working_folder,
+            word_template=self.settings.get("word_template"),
+            token_budget=token_budget,
+            force=self.force_regenerate_var.get(),
+            job_ad_content=job_ad_content,
+            timeouts=self.settings.get("stage_timeouts"),
+            cancel_token=cancel_token,
+            on_event=self._on_pipeline_event,
+            consume_stream=self.stream_to_output,
+            confirm_overwrite=self._confirm_overwrite,
+            snapshot_format=self.snapshot_format_var.get(),
+            trace_file=self.settings.get("trace_file") or os.path.join(working_folder, DEFAULT_TRACE_FILE),
+        )
+
+        print("gui.run_generate_thread: Disabling buttons, starting thread")
         self.disable_buttons()
         self.clear_output_text("Generating... Please wait...")
-        
-        # Start the async application generation in a new thread using asyncio.run
-        thread = threading.Thread(target=self.generate_application)
+        self.show_progress("Starting...", cancel_token)
+        thread = threading.Thread(target=self.generate_application, args=(pipeline,), daemon=True)
         thread.start()
-    
+
+
+    def generate_application(self, pipeline):
+        """Run the generation pipeline. Runs on a worker thread."""
+        print(f"gui.generate_application: Starting application generation for {pipeline.job_ad_url}")
+        result = pipeline.run()
+        self.root.after(0, self._finish_generation, result)
+
+    def _on_pipeline_event(self, event):
+        """Show the pipeline's progress below the buttons. Called on the pipeline thread."""
+        self.root.after(0, lambda: self.progress_label.config(text=str(event)))
+
+    def _finish_generation(self, result):
+        """Report the outcome of a pipeline run. Runs on the Tk thread."""
+        self.finish_background_operation()
+        print(result.trace.summary())
+        for warning in result.warnings:
+            print(f"gui.generate_application: Warning: {warning}")
+        if result.status == "failed":
+            messagebox.showerror("Error", f"Generating the application failed in stage {result.error}")
+            return
+
+        document = result.files.get("document")
+        if document and self.open_after_var.get():
+            print(f"Opening Word document: {document}")
+            os.startfile(document)  # This will open the Word document
+
+    def _confirm_overwrite(self, word_docx_path):
+        """Ask on the Tk thread whether an existing Word document may be overwritten. Called on the pipeline thread."""
+        answer = {}
+        answered = threading.Event()
+
+        def ask():
+            answer["overwrite"] = messagebox.askyesno(
+                "Datei existiert bereits",
+                f"Die Datei {os.path.basename(word_docx_path)} existiert bereits. Möchten Sie sie überschreiben?"
+            )
+            answered.set()
+
+        self.root.after(0, ask)
+        answered.wait()
+        return answer["overwrite"]
+
 
     def extract_meta_information(self, job_application):
         """Extracts company_name and job_title from ChatGPT's job application response."""
-        print(f"gui.extract_meta_information: Extracting TSV values from GPT response.")
-        try:
-            # Look for the TSV output
-            tsv_match = re.search(r'(\d{2}\.\d{2}\.\d{4})\t([^\t]+)\t([^\t]+)\t([^\t]+)\t([^\t]+)', job_application)
-            if tsv_match:
-                # Extract the company name and job title from the matched TSV line
-                company_name = tsv_match.group(2).strip()
-                job_title = tsv_match.group(4).strip()
-                return company_name, job_title
-            else:
-                # Return None if not found
-                return None, None
-        except Exception as e:
-            print(f"gui.exract_meta_information: Failed to extract metadata: {str(e)}")
-            return None, None
+        return extract_meta_information(job_application)
 
 
-    def fetch_job_ad_content(self, job_ad_url):
-        """Fetch and return job ad content."""
-        try:
-            job_ad_content, _ = extract_job_ad_from_url(job_ad_url)
-            return job_ad_content
-        except Exception as e:
-            print(f"Failed to fetch job ad content: {str(e)}")
-            return None
-
+    def stream_to_output(self, chunks):
+        """
+        Consume streamed text chunks on the calling worker thread and return the full text.
 
-    def generate_application_and_display(self, prompt):
-        """Generate and display the job application."""
+        The chunks are handed to the Tk thread through a queue, which appends them to the
+        output field in batches every OUTPUT_FLUSH_MS milliseconds.
+        """
+        output_queue = queue.Queue()
+        self.root.after(0, self._drain_output_queue, output_queue, True)
+        parts = []
         try:
-            job_application = generate_job_application(prompt)
-            self.clear_output_text(job_application)
-        except Exception as e:
-            print(f"An unexpected error occurred: {str(e)}")
+            for chunk in chunks:
+                parts.append(chunk)
+                output_queue.put(chunk)
         finally:
-            self.enable_buttons()
-
+            # Sentinel: the stream is finished
+            output_queue.put(None)
+        return "".join(parts)
+
+    def _drain_output_queue(self, output_queue, first_batch):
+        """Append all queued chunks to the output field. Runs on the Tk thread."""
+        batch = []
+        finished = False
+        while True:
+            try:
+                chunk = output_queue.get_nowait()
+            except queue.Empty:
+                break
+            if chunk is None:
+                finished = True
+                break
+            batch.append(chunk)
+
+        if batch:
+            if first_batch:
+                # Replace the "Generating..." message with the first text
+                self.output_text.delete(1.0, tk.END)
+                first_batch = False
+            self.output_text.insert(tk.END, "".join(batch))
+            self.output_text.see(tk.END)
+
+        if not finished:
+            self.root.after(self.OUTPUT_FLUSH_MS, self._drain_output_queue, output_queue, first_batch)
+
+    def show_progress(self, message, cancel_token=None):
+        """Show the progress indicator below the buttons. Runs on the Tk thread."""
+        self.cancel_token = cancel_token
+        self.progress_label.config(text=message)
+        self.cancel_button.config(state=tk.NORMAL if cancel_token else tk.DISABLED)
+        self.progress_frame.pack(anchor="w", padx=10, after=self.button_frame)
+        self.progress_bar.start(15)
+
+    def finish_background_operation(self):
+        """Hide the progress indicator and re-enable the buttons. Runs on the Tk thread."""
+        self.progress_bar.stop()
+        self.progress_frame.pack_forget()
+        self.cancel_token = None
+        self.enable_buttons()
+
+    def cancel_operation(self):
+        """Ask the running background operation to stop."""
+        if self.cancel_token is not None:
+            print("gui.cancel_operation: Cancelling...")
+            self.cancel_token.cancel()
+            self.progress_label.config(text="Cancelling...")
+            self.cancel_button.config(state=tk.DISABLED)
 
     def disable_buttons(self):
         """Disable buttons to prevent multiple clicks."""
@@ -0,0 +1,211 @@
+"""
+Parsed HTML pages shared between text extraction and the snapshot.
+
+A fetched page is parsed once into an HtmlDocument. Text extraction only reads the tree,
+inside `with document.reading() as soup:`, and leaves it in a small in-memory store; the
+snapshot, which modifies the tree, takes it out of the store with take_document. A page
+is therefore parsed once per fetch instead of once per consumer.
+
+Consumers may run on different threads, e.g. for the same URL twice in one batch. The
+lazy parse is locked, and take_document only hands over the tree while nobody reads it;
+otherwise, and for readers that come later, the page is parsed again.
+
+The parser backend can be selected with configure_parser:
+    html.parser   Python's parser, the reference behavior (default)
+    lxml          libxml2, much faster, needs `lxml`
+    html5lib      parses like a browser, slow, needs `html5lib`
+    html5-parser  parses like a browser in C, needs `html5-parser`
+An unavailable backend falls back to html.parser.
+"""
+import importlib.util
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from tracing import span
+
+PARSER_BACKENDS = {
+    "html.parser": None,
+    "lxml": "lxml",
+    "html5lib": "html5lib",
+    "html5-parser": "html5_parser",
+}
+DEFAULT_BACKEND = "html.parser"
+# Number of parsed pages kept for the next consumer
+STORE_SIZE = 4
+
+parser_config = {"backend": DEFAULT_BACKEND}
+
+_store = OrderedDict()
+_store_lock = threading.Lock()
+
+
+def available_backends():
+    """Return the names of the backends whose modules are installed."""
+    return [name for name, module in PARSER_BACKENDS.items()
+            if module is None or importlib.util.find_spec(module) is not None]
+
+
+def configure_parser(backend=None):
+    """Select the parser backend. Raises ValueError for unknown names."""
+    if backend is None:
+        return
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Unknown HTML parser '{backend}', expected one of: {', '.join(PARSER_BACKENDS)}")
+    if backend not in available_backends():
+        print(f"html_document.configure_parser: {backend} is not installed, using {DEFAULT_BACKEND}")
+        backend = DEFAULT_BACKEND
+    parser_config["backend"] = backend
+
+
+def parse_html(html, backend=None):
+    """Parse `html` (str or bytes) into a BeautifulSoup tree with the given or configured backend."""
+    backend = backend or parser_config["backend"]
+    if backend == "html5-parser":
+        import html5_parser
+        return html5_parser.parse(html, treebuilder="soup", return_root=False)
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, backend)
+
+
+class HtmlDocument:
+    """
+    A page and its parse tree. The tree is parsed on first access.
+
+    Attributes:
+    ----------
+    html : str or bytes
+        The page source.
+    url : str
+        The URL the page was loaded from, the base for relative links.
+    backend : str
+        The parser backend.
+    parse_seconds : float or None
+        Time spent parsing, None until the tree was accessed.
+    """
+
+    def __init__(self, html, url, backend=None):
+        self.html = html
+        self.url = url
+        self.backend = backend or parser_config["backend"]
+        self.parse_seconds = None
+        self._soup = None
+        self._readers = 0
+        # _lock guards the reader count, _parse_lock the lazy parse and the hand-over
+        self._lock = threading.Lock()
+        self._parse_lock = threading.RLock()
+
+    @property
+    def soup(self):
+        with self._parse_lock:
+            if self._soup is None:
+                with span("parse", url=self.url, backend=self.backend) as parse_span:
+                    self._soup = parse_html(self.html, self.backend)
+                    parse_span.add(bytes=len(self.html))
+                self.parse_seconds = parse_span.duration
+                print(f"html_document.HtmlDocument: parsed {len(self.html)} characters of {self.url} "
+                      f"with {self.backend} in {self.parse_seconds * 1000:.0f} ms")
+            return self._soup
+
+    @contextmanager
+    def reading(self):
+        """Yield the tree for reading; take_document does not hand it over meanwhile."""
+        with self._lock:
+            self._readers += 1
+        try:
+            yield self.soup
+        finally:
+            with self._lock:
+                self._readers -= 1
+
+    def _hand_over(self):
+        """Return a new HtmlDocument owning this tree if nobody reads it; this one parses again if read later."""
+        owned = HtmlDocument(self.html, self.url, self.backend)
+        with self._parse_lock, self._lock:
+            if self._readers == 0 and self._soup is not None:
+                owned._soup, owned.parse_seconds = self._soup, self.parse_seconds
+                self._soup = None
+        return owned
+
+    def serialize(self):
+        """Return the (possibly modified) tree as HTML."""
+        return str(self.soup)
+
+    def iter_serialize(self):
+        """Yield the tree as HTML in pieces, see iter_html."""
+        return iter_html(self.soup)
+
+
+def iter_html(node):
+    """
+    Yield the HTML of a tree in pieces, the same output as str(node) without building it
+    as one string. Every piece is a start tag, an end tag or a complete string node, so a
+    value in an attribute or a text is never split.
+    """
+    from bs4 import BeautifulSoup, NavigableString
+
+    soup = node if isinstance(node, BeautifulSoup) else None
+    # Stack of nodes still to output and end tags (str) to output after their children
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str) and not isinstance(item, NavigableString):
+            yield item
+        elif isinstance(item, NavigableString):
+            yield item.output_ready()
+        elif isinstance(item, BeautifulSoup):
+            stack.extend(reversed(item.contents))
+        elif not item.contents or (len(item.contents) == 1 and isinstance(item.contents[0], NavigableString)):
+            # Most tags hold a single string or nothing, serializing them at once is faster
+            yield str(item)
+        else:
+            if soup is None:
+                soup = _root(item)
+            # An empty copy of the tag serializes its start tag (and end tag) like the tag itself
+            empty = soup.new_tag(item.name, namespace=item.namespace, nsprefix=item.prefix, attrs=item.attrs)
+            empty.can_be_empty_element = item.can_be_empty_element
+            markup = str(empty)
+            end_tag = f"</{empty.prefix + ':' if empty.prefix else ''}{item.name}>"
+            if not markup.endswith(end_tag):
+                # A void element like <br/>, it has no children
+                yield markup
+                continue
+            yield markup[:-len(end_tag)]
+            stack.append(end_tag)
+            stack.extend(reversed(item.contents))
+
+
+def _root(node):
+    while node.parent is not None:
+        node = node.parent
+    return node
+
+
+def get_document(url, html):
+    """
+    Return the stored HtmlDocument for this page, parsing it if needed.
+
+    Read its tree with `document.reading()` and do not modify it; use take_document for that.
+    """
+    with _store_lock:
+        document = _store.get(url)
+        if document is not None and document.html == html:
+            _store.move_to_end(url)
+            return document
+        document = HtmlDocument(html, url)
+        _store[url] = document
+        while len(_store) > STORE_SIZE:
+            _store.popitem(last=False)
+        return document
+
+
+def take_document(url, html):
+    """
+    Return an HtmlDocument for this page that the caller owns and may modify, reusing the
+    stored parse tree unless another thread is reading it.
+    """
+    with _store_lock:
+        document = _store.pop(url, None)
+    if document is not None and document.html == html:
+        return document._hand_over()
+    return HtmlDocument(html, url)
@@ -1,20 +1,89 @@
 ## job_application_generator.py
-import openai
-from utils import load_api_key_from_file
-
-def generate_job_application(prompt):
-    """Generates the job application using OpenAI's API."""
-    api_key = load_api_key_from_file()
-    if not api_key:
-        raise ValueError("API Key is missing!")
-    
-    openai.api_key = api_key
-    
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",
-        messages=[
-            {"role": "system", "content": "Du bist ein professioneller Assistent, der auf Deutsch (Schweizer Rechtschreibung) antwortet."},
-            {"role": "user", "content": prompt},
-        ]
-    )
-    return response.choices[0].message['content']
+import time
+from openai_client import CallStats, get_client
+from response_cache import response_cache
+from tracing import span
+
+MODEL = "gpt-4o"
+SYSTEM_MESSAGE = "Du bist ein professioneller Assistent, der auf Deutsch (Schweizer Rechtschreibung) antwortet."
+
+
+def _build_messages(prompt):
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _cache_key(prompt):
+    return response_cache.fingerprint(MODEL, SYSTEM_MESSAGE, prompt)
+
+
+def _cached_response(prompt, force):
+    """Return the cached response for the prompt. With `force`, the cached response is discarded instead."""
+    if force:
+        # Dropped even if the new request fails, the user asked not to use it again
+        invalidate_cached_response(prompt)
+        print("job_application_generator: force regenerate, cached response discarded")
+        return None
+    content = response_cache.get(_cache_key(prompt))
+    if content is not None:
+        print("job_application_generator: response cache hit, no request sent to ChatGPT")
+    return content
+
+
+def invalidate_cached_response(prompt):
+    """Remove the cached response of a prompt, so the next generation sends a new request."""
+    response_cache.invalidate(_cache_key(prompt))
+
+
+def generate_job_application(prompt, force=False):
+    """Generates the job application using OpenAI's API. Identical requests are answered from the response cache unless `force` is set."""
+    content = _cached_response(prompt, force)
+    if content is not None:
+        return content
+
+    with span("llm", model=MODEL) as llm_span:
+        content, stats = get_client().chat(MODEL, _build_messages(prompt))
+        llm_span.add(bytes=len(content.encode("utf-8")), items=stats.completion_tokens)
+    print(f"job_application_generator.generate_job_application: {stats}")
+    response_cache.put(_cache_key(prompt), MODEL, content)
+    return content
+
+
+def stream_job_application(prompt, force=False):
+    """Generates the job application using OpenAI's API and yields the text in chunks as it arrives."""
+    content = _cached_response(prompt, force)
+    if content is not None:
+        yield content
+        return
+
+    stats = CallStats()
+    start = time.monotonic()
+    first_chunk_at = None
+    parts = []
+
+    # The span includes the time the consumer needs per chunk, e.g. to update the GUI
+    with span("llm", model=MODEL) as llm_span:
+        for content in get_client().stream_chat(MODEL, _build_messages(prompt), stats):
+            if first_chunk_at is None:
+                first_chunk_at = time.monotonic()
+                llm_span.add(first_token=round(first_chunk_at - start, 3))
+            parts.append(content)
+            llm_span.add(bytes=len(content.encode("utf-8")))
+            yield content
+        llm_span.add(items=stats.completion_tokens)
+
+    end = time.monotonic()
+    print(f"job_application_generator.stream_job_application: {stats}")
+    if first_chunk_at is None:
+        print(f"job_application_generator.stream_job_application: no content received after {end - start:.2f}s")
+        return
+    # Only complete responses are cached
+    response_cache.put(_cache_key(prompt), MODEL, "".join(parts))
+
+    generation_time = end - first_chunk_at
+    chunk_count = stats.completion_tokens
+    tokens_per_second = chunk_count / generation_time if generation_time > 0 else float(chunk_count)
+    print(f"job_application_generator.stream_job_application: time to first token {first_chunk_at - start:.2f}s, "
+          f"{chunk_count} tokens in {end - start:.2f}s ({tokens_per_second:.1f} tokens/s)")
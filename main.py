@@ -1,8 +1,29 @@
 ## main.py
-import tkinter as tk
-from gui import JobAppGeneratorApp
+import multiprocessing
+import time
+
+
+def report_first_paint(event):
+    root.unbind("<Expose>")
+    import_profiler.report(first_paint=time.perf_counter())
+
 
 if __name__ == "__main__":
+    # Needed for the PDF process pool in the PyInstaller build
+    multiprocessing.freeze_support()
+
+    # Measure the imports of the GUI, the report is printed to the log panel after the first frame.
+    # Only here: the workers of the PDF process pool import this module again where processes
+    # are spawned (Windows, macOS) and must neither install the profiler nor load the GUI
+    from startup_profile import ImportProfiler
+    import_profiler = ImportProfiler().install()
+
+    import tkinter as tk
+    from gui import JobAppGeneratorApp
+
+    import_profiler.uninstall()
+
     root = tk.Tk()
     app = JobAppGeneratorApp(root)
+    root.bind("<Expose>", report_first_paint)
     root.mainloop()
@@ -0,0 +1,257 @@
+import email.utils
+import random
+import threading
+import time
+
+from content_compactor import count_tokens
+from utils import load_api_key_from_file
+
+# Client side budget, keep it slightly below the limits of the account
+REQUESTS_PER_MINUTE = 450
+TOKENS_PER_MINUTE = 28000
+REQUEST_TIMEOUT = 120  # seconds per request
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0     # seconds
+BACKOFF_MAX = 60.0     # seconds
+COMPLETION_TOKEN_RESERVE = 1000  # tokens reserved for the answer before it is known
+
+
+class CallStats:
+    """Retries, waiting time and token usage of one API call."""
+
+    def __init__(self):
+        self.attempts = 0
+        self.retries = 0
+        self.wait_time = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.reserved_tokens = 0
+        self.elapsed = 0.0
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def __str__(self):
+        return (f"{self.attempts} attempt(s), {self.retries} retries, waited {self.wait_time:.1f}s, "
+                f"{self.prompt_tokens} prompt + {self.completion_tokens} completion tokens, {self.elapsed:.1f}s total")
+
+
+class RateBudget:
+    """
+    Token buckets for requests and tokens per minute.
+
+    acquire() blocks until a request with the given number of tokens fits into both
+    budgets, so concurrent callers (e.g. batch runs) spread out instead of running into
+    HTTP 429. pause() blocks all callers, e.g. when the server sent a Retry-After header.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens):
+        """Reserve one request and `tokens` tokens. Returns the seconds spent waiting."""
+        # A single request bigger than the whole budget must still be possible
+        tokens = min(tokens, self.tokens_per_minute)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                delay = self._paused_until - time.monotonic()
+                if delay <= 0:
+                    if self._requests >= 1 and self._tokens >= tokens:
+                        self._requests -= 1
+                        self._tokens -= tokens
+                        return waited
+                    missing_requests = max(0.0, 1 - self._requests) / self.requests_per_minute
+                    missing_tokens = max(0.0, tokens - self._tokens) / self.tokens_per_minute
+                    delay = max(missing_requests, missing_tokens) * 60
+            time.sleep(delay)
+            waited += delay
+
+    def refund(self, tokens):
+        """Give back tokens that were reserved but not used."""
+        with self._lock:
+            self._tokens = min(self.tokens_per_minute, self._tokens + tokens)
+
+    def consume(self, tokens):
+        """Charge tokens that were used beyond the reservation."""
+        with self._lock:
+            self._tokens -= tokens
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed_minutes = (now - self._updated) / 60
+        self._updated = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed_minutes * self.requests_per_minute)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed_minutes * self.tokens_per_minute)
+
+
+class OpenAIClient:
+    """
+    A client for the ChatGPT API that retries transient failures.
+
+    The API key is loaded once and one pooled HTTP session is shared by all calls. Rate
+    limit (429) and server (5xx) errors are retried with jittered exponential backoff,
+    honouring the Retry-After header. A client side RateBudget keeps concurrent callers
+    within the request and token limits.
+    """
+
+    def __init__(self, budget=None, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES, api_key=None, api_base=None):
+        self.budget = budget or RateBudget()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        # Another OpenAI compatible endpoint, e.g. the stub of the benchmarks
+        self.api_base = api_base
+        self._api_key = api_key
+        self._lock = threading.Lock()
+
+    def _ensure_ready(self):
+        import openai
+        import requests
+
+        with self._lock:
+            if self._api_key is None:
+                api_key = load_api_key_from_file()
+                if not api_key:
+                    raise ValueError("API Key is missing!")
+                self._api_key = api_key
+            if not isinstance(openai.requestssession, requests.Session):
+                # Reuse one connection pool for all requests instead of one per thread
+                openai.requestssession = requests.Session()
+            return self._api_key
+
+    def chat(self, model, messages):
+        """Send a chat completion request. Returns a tuple (content, CallStats)."""
+        stats = CallStats()
+        response = self._create(stats, model=model, messages=messages)
+        usage = response.get("usage") or {}
+        self._settle_tokens(stats, usage.get("prompt_tokens", stats.prompt_tokens), usage.get("completion_tokens", 0))
+        return response.choices[0].message['content'], stats
+
+    def stream_chat(self, model, messages, stats=None):
+        """
+        Send a streamed chat completion request and yield the content chunks.
+
+        Retries only happen before the first chunk was received. The given CallStats
+        object is filled in while the stream is consumed.
+        """
+        stats = stats if stats is not None else CallStats()
+        response = self._create(stats, model=model, messages=messages, stream=True)
+        start = time.monotonic() - stats.elapsed
+        completion_tokens = 0
+        try:
+            for chunk in response:
+                content = chunk.choices[0].delta.get('content')
+                if content:
+                    # Each streamed chunk carries one token
+                    completion_tokens += 1
+                    yield content
+        finally:
+            stats.elapsed = time.monotonic() - start
+            self._settle_tokens(stats, stats.prompt_tokens, completion_tokens)
+
+    def _create(self, stats, **kwargs):
+        import openai
+
+        api_key = self._ensure_ready()
+        start = time.monotonic()
+        stats.prompt_tokens = sum(count_tokens(m["content"]) for m in kwargs["messages"])
+        reserved = stats.prompt_tokens + COMPLETION_TOKEN_RESERVE
+
+        while True:
+            stats.wait_time += self.budget.acquire(reserved)
+            stats.attempts += 1
+            try:
+                if self.api_base:
+                    kwargs["api_base"] = self.api_base
+                response = openai.ChatCompletion.create(api_key=api_key, request_timeout=self.timeout, **kwargs)
+                stats.elapsed = time.monotonic() - start
+                stats.reserved_tokens = reserved
+                return response
+            except openai.error.OpenAIError as e:
+                self.budget.refund(reserved)
+                if not self._is_retryable(e) or stats.retries >= self.max_retries:
+                    stats.elapsed = time.monotonic() - start
+                    print(f"openai_client.OpenAIClient: giving up after {stats}. Error: {e}")
+                    raise
+                delay = self._backoff(stats.retries, e)
+                stats.retries += 1
+                stats.wait_time += delay
+                print(f"openai_client.OpenAIClient: {type(e).__name__}, retry {stats.retries}/{self.max_retries} "
+                      f"in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _settle_tokens(self, stats, prompt_tokens, completion_tokens):
+        """Correct the budget reservation with the tokens that were actually used."""
+        stats.prompt_tokens = prompt_tokens
+        stats.completion_tokens = completion_tokens
+        difference = stats.total_tokens - stats.reserved_tokens
+        if difference > 0:
+            self.budget.consume(difference)
+        else:
+            self.budget.refund(-difference)
+
+    def _is_retryable(self, error):
+        import openai
+
+        if isinstance(error, (openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                              openai.error.APIConnectionError, openai.error.Timeout, openai.error.TryAgain)):
+            return True
+        status = getattr(error, "http_status", None)
+        return isinstance(error, openai.error.APIError) and (status is None or status >= 500)
+
+    def _backoff(self, retry, error):
+        # Full jitter: random delay up to an exponentially growing cap
+        delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** retry))
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            self.budget.pause(retry_after)
+            delay = max(delay, retry_after)
+        return delay
+
+    def _retry_after(self, error):
+        headers = getattr(error, "headers", None) or {}
+        value = headers.get("Retry-After") or headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            retry_at = email.utils.parsedate_to_datetime(value)
+            return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the shared OpenAIClient of this process."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OpenAIClient()
+        return _client
+
+
+def configure_client(**kwargs):
+    """Replace the shared client with one created with `kwargs` (see OpenAIClient) and return it."""
+    global _client
+    with _client_lock:
+        _client = OpenAIClient(**kwargs)
+        return _client
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class PageCache:
+    """
+    A content cache keyed by URL, shared by the extract, preview and snapshot stages.
+
+    Each URL maps to an entry holding several fields, e.g. the rendered HTML, the
+    extracted text or the text of a PDF. Entries live in memory in LRU order and expire
+    after `ttl` seconds. If a disk directory is set, entries are also written there as
+    JSON files so that a restart of the application can reuse them.
+
+    The disk files are read and written outside the lock of the entries, so a slow disk
+    does not block lookups of other threads.
+
+    Attributes:
+    ----------
+    ttl : float
+        Time to live of an entry in seconds.
+    max_bytes : int
+        Size budget of the entries in memory (approximately, counted in characters).
+    max_disk_bytes : int
+        Size budget of the files on disk.
+    """
+
+    def __init__(self, ttl=1800, max_bytes=64 * 1024 * 1024, max_disk_bytes=256 * 1024 * 1024, disk_dir=None):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Serializes the disk files; the version of the entry last written per URL, so an
+        # older state never overwrites a newer one
+        self._disk_lock = threading.Lock()
+        self._disk_versions = {}
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    def set_disk_dir(self, disk_dir):
+        """Enable (or with None, disable) the on-disk layer in the given directory."""
+        with self._lock:
+            self.disk_dir = disk_dir
+
+    def get(self, url, field):
+        """Return the cached value of `field` for `url`, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None and not self._expired(entry):
+                self._entries.move_to_end(url)
+            else:
+                entry = None
+            disk_dir = self.disk_dir
+
+        if entry is None and disk_dir:
+            entry = self._load_from_disk(disk_dir, url)
+
+        with self._lock:
+            if entry is not None and url not in self._entries:
+                self._store(url, entry)
+            value = entry["fields"].get(field) if entry else None
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            hits, misses = self.hits, self.misses
+
+        state = "miss" if value is None else "hit"
+        print(f"page_cache.get: {state} for {field} of {url} (hits: {hits}, misses: {misses})")
+        return value
+
+    def put(self, url, field, value):
+        """Store `value` as `field` of the entry for `url`."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or self._expired(entry):
+                entry = {"created": time.time(), "fields": {}}
+            else:
+                self._bytes -= entry["size"]
+            entry["fields"][field] = value
+            self._store(url, entry)
+            self._version += 1
+            version = self._version
+            created, fields = entry["created"], dict(entry["fields"])
+            disk_dir = self.disk_dir
+
+        if disk_dir:
+            self._save_to_disk(disk_dir, url, created, fields, version)
+
+    def clear(self):
+        """Remove all entries from memory and disk."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            disk_dir = self.disk_dir
+        with self._disk_lock:
+            self._disk_versions.clear()
+            if disk_dir and os.path.isdir(disk_dir):
+                for name in os.listdir(disk_dir):
+                    if name.endswith(".json"):
+                        self._remove_file(os.path.join(disk_dir, name))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def _expired(self, entry):
+        return time.time() - entry["created"] > self.ttl
+
+    def _store(self, url, entry):
+        entry["size"] = _size(entry["fields"])
+        self._entries[url] = entry
+        self._entries.move_to_end(url)
+        self._bytes += entry["size"]
+        # The newest entry is kept even if it alone exceeds the budget
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted["size"]
+
+    def _disk_path(self, disk_dir, url):
+        return os.path.join(disk_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _load_from_disk(self, disk_dir, url):
+        path = self._disk_path(disk_dir, url)
+        with self._disk_lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                return None
+            entry = {"created": data.get("created", 0), "fields": data.get("fields", {})}
+            if data.get("url") != url or self._expired(entry):
+                self._remove_file(path)
+                return None
+            try:
+                os.utime(path)  # mark as recently used for the disk LRU
+            except OSError:
+                pass
+        return entry
+
+    def _save_to_disk(self, disk_dir, url, created, fields, version):
+        with self._disk_lock:
+            if self._disk_versions.get(url, 0) > version:
+                return
+            try:
+                os.makedirs(disk_dir, exist_ok=True)
+                path = self._disk_path(disk_dir, url)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"url": url, "created": created, "fields": fields}, f)
+                os.replace(tmp_path, path)
+                self._disk_versions[url] = version
+                self._evict_disk(disk_dir, path)
+            except OSError as e:
+                print(f"page_cache.put: Failed to write cache file. Error: {e}")
+
+    def _evict_disk(self, disk_dir, newest_path):
+        files = []
+        for name in os.listdir(disk_dir):
+            if name.endswith(".json"):
+                path = os.path.join(disk_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            if path != newest_path:
+                self._remove_file(path)
+                total -= size
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _size(value):
+    """Approximate memory size of a cached value: characters of strings, bytes of bytes."""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(_size(key) + _size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(_size(item) for item in value)
+    return 16
+
+
+# Shared instance used by utils and webpage_saver
+page_cache = PageCache()
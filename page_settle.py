@@ -0,0 +1,118 @@
+import time
+
+# Available strategies to decide when a freshly loaded page is ready to be read:
+#   ready_state  - document.readyState is 'complete'
+#   network_idle - ready_state, then no new resource requests for `idle_time` seconds
+#   dom_quiet    - ready_state, then no DOM mutations for `idle_time` seconds
+#   selector     - an element matching a CSS selector is present
+SETTLE_STRATEGIES = ("ready_state", "network_idle", "dom_quiet", "selector")
+
+settle_config = {
+    "strategy": "network_idle",
+    "timeout": 15.0,      # hard upper limit in seconds
+    "idle_time": 0.5,     # quiet window for network_idle and dom_quiet
+    "selector": None,     # CSS selector for the 'selector' strategy
+}
+
+POLL_INTERVAL = 0.1
+
+_INSTALL_MUTATION_OBSERVER = """
+if (!window.__settleObserver) {
+    window.__lastMutation = performance.now();
+    window.__settleObserver = new MutationObserver(function () {
+        window.__lastMutation = performance.now();
+    });
+    window.__settleObserver.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+return performance.now() - window.__lastMutation;
+"""
+
+
+def configure_settle(strategy=None, timeout=None, idle_time=None, selector=None):
+    """Update the settle configuration used by wait_for_page_settled. None keeps the current value."""
+    if strategy is not None:
+        if strategy not in SETTLE_STRATEGIES:
+            raise ValueError(f"Unknown settle strategy: {strategy}. Choose one of {', '.join(SETTLE_STRATEGIES)}.")
+        settle_config["strategy"] = strategy
+    if timeout is not None:
+        settle_config["timeout"] = float(timeout)
+    if idle_time is not None:
+        settle_config["idle_time"] = float(idle_time)
+    if selector is not None:
+        settle_config["selector"] = selector or None
+
+
+def wait_for_page_settled(driver, strategy=None, timeout=None, idle_time=None, selector=None):
+    """
+    Block until the page loaded in `driver` has settled according to the chosen strategy.
+
+    Returns a tuple (elapsed_seconds, settled). `settled` is False if the hard timeout
+    was hit before the page became ready; the caller may still read the page in that case.
+    """
+    strategy = strategy or settle_config["strategy"]
+    timeout = settle_config["timeout"] if timeout is None else timeout
+    idle_time = settle_config["idle_time"] if idle_time is None else idle_time
+    selector = selector or settle_config["selector"]
+
+    if strategy == "selector" and not selector:
+        print("page_settle.wait_for_page_settled: no selector configured, falling back to ready_state")
+        strategy = "ready_state"
+
+    start = time.monotonic()
+    deadline = start + timeout
+
+    if strategy == "selector":
+        settled = _wait_until(deadline, lambda: _selector_present(driver, selector))
+    else:
+        settled = _wait_until(deadline, lambda: _ready_state_complete(driver))
+        if settled and strategy == "network_idle":
+            settled = _wait_for_network_idle(driver, deadline, idle_time)
+        elif settled and strategy == "dom_quiet":
+            settled = _wait_until(deadline, lambda: driver.execute_script(_INSTALL_MUTATION_OBSERVER) >= idle_time * 1000)
+
+    elapsed = time.monotonic() - start
+    if settled:
+        print(f"page_settle.wait_for_page_settled: page settled after {elapsed:.2f}s ({strategy})")
+    else:
+        print(f"page_settle.wait_for_page_settled: timeout after {elapsed:.2f}s ({strategy}), using page as is")
+    return elapsed, settled
+
+
+def _wait_until(deadline, condition):
+    while True:
+        try:
+            if condition():
+                return True
+        except Exception:
+            # The page may be navigating while we poll, just try again
+            pass
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+
+
+def _ready_state_complete(driver):
+    return driver.execute_script("return document.readyState") == "complete"
+
+
+def _selector_present(driver, selector):
+    return driver.execute_script("return document.querySelector(arguments[0]) !== null", selector)
+
+
+def _wait_for_network_idle(driver, deadline, idle_time):
+    """Wait until the number of loaded resources did not change for `idle_time` seconds."""
+    last_count = None
+    quiet_since = time.monotonic()
+    while time.monotonic() < deadline:
+        try:
+            count = driver.execute_script("return performance.getEntriesByType('resource').length")
+        except Exception:
+            count = None
+        now = time.monotonic()
+        if count != last_count:
+            last_count = count
+            quiet_since = now
+        elif now - quiet_since >= idle_time:
+            return True
+        time.sleep(POLL_INTERVAL)
+    return False
@@ -0,0 +1,98 @@
+"""
+Parse and serialize cost of the HTML parser backends.
+
+Usage:
+    python parser_benchmark.py [page.html ...] [--runs N] [--backend NAME ...]
+
+Without files, a synthetic job portal page (navigation, cookie banner, 1500
+job cards, inline scripts and a footer, about 1.2 MB) is used. For every installed
+backend the best of N runs is printed for parsing, extracting the main text and
+serializing the tree back to HTML. html.parser is the reference backend; the text
+length column shows whether another backend sees the same content.
+"""
+import argparse
+import os
+import sys
+import time
+
+from content_compactor import extract_main_text
+from html_document import PARSER_BACKENDS, available_backends, parse_html
+
+DEFAULT_RUNS = 5
+
+
+def synthetic_portal_page(job_cards=1500):
+    """Build a large page that resembles a job portal result page."""
+    navigation = "".join(f'<li><a href="/kategorie/{i}">Kategorie {i}</a></li>' for i in range(80))
+    cards = "".join(
+        f'<article class="job-card" data-id="{i}"><h2><a href="/stelle/{i}">Softwareentwickler/in {i} (m/w/d)</a></h2>'
+        f'<div class="company"><img src="/logos/{i % 50}.png" alt="Firma {i % 50}"> Firma {i % 50} AG</div>'
+        f'<ul class="meta"><li>Zürich</li><li>80-100%</li><li>Festanstellung</li></ul>'
+        f'<p>Wir suchen eine engagierte Persönlichkeit für unser Team. Sie entwickeln &amp; betreiben '
+        f'Webanwendungen mit Python, arbeiten agil und übernehmen Verantwortung. Stelle Nr. {i}.</p>'
+        f'<script type="application/json">{{"id": {i}, "tracking": "{"x" * 200}"}}</script></article>'
+        for i in range(job_cards)
+    )
+    scripts = "".join(f"<script>window.__chunk{i} = '{'a' * 2000}';</script>" for i in range(40))
+    return (
+        '<!DOCTYPE html><html lang="de"><head><meta charset="utf-8"><title>Jobs</title>'
+        '<link rel="stylesheet" href="/static/app.css"><style>body{margin:0} .job-card{padding:1em}</style>'
+        f'</head><body style="overflow: hidden"><div id="cmpbox">Wir verwenden Cookies. <button>OK</button></div>'
+        f'<header><nav class="navbar"><ul>{navigation}</ul></nav></header>'
+        f'<main><h1>{job_cards} Stellen</h1>{cards}</main>'
+        f'<footer class="footer"><p>Impressum · Datenschutz · AGB</p></footer>{scripts}</body></html>'
+    )
+
+
+def measure(html, backend, runs):
+    """Return the best (parse, extract, serialize) seconds over `runs` runs and the text length."""
+    best = [float("inf")] * 3
+    text_length = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        soup = parse_html(html, backend)
+        parsed = time.perf_counter()
+        text_length = len(extract_main_text(soup))
+        extracted = time.perf_counter()
+        str(soup)
+        serialized = time.perf_counter()
+        best = [min(best[0], parsed - start), min(best[1], extracted - parsed), min(best[2], serialized - extracted)]
+    return best, text_length
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the parse and serialize cost of the HTML parser backends.")
+    parser.add_argument("files", nargs="*", help="HTML files to parse (default: a synthetic job portal page).")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Number of runs, the best one counts.")
+    parser.add_argument("--backend", action="append", choices=list(PARSER_BACKENDS),
+                        help="Backend to measure, can be repeated (default: all installed).")
+    args = parser.parse_args(argv)
+
+    pages = []
+    for path in args.files:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            pages.append((os.path.basename(path), f.read()))
+    if not pages:
+        pages.append(("synthetic portal", synthetic_portal_page()))
+
+    installed = available_backends()
+    backends = [backend for backend in (args.backend or PARSER_BACKENDS) if backend in installed]
+    missing = [backend for backend in (args.backend or PARSER_BACKENDS) if backend not in installed]
+    if missing:
+        print(f"parser_benchmark: not installed: {', '.join(missing)}")
+
+    for name, html in pages:
+        print(f"\n{name}: {len(html) / 1024:.0f} KiB, best of {args.runs} runs")
+        print(f"{'backend':<14} {'parse':>9} {'extract':>9} {'serialize':>10} {'text chars':>11}")
+        for backend in backends:
+            try:
+                (parse, extract, serialize), text_length = measure(html, backend, args.runs)
+            except ImportError as e:
+                print(f"{backend:<14} {e}")
+                continue
+            print(f"{backend:<14} {parse * 1000:7.0f}ms {extract * 1000:7.0f}ms {serialize * 1000:8.0f}ms {text_length:>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
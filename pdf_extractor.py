@@ -0,0 +1,154 @@
+import atexit
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+from page_cache import page_cache
+from resource_fetcher import HTTP_TIMEOUT
+from tracing import span
+
+# PDFs bigger than this are not downloaded at all
+MAX_PDF_BYTES = 50 * 1024 * 1024
+# Downloads are kept in memory up to this size and spooled to a temporary file beyond it
+SPOOL_MAX_MEMORY = 4 * 1024 * 1024
+# Documents with at least this many pages are extracted on a process pool
+PARALLEL_PAGE_THRESHOLD = 24
+# Minimum pages per worker; every worker gets one range, so it parses the document once
+PAGES_PER_CHUNK = 8
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Number of extracted texts kept in memory, keyed by the SHA-256 of the PDF
+MEMO_SIZE = 64
+
+
+class PdfTooLargeError(ValueError):
+    """Raised when a PDF exceeds MAX_PDF_BYTES."""
+
+
+_session = None
+_session_lock = threading.Lock()
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def extract_pdf_text(url):
+    """
+    Download the PDF at `url` and return its text.
+
+    The result is cached per URL in the page cache and per content hash in memory, so a
+    PDF linked from an ad is downloaded and parsed once per run, even if both the prompt
+    and the snapshot need it.
+
+    Raises requests.RequestException if the download fails, PdfTooLargeError if the PDF
+    is bigger than MAX_PDF_BYTES and PyPDF2 errors if the file cannot be parsed.
+    """
+    cached_text = page_cache.get(url, "pdf_text")
+    if cached_text is not None:
+        return cached_text
+
+    with span("pdf", url=url) as pdf_span, _download(url) as (pdf_file, digest, size):
+        pdf_span.add(bytes=size)
+        with _memo_lock:
+            text = _memo.get(digest)
+            if text is not None:
+                _memo.move_to_end(digest)
+        if text is None:
+            text, page_count = _extract(pdf_file)
+            pdf_span.add(items=page_count)
+            with _memo_lock:
+                _memo[digest] = text
+                while len(_memo) > MEMO_SIZE:
+                    _memo.popitem(last=False)
+            print(f"pdf_extractor.extract_pdf_text: extracted {len(text)} characters from {url}")
+
+    page_cache.put(url, "pdf_text", text)
+    return text
+
+
+def clear_memo():
+    """Forget the texts extracted in this process, e.g. to measure cold runs."""
+    with _memo_lock:
+        _memo.clear()
+
+
+@contextmanager
+def _download(url):
+    """Stream a PDF into a spooled temporary file while hashing it. Yields (file, sha256, size)."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as pdf_file:
+        digest = hashlib.sha256()
+        size = 0
+        with _get_session().get(url, stream=True, timeout=HTTP_TIMEOUT) as response:
+            response.raise_for_status()
+            declared_size = int(response.headers.get("Content-Length") or 0)
+            if declared_size > MAX_PDF_BYTES:
+                raise PdfTooLargeError(f"PDF is {declared_size} bytes, the limit is {MAX_PDF_BYTES} bytes.")
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_PDF_BYTES:
+                    raise PdfTooLargeError(f"PDF exceeds the limit of {MAX_PDF_BYTES} bytes.")
+                digest.update(chunk)
+                pdf_file.write(chunk)
+        pdf_file.seek(0)
+        yield pdf_file, digest.hexdigest(), size
+
+
+def _get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+        return _session
+
+
+def _extract(pdf_file):
+    """Return the text and the page count of a PDF."""
+    import PyPDF2
+
+    reader = PyPDF2.PdfReader(pdf_file)
+    page_count = len(reader.pages)
+    if page_count < PARALLEL_PAGE_THRESHOLD:
+        return "".join(page.extract_text() for page in reader.pages), page_count
+
+    # Large document: extract ranges of pages on separate processes. The workers read the
+    # PDF from a temporary file instead of receiving its bytes with every task
+    pages_per_range = max(PAGES_PER_CHUNK, math.ceil(page_count / _process_workers()))
+    ranges = [(start, min(start + pages_per_range, page_count)) for start in range(0, page_count, pages_per_range)]
+    fd, pdf_path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pdf_file.seek(0)
+            shutil.copyfileobj(pdf_file, f)
+        chunks = _get_process_pool().map(_extract_page_range, [pdf_path] * len(ranges), *zip(*ranges))
+        return "".join(chunks), page_count
+    finally:
+        os.remove(pdf_path)
+
+
+def _extract_page_range(pdf_path, start, stop):
+    """Worker function: extract the text of pages [start, stop) of the PDF file `pdf_path`."""
+    import PyPDF2
+
+    with open(pdf_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return "".join(reader.pages[i].extract_text() for i in range(start, stop))
+
+
+def _process_workers():
+    return max(1, min(4, (os.cpu_count() or 2) - 1))
+
+
+def _get_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(max_workers=_process_workers())
+            atexit.register(_process_pool.shutdown)
+        return _process_pool
@@ -0,0 +1,372 @@
+"""
+The generation pipeline behind the "Generate" button.
+
+A run goes through the stages fetch -> prompt -> generate -> metadata -> document ->
+snapshot. Every stage runs on its own thread and has a deadline; the pipeline waits for
+it and reports progress events to the caller. If the user cancels or a stage exceeds its
+deadline, the stage's CancelToken is cancelled and its result is discarded.
+
+The snapshot does not depend on the letter, it is started in the background as soon as
+the job ad is fetched and runs while ChatGPT writes. It is saved under a temporary name
+and renamed once the metadata stage knows the file name.
+
+Snapshot and document are optional: if one of them fails or hangs, it is abandoned with
+a warning and the run continues, so the generated letter is never lost.
+
+Every run collects a Trace (see tracing.py) of the work done in its stages. It is
+available as `result.trace` and appended to `trace_file` if one is given.
+"""
+import atexit
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from cancellation import CancelToken, OperationCancelled
+from content_compactor import DEFAULT_TOKEN_BUDGET
+from job_application_generator import stream_job_application
+from tracing import Trace, activate, append_jsonl, in_current_context, span
+from utils import extract_job_ad_from_url, build_prompt, extract_meta_information, build_output_filename
+from webpage_saver import save_webpage
+from snapshot_archive import DEFAULT_FORMAT, SNAPSHOT_FORMATS
+
+STAGES = ("fetch", "prompt", "generate", "metadata", "document", "snapshot")
+# Deadline of every stage in seconds, can be overridden with "stage_timeouts" in settings.json
+DEFAULT_STAGE_TIMEOUTS = {
+    "fetch": 120,
+    "prompt": 10,
+    "generate": 300,
+    "metadata": 10,
+    "snapshot": 180,
+    "document": 120,
+}
+# A failure of these stages only adds a warning, the letter is usable without them
+OPTIONAL_STAGES = ("snapshot", "document")
+# Stages started in the background as soon as the given stage is done
+BACKGROUND_STAGES = {"fetch": ("snapshot",)}
+# Interval in which the pipeline checks for cancellation while a stage is running
+POLL_INTERVAL = 0.1
+
+
+class StageTimeout(Exception):
+    """Raised when a stage exceeds its deadline."""
+
+
+class PipelineEvent:
+    """
+    A progress event of a pipeline run, passed to the `on_event` callback.
+
+    Attributes:
+    ----------
+    stage : str
+        The stage the event belongs to.
+    status : str
+        'started', 'done', 'failed', 'timeout' or 'cancelled'.
+    index : int
+        The number of the stage, starting at 1.
+    elapsed : float or None
+        Seconds the stage took, None for 'started'.
+    message : str or None
+        The error or an additional note.
+    """
+
+    def __init__(self, stage, status, index, elapsed=None, message=None):
+        self.stage = stage
+        self.status = status
+        self.index = index
+        self.elapsed = elapsed
+        self.message = message
+
+    def __str__(self):
+        text = f"[{self.index}/{len(STAGES)}] {self.stage}: {self.status}"
+        if self.elapsed is not None:
+            text += f" after {self.elapsed:.1f}s"
+        if self.message:
+            text += f" ({self.message})"
+        return text
+
+
+class PipelineResult:
+    """
+    The outcome of a pipeline run.
+
+    `status` is 'done', 'failed' or 'cancelled'. `files` maps 'text', 'snapshot' and
+    'document' to the files that were written, `timings` holds the seconds per stage and
+    `trace` the spans of the run.
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.error = None
+        self.warnings = []
+        self.timings = {}
+        self.files = {}
+        self.job_application = None
+        self.company_name = None
+        self.job_title = None
+        self.trace = None
+
+
+class GenerationPipeline:
+    """
+    Generates one job application.
+
+    Parameters:
+    ----------
+    job_ad_url : str
+        The URL of the job ad.
+    job_query : str
+        The job query including the additional instructions.
+    working_folder : str
+        The folder for the letter, the snapshot and the Word document.
+    word_template : str or None
+        The Word template, without it the document stage is skipped.
+    job_ad_content : str or None
+        Already fetched job ad content (e.g. from the preview), skips the fetch.
+    cancel_token : CancelToken or None
+        Cancels the whole run.
+    on_event : callable or None
+        Called with a PipelineEvent on the pipeline thread.
+    consume_stream : callable or None
+        Called on the generate stage's thread with an iterator of text chunks, returns the
+        full text. Defaults to joining the chunks.
+    confirm_overwrite : callable or None
+        Called with the path of an existing Word document, returns True to overwrite it.
+        Existing documents are kept if not given.
+    trace_file : str or None
+        JSONL file the trace of the run is appended to.
+    snapshot_format : str
+        'html', 'mhtml' or 'zip', see snapshot_archive.
+    """
+
+    def __init__(self, job_ad_url, job_query, working_folder, word_template=None,
+                 token_budget=DEFAULT_TOKEN_BUDGET, force=False, job_ad_content=None, timeouts=None,
+                 cancel_token=None, on_event=None, consume_stream=None, confirm_overwrite=None, trace_file=None,
+                 snapshot_format=DEFAULT_FORMAT):
+        self.job_ad_url = job_ad_url
+        self.job_query = job_query
+        self.working_folder = working_folder or ""
+        self.word_template = word_template
+        self.token_budget = token_budget
+        self.force = force
+        self.job_ad_content = job_ad_content
+        self.timeouts = dict(DEFAULT_STAGE_TIMEOUTS, **(timeouts or {}))
+        self.cancel_token = cancel_token or CancelToken()
+        self.on_event = on_event
+        self.consume_stream = consume_stream or "".join
+        self.confirm_overwrite = confirm_overwrite or (lambda path: False)
+        self.trace_file = trace_file
+        self.snapshot_format = snapshot_format
+        self.prompt = None
+        self.basename = None
+        self.snapshot_temp_path = os.path.join(self.working_folder, f".snapshot-{uuid.uuid4().hex}.part")
+        self.result = PipelineResult()
+        # Running stage threads by stage name, see _start_stage
+        self._running = {}
+        self._started = {}
+        self._finished = {}
+
+    def run(self):
+        """Run all stages on the calling thread and return the PipelineResult."""
+        result = self.result
+        result.trace = Trace("generate", url=self.job_ad_url)
+        with activate(result.trace):
+            self._run(result)
+        result.trace.finish(status=result.status)
+        if self.trace_file:
+            append_jsonl(result.trace, self.trace_file)
+        return result
+
+    def _run(self, result):
+        started = time.monotonic()
+        for stage in STAGES:
+            try:
+                message = self._run_stage(stage)
+                self._emit(stage, "done", self._elapsed(stage), message)
+                for background_stage in BACKGROUND_STAGES.get(stage, ()):
+                    self._start_stage(background_stage)
+            except OperationCancelled:
+                self._emit(stage, "cancelled", self._elapsed(stage))
+                result.status = "cancelled"
+                break
+            except Exception as e:
+                status = "timeout" if isinstance(e, StageTimeout) else "failed"
+                self._emit(stage, status, self._elapsed(stage), str(e))
+                if stage in OPTIONAL_STAGES:
+                    result.warnings.append(f"{stage}: {e}")
+                    continue
+                result.status = "failed"
+                result.error = f"{stage}: {e}"
+                break
+            finally:
+                result.timings[stage] = self._elapsed(stage)
+        else:
+            result.status = "done"
+
+        # Background stages of a run that failed or was cancelled are abandoned
+        for stage, (stage_token, thread, _, _) in self._running.items():
+            stage_token.cancel()
+            thread.join(POLL_INTERVAL)
+            discard = getattr(self, f"_discard_{stage}", None)
+            if discard is not None:
+                if thread.is_alive():
+                    # The thread discards its output when it ends, or the process does at exit
+                    atexit.register(discard)
+                else:
+                    discard()
+        self._running.clear()
+
+        timings = ", ".join(f"{stage} {seconds:.1f}s" for stage, seconds in result.timings.items())
+        print(f"pipeline.run: {result.status} after {time.monotonic() - started:.1f}s ({timings})")
+
+    def _start_stage(self, stage):
+        """Start the thread of a stage. Its deadline counts from now."""
+        self._emit(stage, "started")
+        stage_token = CancelToken()
+        outcome = {}
+
+        def target():
+            try:
+                outcome["message"] = getattr(self, f"_stage_{stage}")(stage_token)
+            except BaseException as e:
+                outcome["error"] = e
+            finally:
+                self._finished[stage] = time.monotonic()
+                # An abandoned stage (deadline, cancelled run) leaves nothing behind
+                discard = getattr(self, f"_discard_{stage}", None)
+                if stage_token.cancelled and discard is not None:
+                    discard()
+
+        # The stage runs in the context of the run, its spans go to the run's trace
+        thread = threading.Thread(target=in_current_context(target), name=f"pipeline_{stage}", daemon=True)
+        started = time.monotonic()
+        self._started[stage] = started
+        self._running[stage] = (stage_token, thread, outcome, started)
+        thread.start()
+
+    def _run_stage(self, stage):
+        """
+        Wait until a stage is finished, cancelled or past its deadline, starting it first
+        unless it already runs in the background. If it is cancelled or too late, the
+        stage's token is cancelled and the thread is abandoned; it stops at its next
+        cancellation check.
+        """
+        if stage not in self._running:
+            self._start_stage(stage)
+        stage_token, thread, outcome, started = self._running[stage]
+        timeout = self.timeouts[stage]
+        deadline = started + timeout
+        while thread.is_alive():
+            if self.cancel_token.cancelled:
+                stage_token.cancel()
+                raise OperationCancelled(f"Stage '{stage}' cancelled.")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                stage_token.cancel()
+                raise StageTimeout(f"no result within {timeout}s, abandoned")
+            thread.join(min(remaining, POLL_INTERVAL))
+
+        del self._running[stage]
+        if "error" in outcome:
+            raise outcome["error"]
+        finish = getattr(self, f"_finish_{stage}", None)
+        if finish is not None:
+            return finish(outcome.get("message"))
+        return outcome.get("message")
+
+    def _elapsed(self, stage):
+        """Seconds from the start of a stage until it finished or until now."""
+        started = self._started.get(stage)
+        if started is None:
+            return 0.0
+        return self._finished.get(stage, time.monotonic()) - started
+
+    def _emit(self, stage, status, elapsed=None, message=None):
+        event = PipelineEvent(stage, status, STAGES.index(stage) + 1, elapsed, message)
+        print(f"pipeline.run: {event}")
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def _stage_fetch(self, cancel_token):
+        if self.job_ad_content:
+            return "reusing the content fetched by the preview"
+        self.job_ad_content, _, _ = extract_job_ad_from_url(self.job_ad_url, self.token_budget,
+                                                            cancel_token=cancel_token)
+
+    def _stage_prompt(self, cancel_token):
+        with span("prompt") as prompt_span:
+            self.prompt = build_prompt(self.job_query, self.job_ad_content, self.job_ad_url)
+            prompt_span.add(bytes=len(self.prompt.encode("utf-8")))
+        # The full prompt can be inspected with "Preview Query", the log only gets its size
+        return f"{len(self.prompt)} characters"
+
+    def _stage_generate(self, cancel_token):
+        chunks = stream_job_application(self.prompt, force=self.force)
+        self.result.job_application = self.consume_stream(_cancellable(chunks, cancel_token))
+        cancel_token.raise_if_cancelled()
+
+    def _stage_metadata(self, cancel_token):
+        result = self.result
+        result.company_name, result.job_title = extract_meta_information(result.job_application)
+        if result.company_name and result.job_title:
+            self.basename = build_output_filename(result.company_name, result.job_title, extension="")
+        else:
+            result.warnings.append("Company name and job title not found in the response.")
+            self.basename = f"bewerbung_{datetime.now():%Y%m%d_%H%M%S}"
+        return self.basename
+
+    def _stage_snapshot(self, cancel_token):
+        # Started right after the fetch, the file name is not known yet
+        try:
+            success, error = save_webpage(self.job_ad_url, self.snapshot_temp_path, cancel_token=cancel_token,
+                                          snapshot_format=self.snapshot_format)
+            cancel_token.raise_if_cancelled()
+            if not success:
+                raise RuntimeError(error)
+        except BaseException:
+            if os.path.exists(self.snapshot_temp_path):
+                os.remove(self.snapshot_temp_path)
+            raise
+
+    def _discard_snapshot(self):
+        """Remove the temporary snapshot of a stage that was abandoned or not renamed because the run stopped."""
+        try:
+            os.remove(self.snapshot_temp_path)
+        except OSError:
+            pass
+
+    def _finish_snapshot(self, message):
+        """Move the snapshot to its final name. Runs on the pipeline thread once the metadata is known."""
+        snapshot_path = os.path.join(self.working_folder, f"{self.basename}{SNAPSHOT_FORMATS[self.snapshot_format]}")
+        os.replace(self.snapshot_temp_path, snapshot_path)
+        self.result.files["snapshot"] = snapshot_path
+        return snapshot_path
+
+    def _stage_document(self, cancel_token):
+        if not self.word_template:
+            return "no Word template selected"
+        if not os.path.exists(self.word_template):
+            raise RuntimeError(f"Word template {self.word_template} does not exist.")
+        docx_path = os.path.join(self.working_folder, f"{self.basename}.docx")
+        if os.path.exists(docx_path) and not self.confirm_overwrite(docx_path):
+            return f"kept the existing {docx_path}"
+        cancel_token.raise_if_cancelled()
+
+        # Imported here, Word automation is not available on every platform
+        from word_document import create_word_document
+        success, error = create_word_document(self.word_template, docx_path, self.result.job_application)
+        if not success:
+            raise RuntimeError(error)
+        self.result.files["document"] = docx_path
+        return docx_path
+
+
+def _cancellable(chunks, cancel_token):
+    """Pass the chunks through and stop with OperationCancelled once the token is cancelled."""
+    try:
+        for chunk in chunks:
+            cancel_token.raise_if_cancelled()
+            yield chunk
+    finally:
+        chunks.close()
@@ -0,0 +1,284 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from tracing import in_current_context
+
+# (connect, read) timeout in seconds for every HTTP request, a hung server must not block a run
+HTTP_TIMEOUT = (10, 30)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class FetchResult:
+    """
+    The outcome of fetching one resource.
+
+    Attributes:
+    ----------
+    url : str
+        The requested URL.
+    content : bytes or None
+        The response body, None if the fetch failed. A spooled body is read from its
+        file on every access, use open() to stream it.
+    content_type : str or None
+        The Content-Type header of the response, if any.
+    encoding : str or None
+        The text encoding, as requests would use it for `response.text`.
+    error : Exception or None
+        The requests exception if the fetch failed.
+    elapsed : float
+        Seconds spent fetching the resource.
+    cache_status : str or None
+        'hit' (served from the asset cache), 'revalidated' (304 Not Modified),
+        'miss' (downloaded and stored) or None if no asset cache was used.
+    path : str or None
+        The file holding the body if it was spooled to disk instead of kept in memory.
+    digest : str or None
+        The SHA-256 of the body, known for spooled bodies.
+    size : int
+        The size of the body in bytes.
+    """
+
+    def __init__(self, url, content=None, content_type=None, encoding=None, error=None, elapsed=0.0,
+                 cache_status=None, path=None, digest=None, size=None):
+        self.url = url
+        self._content = content
+        self.content_type = content_type
+        self.encoding = encoding
+        self.error = error
+        self.elapsed = elapsed
+        self.cache_status = cache_status
+        self.path = path
+        self.digest = digest
+        self.size = size if size is not None else len(content or b"")
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def content(self):
+        if self._content is None and self.path is not None:
+            with open(self.path, 'rb') as f:
+                return f.read()
+        return self._content
+
+    def open(self):
+        """Return a binary file object with the body."""
+        if self._content is None and self.path is not None:
+            return open(self.path, 'rb')
+        return io.BytesIO(self._content or b"")
+
+    @property
+    def text(self):
+        """Decode the content the same way `requests.Response.text` does."""
+        return str(self.content, self.encoding or "utf-8", errors="replace")
+
+
+class ResourceFetcher:
+    """
+    Fetches page resources concurrently on a bounded thread pool.
+
+    Every distinct URL is fetched only once per fetcher. Connections are reused through
+    one requests.Session per host, and the number of parallel requests is limited
+    globally (`max_workers`) and per host (`max_per_host`). If an AssetCache is given,
+    cached assets are served from disk or revalidated with a conditional GET.
+
+    With a `spool_dir`, bodies are streamed into files in that directory (cached assets are
+    linked into it) instead of being held in memory; the directory must exist as long as
+    the results are used.
+
+    Usage:
+        with ResourceFetcher() as fetcher:
+            fetcher.prefetch(urls)           # start downloads in the background
+            result = fetcher.get(urls[0])    # wait for a single result
+    """
+
+    def __init__(self, max_workers=8, max_per_host=4, timeout=HTTP_TIMEOUT, asset_cache=None, spool_dir=None):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.spool_dir = spool_dir
+        self.asset_cache = asset_cache if asset_cache is not None and asset_cache.enabled else None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="resource_fetcher")
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._sessions = {}
+        self._host_limits = {}
+        self._started = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def prefetch(self, urls):
+        """Start fetching all given URLs in the background."""
+        for url in urls:
+            self._submit(url)
+
+    def get(self, url):
+        """Return the FetchResult for `url`, fetching it now if it was not prefetched."""
+        return self._submit(url).result()
+
+    def submit(self, func, *args):
+        """Run an arbitrary download job (e.g. a PDF extraction) on the fetcher's thread pool."""
+        # The job runs in the caller's context, so its spans belong to the caller's trace
+        return self._executor.submit(in_current_context(func), *args)
+
+    def _submit(self, url):
+        with self._lock:
+            future = self._futures.get(url)
+            if future is None:
+                future = self._executor.submit(self._fetch, url)
+                self._futures[url] = future
+            return future
+
+    def _host_state(self, url):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[host] = session
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return session, self._host_limits[host]
+
+    def _fetch(self, url):
+        import requests
+
+        start = time.monotonic()
+        cache = self.asset_cache
+        entry = cache.lookup(url) if cache else None
+        if entry and cache.is_fresh(entry):
+            result = self._cached_result(url, entry, "hit", start)
+            if result is not None:
+                return result
+
+        session, host_limit = self._host_state(url)
+        stream = self.spool_dir is not None
+        with host_limit:
+            try:
+                headers = cache.conditional_headers(entry) if entry else None
+                response = session.get(url, headers=headers, timeout=self.timeout, stream=stream)
+                if response.status_code == 304 and entry:
+                    response.close()
+                    result = self._cached_result(url, entry, "revalidated", start)
+                    if result is not None:
+                        cache.revalidated(entry, response.headers)
+                        return result
+                    # The blob vanished in the meantime, download it again unconditionally
+                    response = session.get(url, timeout=self.timeout, stream=stream)
+                with response:
+                    response.raise_for_status()
+                    if stream:
+                        # apparent_encoding would read the whole body into memory
+                        encoding = response.encoding
+                        path, digest, size = self._spool(response)
+                        content = None
+                    else:
+                        encoding = response.encoding or response.apparent_encoding
+                        content, path, digest, size = response.content, None, None, None
+            except requests.RequestException as e:
+                return FetchResult(url, error=e, elapsed=time.monotonic() - start)
+            if cache:
+                if stream:
+                    cache.store_file(url, path, digest, response.headers, encoding)
+                else:
+                    cache.store(url, content, response.headers, encoding)
+            return FetchResult(
+                url,
+                content=content,
+                content_type=response.headers.get("Content-Type"),
+                encoding=encoding,
+                elapsed=time.monotonic() - start,
+                cache_status="miss" if cache else None,
+                path=path,
+                digest=digest,
+                size=size,
+            )
+
+    def _spool(self, response):
+        """Stream a response body into a file of the spool directory. Returns (path, sha256, size)."""
+        path = os.path.join(self.spool_dir, uuid.uuid4().hex)
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'wb') as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        return path, digest.hexdigest(), size
+
+    def _cached_result(self, url, entry, cache_status, start):
+        """Return the FetchResult of an asset cache entry, or None if its blob vanished."""
+        if self.spool_dir is not None:
+            # Linked into the spool directory, the snapshot is written later and the cache
+            # may evict the blob in the meantime
+            path = self.asset_cache.link_into(entry, self.spool_dir)
+            content = None
+            if path is None:
+                return None
+        else:
+            content = self.asset_cache.read(entry)
+            path = None
+            if content is None:
+                return None
+        return FetchResult(
+            url,
+            content=content,
+            content_type=entry["content_type"],
+            encoding=entry["encoding"],
+            elapsed=time.monotonic() - start,
+            cache_status=cache_status,
+            path=path,
+            digest=entry["hash"],
+            size=entry["size"],
+        )
+
+    def _results(self):
+        with self._lock:
+            return [f.result() for f in self._futures.values() if f.done() and f.exception() is None]
+
+    def totals(self):
+        """Return (assets, failed, bytes) of all finished fetches."""
+        results = self._results()
+        return len(results), sum(1 for r in results if not r.ok), sum(r.size for r in results if r.ok)
+
+    def report(self, slowest=5):
+        """Print the total wall time and the per-asset timings of all finished fetches."""
+        wall_time = time.monotonic() - self._started
+        results = self._results()
+        failed = sum(1 for r in results if not r.ok)
+        total_bytes = sum(r.size for r in results if r.ok)
+        print(f"resource_fetcher.report: {len(results)} assets ({failed} failed, {total_bytes / 1024:.0f} KiB) "
+              f"in {wall_time:.2f}s wall time, {sum(r.elapsed for r in results):.2f}s summed fetch time")
+        for r in sorted(results, key=lambda r: r.elapsed, reverse=True)[:slowest]:
+            print(f"  {r.elapsed:6.2f}s  {r.url}")
+        if self.asset_cache:
+            cached = [r for r in results if r.cache_status in ("hit", "revalidated")]
+            hit_ratio = len(cached) / len(results) if results else 0.0
+            hits = sum(1 for r in cached if r.cache_status == "hit")
+            saved_bytes = sum(r.size for r in cached)
+            print(f"resource_fetcher.report: asset cache hit ratio {hit_ratio:.0%} "
+                  f"({hits} hits, {len(cached) - hits} revalidated), {saved_bytes / 1024:.0f} KiB not downloaded")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self.asset_cache:
+            self.asset_cache.flush()
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class ResponseCache:
+    """
+    An on-disk cache of ChatGPT responses keyed by a fingerprint of the request.
+
+    The fingerprint is a SHA-256 over model, system message and prompt, so an identical
+    request (e.g. a second click after a failed Word export) returns the earlier answer
+    immediately. At most `max_entries` responses are kept; the least recently used ones
+    are removed first.
+
+    Attributes:
+    ----------
+    cache_dir : str or None
+        Directory of the cache. The cache is disabled while it is None.
+    max_entries : int
+        Maximum number of cached responses.
+    """
+
+    def __init__(self, cache_dir=None, max_entries=200):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def set_cache_dir(self, cache_dir):
+        """Switch the cache to another directory, None disables it."""
+        with self._lock:
+            self.cache_dir = cache_dir
+
+    @staticmethod
+    def fingerprint(model, system_message, prompt):
+        data = json.dumps([model, system_message, prompt], ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for `key`, or None."""
+        with self._lock:
+            if not self.cache_dir:
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    content = json.load(f)["content"]
+            except (OSError, ValueError, KeyError):
+                return None
+            os.utime(path)  # mark as recently used
+            return content
+
+    def put(self, key, model, content):
+        with self._lock:
+            if not self.cache_dir:
+                return
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                path = self._path(key)
+                with open(path + ".tmp", 'w', encoding='utf-8') as f:
+                    json.dump({"model": model, "created": time.time(), "content": content}, f, ensure_ascii=False)
+                os.replace(path + ".tmp", path)
+                self._evict()
+            except OSError as e:
+                print(f"response_cache.put: Failed to write cache file. Error: {e}")
+
+    def invalidate(self, key):
+        """Remove a single response from the cache."""
+        with self._lock:
+            if self.cache_dir:
+                self._remove(self._path(key))
+
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock:
+            for path in self._files():
+                self._remove(path)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _files(self):
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return []
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".json")]
+
+    def _evict(self):
+        files = self._files()
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_entries]:
+            self._remove(path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Shared instance, the GUI points it to the working folder
+response_cache = ResponseCache()
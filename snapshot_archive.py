@@ -0,0 +1,230 @@
+"""
+Writing page snapshots to disk.
+
+The assets of a snapshot (images and the files referenced by stylesheets) are collected
+in an AssetStore while the page is inlined. The parse tree only holds references to them,
+the bodies stay in the files the ResourceFetcher spooled them to. The writers serialize
+the tree in pieces and copy or encode the asset bodies in chunks into the output file,
+so the memory needed does not grow with the size of the assets.
+
+Formats:
+    html   one file, every asset embedded as a base64 data URI wherever it is used;
+           binary assets become a third bigger and a repeated image is stored per use
+    mhtml  one MHTML file (multipart/related with binary parts), every distinct asset
+           stored once and unencoded; opens directly in Chrome and Edge like the .html
+    zip    index.html and an assets folder in a zip file, text compressed; extract it
+           and open index.html in any browser
+"""
+import base64
+import hashlib
+import io
+import mimetypes
+import re
+import shutil
+import tempfile
+import time
+import uuid
+import zipfile
+from email.utils import formatdate
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+# Extension of the snapshot file per format
+SNAPSHOT_FORMATS = {
+    "html": ".html",
+    "mhtml": ".mhtml",
+    "zip": ".zip",
+}
+DEFAULT_FORMAT = "html"
+ASSET_FOLDER = "assets"
+# Assets of these types are compressed already, the zip stores them as they are
+STORED_TYPES = ("image/png", "image/jpeg", "image/gif", "image/webp", "image/avif", "font/woff", "font/woff2")
+# Bytes read per step when copying or encoding an asset; a multiple of 3, so the
+# base64 of the pieces joins up to the base64 of the whole asset
+COPY_CHUNK_SIZE = 3 * 64 * 1024
+# Characters of serialized HTML collected before they are written
+WRITE_BUFFER_SIZE = 256 * 1024
+
+
+def snapshot_extension(snapshot_format):
+    """Return the file extension of a format. Raises ValueError for unknown formats."""
+    if snapshot_format not in SNAPSHOT_FORMATS:
+        raise ValueError(f"Unknown snapshot format '{snapshot_format}', expected one of: {', '.join(SNAPSHOT_FORMATS)}")
+    return SNAPSHOT_FORMATS[snapshot_format]
+
+
+class AssetStore:
+    """
+    The distinct assets of a snapshot, keyed by the SHA-256 of their content.
+
+    add() returns the reference the page uses for an asset: its relative path for the
+    archive formats, a placeholder that write_html replaces by the data URI for 'html'.
+    Adding the same content again returns the same reference and stores nothing.
+
+    Used as a context manager, the store provides `spool_dir`, a temporary directory for
+    the ResourceFetcher's downloads that is removed on exit.
+    """
+
+    def __init__(self, snapshot_format=DEFAULT_FORMAT):
+        snapshot_extension(snapshot_format)
+        self.snapshot_format = snapshot_format
+        # Unique per snapshot, it cannot occur in the page by chance
+        self.placeholder = f"snapshot-asset-{uuid.uuid4().hex}-"
+        self.assets = {}
+        self.references = 0
+        self.duplicate_bytes = 0
+        self._spool = None
+
+    def __enter__(self):
+        self._spool = tempfile.TemporaryDirectory(prefix="snapshot_")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._spool.cleanup()
+        self._spool = None
+
+    @property
+    def spool_dir(self):
+        return self._spool.name if self._spool is not None else None
+
+    def add(self, source, mime_type, digest=None, size=None):
+        """
+        Add an asset and return its reference. `source` is the body (bytes) or the path of
+        a file holding it; `digest` (SHA-256) and `size` are computed for bytes if missing.
+        """
+        mime_type = (mime_type or "application/octet-stream").split(";")[0].strip().lower()
+        if isinstance(source, bytes):
+            digest = digest or hashlib.sha256(source).hexdigest()
+            size = len(source)
+        key = digest[:24]
+        self.references += 1
+        if key in self.assets:
+            self.duplicate_bytes += size or 0
+            return self._reference(key)
+        extension = mimetypes.guess_extension(mime_type) or ".bin"
+        self.assets[key] = (f"{ASSET_FOLDER}/{key}{extension}", mime_type, source, size)
+        return self._reference(key)
+
+    def _reference(self, key):
+        if self.snapshot_format == "html":
+            return f"{self.placeholder}{key}"
+        return self.assets[key][0]
+
+    def __iter__(self):
+        """Yield (path, mime type, source) of every distinct asset."""
+        return ((path, mime_type, source) for path, mime_type, source, _ in self.assets.values())
+
+    @property
+    def total_bytes(self):
+        return sum(size or 0 for _, _, _, size in self.assets.values())
+
+    def report(self):
+        print(f"snapshot_archive: {self.references} asset references, {len(self.assets)} distinct assets "
+              f"({self.total_bytes / 1024:.0f} KiB), {self.duplicate_bytes / 1024:.0f} KiB deduplicated")
+
+
+def write_snapshot(path, url, html_pieces, assets):
+    """Write a snapshot in the format of the AssetStore `assets`. `html_pieces` is an iterable of str."""
+    if assets.snapshot_format == "html":
+        write_html(path, html_pieces, assets)
+    elif assets.snapshot_format == "mhtml":
+        write_mhtml(path, url, html_pieces, assets)
+    else:
+        write_zip(path, html_pieces, assets)
+
+
+def write_html(path, html_pieces, assets):
+    """Write the page with the asset placeholders replaced by data URIs, encoded in chunks."""
+    pattern = re.compile(re.escape(assets.placeholder) + r"([0-9a-f]{24})")
+    with open(path, 'w', encoding='utf-8') as f:
+        for text in _buffered(html_pieces):
+            position = 0
+            for match in pattern.finditer(text):
+                f.write(text[position:match.start()])
+                _, mime_type, source, _ = assets.assets[match.group(1)]
+                f.write(f"data:{mime_type};base64,")
+                with _open(source) as data:
+                    for chunk in iter(lambda: data.read(COPY_CHUNK_SIZE), b""):
+                        f.write(base64.b64encode(chunk).decode('ascii'))
+                position = match.end()
+            f.write(text[position:])
+
+
+def write_mhtml(path, url, html_pieces, assets):
+    """
+    Write an MHTML file. The page part is located at `url`, so the relative asset paths
+    resolve to the asset parts' locations.
+    """
+    # Header values must be ASCII; percent-encoded like the browser resolves the relative
+    # asset paths, so the part locations still match the references
+    url = _header_url(url)
+    # The boundary is random, a binary part containing it by chance is not a practical concern
+    boundary = f"----MultipartBoundary--{uuid.uuid4().hex}----"
+    delimiter = f"\r\n--{boundary}\r\n".encode("ascii")
+
+    with open(path, "wb") as f:
+        f.write((f"From: <Saved by bewerbertool>\r\n"
+                 f"Snapshot-Content-Location: {url}\r\n"
+                 f"Date: {formatdate(localtime=True)}\r\n"
+                 f"MIME-Version: 1.0\r\n"
+                 f'Content-Type: multipart/related; type="text/html"; boundary="{boundary}"\r\n').encode("ascii"))
+        f.write(delimiter)
+        f.write(_part_headers("text/html; charset=utf-8", url))
+        for text in _buffered(html_pieces):
+            f.write(text.encode("utf-8"))
+        for asset_path, mime_type, source in assets:
+            f.write(delimiter)
+            f.write(_part_headers(mime_type, urljoin(url, asset_path)))
+            with _open(source) as data:
+                shutil.copyfileobj(data, f, COPY_CHUNK_SIZE)
+        f.write(f"\r\n--{boundary}--\r\n".encode("ascii"))
+
+
+def write_zip(path, html_pieces, assets):
+    """Write a zip file with index.html and the assets folder."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        with archive.open("index.html", "w") as page:
+            for text in _buffered(html_pieces):
+                page.write(text.encode("utf-8"))
+        for asset_path, mime_type, source in assets:
+            info = zipfile.ZipInfo(asset_path, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED if mime_type in STORED_TYPES else zipfile.ZIP_DEFLATED
+            with _open(source) as data, archive.open(info, "w") as target:
+                shutil.copyfileobj(data, target, COPY_CHUNK_SIZE)
+
+
+def _part_headers(content_type, location):
+    return (f"Content-Type: {content_type}\r\n"
+            f"Content-Transfer-Encoding: binary\r\n"
+            f"Content-Location: {_header_url(location)}\r\n\r\n").encode("ascii")
+
+
+def _header_url(url):
+    """Percent-encode the non-ASCII characters and spaces of a URL, keeping existing escapes."""
+    from requests.utils import requote_uri
+
+    parts = urlsplit(url)
+    if parts.hostname and not parts.hostname.isascii():
+        # Browsers IDNA-encode host names instead of percent-encoding them
+        userinfo, _, hostport = parts.netloc.rpartition("@")
+        netloc = parts.hostname.encode("idna").decode("ascii") + (f":{parts.port}" if parts.port else "")
+        parts = parts._replace(netloc=f"{userinfo}@{netloc}" if userinfo else netloc)
+    return requote_uri(urlunsplit(parts))
+
+
+def _open(source):
+    return io.BytesIO(source) if isinstance(source, bytes) else open(source, 'rb')
+
+
+def _buffered(pieces):
+    """Join small pieces of text into blocks of about WRITE_BUFFER_SIZE characters."""
+    buffer = []
+    length = 0
+    for piece in pieces:
+        buffer.append(piece)
+        length += len(piece)
+        if length >= WRITE_BUFFER_SIZE:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,189 @@
+"""
+Startup time profiling.
+
+In the application, main.py installs an ImportProfiler before importing the GUI and
+prints a report with the slowest imports and the time to the first painted frame.
+
+As a regression check, run:
+    python startup_profile.py --check     # fails if cold start got slower than the baseline
+    python startup_profile.py --update    # measure and store a new baseline
+
+The check imports the GUI module in fresh interpreters with `-X importtime`. It fails if
+one of the heavy dependencies is imported at startup again, or if the import time exceeds
+the stored baseline by more than the tolerance.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+# Dependencies that must only be imported by the stage that needs them
+HEAVY_MODULES = ("selenium", "bs4", "requests", "PyPDF2", "openai", "win32com", "pythoncom", "tiktoken", "lxml")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "startup_baseline.json")
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_RUNS = 5
+
+
+class ImportProfiler:
+    """
+    Measures how long each module takes to import.
+
+    The profiler is inserted at the front of sys.meta_path. It lets the regular finders
+    locate each module and wraps the loader to time the module's execution. The self time
+    of a module excludes the time spent importing other modules from it.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.self_times = {}
+        self._stack = []
+        self._finding = set()
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        return self
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        if name in self._finding:
+            return None
+        self._finding.add(name)
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(spec.loader, self, name)
+                    return spec
+            return None
+        finally:
+            self._finding.discard(name)
+
+    def _enter(self):
+        self._stack.append(0.0)
+
+    def _leave(self, name, elapsed):
+        children = self._stack.pop()
+        self.self_times[name] = self.self_times.get(name, 0.0) + elapsed - children
+        if self._stack:
+            self._stack[-1] += elapsed
+
+    def report(self, first_paint=None, top=10):
+        """Print the import time per top-level package and the time to the first frame."""
+        packages = {}
+        for name, seconds in self.self_times.items():
+            package = name.split(".")[0]
+            packages[package] = packages.get(package, 0.0) + seconds
+        total = sum(packages.values())
+        print(f"startup_profile: {len(self.self_times)} modules imported in {total * 1000:.0f} ms")
+        for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]:
+            print(f"  {seconds * 1000:7.1f} ms  {package}")
+        if first_paint is not None:
+            print(f"startup_profile: first frame painted after {(first_paint - self.started) * 1000:.0f} ms")
+
+
+class _TimedLoader:
+    """Wraps a loader and reports the duration of exec_module to the profiler."""
+
+    def __init__(self, loader, profiler, name):
+        self._loader = loader
+        self._profiler = profiler
+        self._name = name
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # The module must see its real loader, e.g. for importlib.resources
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._profiler._enter()
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._leave(self._name, time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+def measure_cold_import(module="gui", runs=DEFAULT_RUNS):
+    """
+    Import `module` in fresh interpreters with -X importtime.
+
+    Returns a tuple (best_total_seconds, imported_module_names) over `runs` runs.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    modules = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=here, capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+        total = 0
+        for line in result.stderr.splitlines():
+            match = re.match(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)', line)
+            if match:
+                modules.add(match.group(4))
+                # Only top level entries, their cumulative time includes the nested imports
+                if len(match.group(3)) == 1:
+                    total += int(match.group(2))
+        best = total if best is None else min(best, total)
+    return best / 1e6, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the cold start import time of the GUI.")
+    parser.add_argument("--check", action="store_true", help="Compare against the baseline and fail on regressions.")
+    parser.add_argument("--update", action="store_true", help="Store the current measurement as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown relative to the baseline (default: %(default)s).")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Number of measurements, the best one counts.")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="Path of the baseline file.")
+    args = parser.parse_args(argv)
+
+    seconds, modules = measure_cold_import(runs=args.runs)
+    heavy = sorted(name for name in modules if name.split(".")[0] in HEAVY_MODULES)
+    print(f"startup_profile: importing the GUI takes {seconds * 1000:.0f} ms (best of {args.runs})")
+
+    failed = False
+    if heavy:
+        print(f"startup_profile: FAIL heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+
+    if args.update:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"import_seconds": seconds}, f, indent=2)
+        print(f"startup_profile: baseline written to {args.baseline}")
+    elif args.check:
+        try:
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)["import_seconds"]
+        except (OSError, ValueError, KeyError):
+            print(f"startup_profile: no baseline in {args.baseline}, run with --update first")
+            return 1
+        limit = baseline * (1 + args.tolerance)
+        if seconds > limit:
+            print(f"startup_profile: FAIL cold start {seconds * 1000:.0f} ms exceeds the baseline "
+                  f"{baseline * 1000:.0f} ms by more than {args.tolerance:.0%}")
+            failed = True
+        else:
+            print(f"startup_profile: OK (baseline {baseline * 1000:.0f} ms, limit {limit * 1000:.0f} ms)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
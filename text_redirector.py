@@ -1,61 +1,139 @@
 ## text_redirector.py
 
+import logging
+import logging.handlers
+import queue
 import tkinter as tk
 
+
+class LogSink:
+    """
+    A thread-safe log sink that displays messages in a tkinter Text widget.
+
+    Tk widgets may only be touched from the Tk main thread. Messages are therefore put
+    into a queue by whatever thread writes them, and the Tk thread drains the queue on a
+    timer and inserts all pending messages at once. The widget keeps only the last
+    `max_lines` lines; optionally, everything is also written to a rotating log file.
+
+    Attributes:
+    ----------
+    text_widget : tkinter.Text
+        The Text widget where the log is displayed.
+    max_lines : int
+        The number of lines kept in the widget.
+    flush_interval_ms : int
+        Interval in which the queue is drained.
+    """
+
+    MAX_MESSAGES_PER_FLUSH = 5000
+
+    def __init__(self, text_widget, max_lines=2000, flush_interval_ms=100, log_file=None,
+                 max_file_bytes=1024 * 1024, backup_count=3):
+        self.text_widget = text_widget
+        self.max_lines = max_lines
+        self.flush_interval_ms = flush_interval_ms
+        self._queue = queue.Queue()
+        self._file_handler = None
+        if log_file:
+            try:
+                self._file_handler = logging.handlers.RotatingFileHandler(
+                    log_file, maxBytes=max_file_bytes, backupCount=backup_count, encoding="utf-8")
+                # Messages already contain their line breaks
+                self._file_handler.terminator = ""
+            except OSError as e:
+                self._queue.put(f"text_redirector.LogSink: Cannot open log file {log_file}. Error: {e}\n")
+        self._schedule()
+
+    def write(self, message):
+        """Queue a message for display. Can be called from any thread."""
+        if message:
+            self._queue.put(message)
+
+    def _schedule(self):
+        try:
+            self.text_widget.after(self.flush_interval_ms, self._drain)
+        except tk.TclError:
+            # The widget was destroyed, the application is shutting down
+            pass
+
+    def _drain(self):
+        """Insert all queued messages into the widget. Runs on the Tk thread."""
+        messages = []
+        try:
+            while len(messages) < self.MAX_MESSAGES_PER_FLUSH:
+                messages.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        if messages:
+            text = "".join(messages)
+            if self._file_handler is not None:
+                self._file_handler.emit(logging.makeLogRecord({"msg": text}))
+            try:
+                self.text_widget.insert(tk.END, text)
+                self._trim()
+                # Ensure the Text widget automatically scrolls to the latest output
+                self.text_widget.see(tk.END)
+            except tk.TclError:
+                return
+
+        self._schedule()
+
+    def _trim(self):
+        """Delete the oldest lines so the widget holds at most max_lines lines."""
+        line_count = int(self.text_widget.index("end-1c").split(".")[0])
+        excess = line_count - self.max_lines
+        if excess > 0:
+            self.text_widget.delete("1.0", f"{excess + 1}.0")
+
+    def close(self):
+        if self._file_handler is not None:
+            self._file_handler.close()
+
+
 class TextRedirector:
     """
-    A class that redirects the output of sys.stdout or sys.stderr to a tkinter Text widget.
-    
-    This class is useful when you want to capture printed output and display it in a 
+    A file-like object that redirects sys.stdout or sys.stderr to a LogSink.
+
+    This class is useful when you want to capture printed output and display it in a
     GUI text widget, such as a log or console area in a tkinter application.
-    
+
     Attributes:
     ----------
-    text_widget : tkinter.Text
-        The Text widget where the output (stdout or stderr) will be displayed.
+    sink : LogSink
+        The sink that displays the output (stdout or stderr).
     """
 
-    def __init__(self, text_widget):
+    def __init__(self, sink):
         """
         Initialize the TextRedirector instance.
-        
+
         Parameters:
         ----------
-        text_widget : tkinter.Text
-            A tkinter Text widget that will display the redirected text output.
+        sink : LogSink
+            The LogSink that will display the redirected text output.
         """
-        self.text_widget = text_widget
+        self.sink = sink
 
     def write(self, message):
         """
-        Insert a message into the tkinter Text widget.
-        
-        This method is called when text is written to sys.stdout or sys.stderr. 
-        The message is inserted into the provided tkinter Text widget, and the widget is 
-        automatically scrolled to the end so that the latest output is always visible.
-        
+        Pass a message to the sink.
+
+        This method is called when text is written to sys.stdout or sys.stderr, possibly
+        from a worker thread. The sink queues the message and displays it on the Tk thread.
+
         Parameters:
         ----------
         message : str
             The message to be displayed in the Text widget (i.e., the printed text).
         """
-        # Insert the message into the Text widget at the end (tk.END)
-        self.text_widget.insert(tk.END, message)
-        
-        # Ensure the Text widget automatically scrolls to the latest output
-        self.text_widget.see(tk.END)
+        self.sink.write(message)
 
     def flush(self):
         """
         Flush the output buffer.
-        
-        This method is typically needed in interactive environments where 
-        buffering might be used. It ensures that any remaining buffered data is 
-        written out to the widget. For most use cases, this method will be a no-op.
-        
-        Note:
-        ----
-        This method is included to conform with file-like object requirements 
-        and may not need to perform any action in this context.
+
+        This method is included to conform with file-like object requirements. The sink
+        flushes its queue on its own timer, so there is nothing to do here.
         """
         pass
@@ -0,0 +1,171 @@
+"""
+Lightweight tracing of where the time of a run goes.
+
+Code that does measurable work wraps it in a span:
+
+    with span("pdf", url=url) as s:
+        ...
+        s.add(bytes=len(data), items=page_count)
+
+Spans are collected in the Trace that is active in the current context. A run activates
+its trace with `with activate(trace):`; threads started by the pipeline and the resource
+fetcher run in a copy of the starting context, so their spans end up in the same trace.
+Without an active trace, spans only measure and are discarded.
+
+Trace.summary() formats a table per span name for the log panel, append_jsonl() appends
+the trace as one JSON line to a file for later analysis.
+"""
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Name of the trace file in the working folder
+DEFAULT_TRACE_FILE = ".traces.jsonl"
+
+_active_trace = contextvars.ContextVar("active_trace", default=None)
+
+
+class Span:
+    """
+    One measured piece of work.
+
+    Attributes:
+    ----------
+    name : str
+        What was done, e.g. 'fetch', 'render' or 'llm'. Spans with the same name are
+        summed up in the summary.
+    duration : float or None
+        Seconds, None while the span is open.
+    bytes : int
+        Bytes processed (downloaded, parsed, written).
+    items : int
+        Items processed (assets, pages, tokens).
+    attrs : dict
+        Additional details, e.g. the URL.
+    """
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.duration = None
+        self.bytes = 0
+        self.items = 0
+        self.error = None
+
+    def add(self, bytes=0, items=0, **attrs):
+        self.bytes += bytes
+        self.items += items
+        self.attrs.update(attrs)
+
+    def to_dict(self):
+        data = {"name": self.name, "duration": round(self.duration or 0.0, 4), "bytes": self.bytes,
+                "items": self.items}
+        if self.error:
+            data["error"] = self.error
+        if self.attrs:
+            data["attrs"] = self.attrs
+        return data
+
+
+class Trace:
+    """The spans of one run, collected from all its threads."""
+
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.created = datetime.now().isoformat(timespec="seconds")
+        self.started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def finish(self, **attrs):
+        self.duration = time.perf_counter() - self.started
+        self.attrs.update(attrs)
+
+    def summary(self):
+        """Return a table with count, total and maximum duration, bytes and items per span name."""
+        with self._lock:
+            spans = list(self.spans)
+        rows = {}
+        for s in spans:
+            row = rows.setdefault(s.name, {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0, "items": 0, "errors": 0})
+            row["count"] += 1
+            row["total"] += s.duration or 0.0
+            row["max"] = max(row["max"], s.duration or 0.0)
+            row["bytes"] += s.bytes
+            row["items"] += s.items
+            row["errors"] += 1 if s.error else 0
+
+        duration = f" in {self.duration:.2f}s" if self.duration is not None else ""
+        lines = [f"trace {self.name}{duration}",
+                 f"  {'span':<16} {'count':>5} {'total':>8} {'max':>8} {'bytes':>10} {'items':>6} {'errors':>6}"]
+        for name, row in sorted(rows.items(), key=lambda item: item[1]["total"], reverse=True):
+            lines.append(f"  {name:<16} {row['count']:>5} {row['total']:>7.2f}s {row['max']:>7.2f}s "
+                         f"{_format_bytes(row['bytes']):>10} {row['items'] or '-':>6} {row['errors'] or '-':>6}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        with self._lock:
+            spans = [s.to_dict() for s in self.spans]
+        return {"name": self.name, "created": self.created, "duration": round(self.duration or 0.0, 4),
+                "attrs": self.attrs, "spans": spans}
+
+
+@contextmanager
+def span(name, **attrs):
+    """Measure the enclosed block and add it to the active trace. Yields the Span."""
+    s = Span(name, attrs)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.duration = time.perf_counter() - s.started
+        trace = _active_trace.get()
+        if trace is not None:
+            trace.add(s)
+
+
+@contextmanager
+def activate(trace):
+    """Collect the spans of the enclosed block (and of threads started in it, see above) in `trace`."""
+    token = _active_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _active_trace.reset(token)
+
+
+def in_current_context(func):
+    """Wrap `func` so it runs in a copy of the current context, e.g. as a thread target."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+
+def append_jsonl(trace, path):
+    """Append the trace as one JSON line to `path`."""
+    try:
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"tracing.append_jsonl: Cannot write trace to {path}. Error: {e}")
+
+
+def _format_bytes(count):
+    if not count:
+        return "-"
+    if count < 1024:
+        return f"{count} B"
+    if count < 1024 * 1024:
+        return f"{count / 1024:.0f} KiB"
+    return f"{count / (1024 * 1024):.1f} MiB"
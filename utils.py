@@ -1,14 +1,15 @@
 ## utils.py
 import json
 import os
+import re
 import sys
-import requests
-from bs4 import BeautifulSoup
-import PyPDF2
-import requests
-from io import BytesIO
 from urllib.parse import urljoin
-from webpage_saver import fetch_rendered_page
+from webpage_saver import fetch_page, fetch_frames
+from page_cache import page_cache
+from pdf_extractor import extract_pdf_text
+from html_document import get_document
+from cancellation import CancelToken, OperationCancelled
+from content_compactor import DEFAULT_TOKEN_BUDGET, compact_sections, count_tokens, extract_main_text
 
 
 # Constants for settings and API key file names
@@ -60,65 +61,126 @@ def load_api_key_from_file():
         return None
 
 
-def extract_job_ad_from_url(url):
+def build_job_query(job_query, additional_instructions):
+    """Append the additional instructions for a single application to the saved job query."""
+    additional_instructions = "\n# Weitere zusätzliche Anweisungen: \n" + additional_instructions.strip()
+    return job_query + "\n" + additional_instructions
+
+
+def build_prompt(job_query, job_ad_content, job_ad_url):
+    """Generate a structured prompt for ChatGPT to generate a job application in Swiss German spelling."""
+    print("utils.build_prompt: Setting prompt-variable")
+    prompt = (
+        f"Du bist ein hilfreicher Assistent, der eine Bewerbung verfassen soll.\n"
+        f"Die erste Zeile deiner Antwort muss zwingend folgende Felder im TSV format (tab seperated values) enhalten:\n"
+        f"- Heutiges Datum im Format dd.mm.yyyy\n"
+        f"- Firmenname\n"
+        f"- URL der ausgeschriebenen Stelle (Job Ad URL)\n"
+        f"- Stellentitel/Job Titel\n"
+        f"- Vorname, Nachname und Email der Kontaktperson bei der Firma\n\n"
+        f"Bitte schreibe eine professionelle und überzeugende Bewerbung, die auf diese Stelle zugeschnitten ist."
+        f"\n\nBefolge ausserdem unbedingt die folgenden zusätzlichen Anweisungen:\n"
+        f"\n\n*** Zusätzliche Anweisungen***\n{job_query}"
+        f"\n\n*** Hier ist die ursprüngliche URL der Stellenauschhreibung (Job Ad UR)L**\n{job_ad_url}"
+        f"\n\n ** Hier ist der Inhalt des Inserates: (Job Ad Inhalt) **\n{job_ad_content}"
+    )
+    return re.sub(r'\n\s*\n+', '\n\n', prompt)
+
+
+def extract_meta_information(job_application):
+    """Extracts company_name and job_title from ChatGPT's job application response."""
+    print(f"utils.extract_meta_information: Extracting TSV values from GPT response.")
     try:
-        rendered_html, error = fetch_rendered_page(url)
-        if error:
-            raise RuntimeError(f"Failed to fetch job ad content from URL: {url}. Error: {error}")
-
-        soup = BeautifulSoup(rendered_html, 'html.parser')
-        main_page_content = soup.get_text()
+        # Look for the TSV output
+        tsv_match = re.search(r'(\d{2}\.\d{2}\.\d{4})\t([^\t]+)\t([^\t]+)\t([^\t]+)\t([^\t]+)', job_application)
+        if tsv_match:
+            # Extract the company name and job title from the matched TSV line
+            company_name = tsv_match.group(2).strip()
+            job_title = tsv_match.group(4).strip()
+            return company_name, job_title
+        else:
+            # Return None if not found
+            return None, None
+    except Exception as e:
+        print(f"utils.exract_meta_information: Failed to extract metadata: {str(e)}")
+        return None, None
 
-        # Find all iframe elements and attempt to fetch their content
-        iframes = soup.find_all('iframe')
-        iframe_content_list = []
 
-        for iframe in iframes:
-            iframe_src = iframe.get('src')
-            if iframe_src:
-                # Some iframe URLs might be relative, so we need to join them with the base URL
-                iframe_url = urljoin(url, iframe_src)
+def build_output_filename(company_name, job_title, extension=".html"):
+    """Construct a file name {company_name}_{job_title}{extension} without characters that are invalid in paths."""
+    filename = f"{company_name}_{job_title}{extension}".replace(' ', '_')
+    return re.sub(r'[<>:"/\\|?*%#@!&$^]', '', filename)
 
-                # Fetch iframe content
-                try:
-                    iframe_response = requests.get(iframe_url)
-                    iframe_response.raise_for_status()
-                    iframe_soup = BeautifulSoup(iframe_response.content, 'html.parser')
-                    iframe_content_list.append(iframe_soup.get_text())
-                except requests.RequestException as iframe_err:
-                    print(f"Failed to fetch iframe content from: {iframe_url}. Error: {iframe_err}")
 
-        # Combine the main page text with all iframe contents
-        full_page_text = main_page_content + "\n".join(iframe_content_list)
+def extract_job_ad_from_url(url, token_budget=DEFAULT_TOKEN_BUDGET, cancel_token=None):
+    """
+    Fetch a job ad and return a tuple (job_ad_content, rendered_html, compaction_stats).
 
-        # Find and process any linked PDFs
-        pdf_links = soup.find_all('a', href=True)
-        for link in pdf_links:
-            if link['href'].endswith('.pdf'):
-                pdf_url = urljoin(url, link['href'])
-                pdf_text = extract_text_from_pdf(pdf_url)
-                full_page_text += "\n\n" + pdf_text
+    The content combines the main page, its iframes and linked PDFs. Navigation, cookie
+    banners and other boilerplate as well as duplicated lines are removed, and the content
+    is cut to `token_budget` tokens. compaction_stats holds the token counts before and
+    after compaction. If a CancelToken is given, OperationCancelled is raised between the
+    steps once it is cancelled.
+    """
+    cancel_token = cancel_token or CancelToken()
 
-        return full_page_text, rendered_html
+    try:
+        rendered_html, error = fetch_page(url)
+        if error:
+            raise RuntimeError(f"Failed to fetch job ad content from URL: {url}. Error: {error}")
+        cancel_token.raise_if_cancelled()
+
+        cache_field = f"text:{token_budget}"
+        cached = page_cache.get(url, cache_field)
+        if cached is not None:
+            return cached["text"], rendered_html, cached["stats"]
+
+        # The parse tree is shared with the snapshot, it is only read here
+        document = get_document(url, rendered_html)
+        with document.reading() as soup:
+            main_page_content = soup.get_text()
+            main_text = extract_main_text(soup)
+            pdf_urls = [urljoin(url, link['href']) for link in soup.find_all('a', href=True)
+                        if link['href'].endswith('.pdf')]
+
+        # The iframes were captured together with the page, see frame_capture
+        iframe_content_list = []
+        iframe_raw_list = []
+        for iframe_url, iframe_html in fetch_frames(document).items():
+            cancel_token.raise_if_cancelled()
+            with get_document(iframe_url, iframe_html).reading() as iframe_soup:
+                iframe_raw_list.append(iframe_soup.get_text())
+                iframe_content_list.append(extract_main_text(iframe_soup))
 
+        # Find and process any linked PDFs
+        pdf_content_list = []
+        for pdf_url in pdf_urls:
+            cancel_token.raise_if_cancelled()
+            pdf_content_list.append(extract_text_from_pdf(pdf_url))
+
+        # Uncompacted content, as it was sent before, for the statistics
+        tokens_before = count_tokens("\n".join([main_page_content] + iframe_raw_list + pdf_content_list))
+
+        # Combine the main page text with all iframe and PDF contents, without boilerplate and duplicates
+        sections = [main_text] + iframe_content_list + pdf_content_list
+        full_page_text, stats = compact_sections(sections, token_budget)
+        stats["tokens_before"] = tokens_before
+        print(f"utils.extract_job_ad_from_url: compacted job ad from {tokens_before} to {stats['tokens_after']} tokens "
+              f"({stats['duplicate_lines']} duplicate lines removed{', truncated' if stats['truncated'] else ''})")
+
+        page_cache.put(url, cache_field, {"text": full_page_text, "stats": stats})
+        return full_page_text, rendered_html, stats
+
+    except OperationCancelled:
+        raise
     except Exception as e:
         raise RuntimeError(f"Failed to fetch job ad content from URL: {url}. Error: {str(e)}")
 
 
 def extract_text_from_pdf(url):
-    try:
-        # Fetch the PDF file
-        response = requests.get(url)
-        response.raise_for_status()  # Check if the request was successful
-
-        # Read the PDF content using PyPDF2
-        with BytesIO(response.content) as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text()
-
-        return text
+    import requests
 
+    try:
+        return extract_pdf_text(url)
     except requests.RequestException as e:
         raise RuntimeError(f"Failed to fetch PDF content from URL: {url}. Error: {str(e)}")
@@ -1,18 +1,37 @@
 # webpage_saver.py
-import time
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
-from bs4 import BeautifulSoup
+# selenium and requests are imported in the functions that need them, so that
+# importing this module does not slow down the start of the GUI.
+import atexit
 import base64
 from urllib.parse import urljoin
 import os
 import re
 import sys
-import PyPDF2
-import requests
-from io import BytesIO
+import threading
+import time
+from browser_pool import BrowserPool
+from page_settle import wait_for_page_settled
+from page_cache import page_cache
+from resource_fetcher import ResourceFetcher, HTTP_TIMEOUT
+from asset_cache import asset_cache
+from pdf_extractor import extract_pdf_text
+from fetch_policy import fetch_policy, assess_static_html, STATIC_PATH
+from html_document import take_document
+from frame_capture import capture_frames, collect_frames, frame_key
+from snapshot_archive import AssetStore, DEFAULT_FORMAT, SNAPSHOT_FORMATS, write_snapshot
+from tracing import span
+
+# Seconds until the browser gives up loading a page
+PAGE_LOAD_TIMEOUT = 60
+# Static fetches identify as a regular browser, some job boards send a reduced page otherwise
+STATIC_FETCH_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/120.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+}
+
+_static_session = None
+_static_session_lock = threading.Lock()
 
 
 def resource_path(relative_path):
@@ -25,67 +44,251 @@ def resource_path(relative_path):
 
     return os.path.join(base_path, relative_path)
 
+def create_chrome_driver():
+    """Launch a new headless Chrome instance."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")  # Headless mode
+    chrome_options.add_argument("--disable-gpu")  # Optional, disable GPU acceleration
+
+    chromedriver_path = resource_path(os.path.join("static", "chromedriver.exe"))
+
+    driver = webdriver.Chrome(service=Service(chromedriver_path), options=chrome_options)
+    # driver.get() raises a TimeoutException instead of waiting forever for a hung page
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    return driver
+
+
+# Warm browser sessions shared by all fetches of this process
+browser_pool = BrowserPool(create_chrome_driver, max_size=2, max_pages=25)
+atexit.register(browser_pool.close)
+
+
+def fetch_page(url):
+    """
+    Return the HTML of `url` as a tuple (html, error).
+
+    A plain HTTP request is tried first if the fetch policy allows it for the domain. If
+    the static result looks incomplete (see fetch_policy.assess_static_html), the page is
+    rendered in the browser. The outcome and the time are recorded in the fetch policy.
+    """
+    rendered_html = page_cache.get(url, "rendered_html")
+    if rendered_html is not None:
+        return rendered_html, None
+
+    if fetch_policy.choose(url) == STATIC_PATH:
+        start = time.monotonic()
+        with span("fetch", url=url) as fetch_span:
+            try:
+                static_html = fetch_static_page(url)
+                complete, reason = assess_static_html(static_html) if static_html else (False, "not HTML")
+            except Exception as e:
+                static_html, complete, reason = None, False, f"static fetch failed: {e}"
+            fetch_span.add(bytes=len(static_html or ""), complete=complete)
+        elapsed = time.monotonic() - start
+        fetch_policy.record_static(url, elapsed, complete, reason)
+        if complete:
+            print(f"webpage_saver.fetch_page: static fetch of {url} in {elapsed:.2f}s ({reason})")
+            page_cache.put(url, "rendered_html", static_html)
+            return static_html, None
+        print(f"webpage_saver.fetch_page: static result of {url} incomplete ({reason}), using the browser")
+
+    start = time.monotonic()
+    rendered_html, error = _render_page(url)
+    if rendered_html is not None:
+        fetch_policy.record_browser(url, time.monotonic() - start)
+    return rendered_html, error
+
+
+def fetch_static_page(url):
+    """Fetch `url` with a plain HTTP request. Returns the HTML, or None if the response is not HTML."""
+    response = _get_static_session().get(url, headers=STATIC_FETCH_HEADERS, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    if "html" not in response.headers.get("Content-Type", ""):
+        return None
+    return response.text
+
+
+def _get_static_session():
+    global _static_session
+    with _static_session_lock:
+        if _static_session is None:
+            import requests
+            _static_session = requests.Session()
+        return _static_session
+
+
 def fetch_rendered_page(url):
+    """Render `url` in a pooled browser session. Returns a tuple (html, error)."""
+    rendered_html = page_cache.get(url, "rendered_html")
+    if rendered_html is not None:
+        return rendered_html, None
+    return _render_page(url)
+
+
+def _render_page(url):
     try:
-        # Launch a headless browser instance using pyppeteer
-        print("webpage_saver.fetch_rendered_page: launching headless browser")
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")  # Headless mode
-        chrome_options.add_argument("--disable-gpu")  # Optional, disable GPU acceleration
-
-        chromedriver_path = resource_path(os.path.join("static", "chromedriver.exe"))
-
-        driver = webdriver.Chrome(service=Service(chromedriver_path), options=chrome_options)
-
-        print(f"webpage_saver.fetch_rendered_page: Loading {url}")
-        # Öffne die URL
-        driver.get(url)
-        time.sleep(1)
-        rendered_html = driver.page_source
-        driver.quit()
-    
-        print("webpage_saver.fetch_rendered_page: returning content")
+        print("webpage_saver.fetch_rendered_page: leasing browser session")
+        with span("render", url=url) as render_span, browser_pool.lease() as driver:
+            print(f"webpage_saver.fetch_rendered_page: Loading {url}")
+            # Öffne die URL
+            driver.get(url)
+            wait_for_page_settled(driver)
+            rendered_html = driver.page_source
+            render_span.add(bytes=len(rendered_html))
+            # The iframes are read from this session now, no new browser is started for them
+            frames = capture_frames(driver, url)
+
+        page_cache.put(url, "rendered_html", rendered_html)
+        page_cache.put(url, "frames", frames)
+        print(f"webpage_saver.fetch_rendered_page: returning content, browser pool: {browser_pool.stats()}")
         return rendered_html, None
-    
+
     except Exception as e:
         # Return None and the error message if an exception occurs
         return None, f"Error fetching rendered page: {e}"
 
 
-def inline_css_resources(css_content, css_base_url):
-    # Regular expression to find all url(...) patterns in the CSS
-    url_pattern = re.compile(r'url\(([^)]+)\)')
-    # Find all matches of the pattern
-    matches = url_pattern.findall(css_content)
-    for url in matches:
-        # Clean up the URL by removing quotes and whitespace
-        url = url.strip('\'" \n\t\r')
+def fetch_frames(document):
+    """
+    Return the iframes of a page fetched with fetch_page as a dict {iframe URL: HTML}.
+
+    Frames of rendered pages were captured in the same browser session, see
+    frame_capture. For pages fetched without the browser, the frames are fetched with
+    plain HTTP requests.
+    """
+    frames = page_cache.get(document.url, "frames")
+    if frames is None:
+        frames = collect_frames(document, _fetch_static_frame)
+        page_cache.put(document.url, "frames", frames)
+    return frames
+
+
+def _fetch_static_frame(url):
+    try:
+        return fetch_static_page(url)
+    except Exception as e:
+        print(f"webpage_saver.fetch_frames: Failed to fetch iframe content: {url}. Error: {e}")
+        return None
+
+
+# Tokens of a stylesheet that reference other resources. Comments are matched too, so
+# that url(...) and @import inside a comment are left untouched.
+CSS_TOKEN_PATTERN = re.compile(
+    r'(?P<comment>/\*.*?\*/)'
+    r'|@import\s+(?:url\(\s*(?P<iq>[\'"]?)(?P<import_url>.*?)(?P=iq)\s*\)|(?P<sq>[\'"])(?P<import_str>.*?)(?P=sq))(?P<media>[^;]*);'
+    r'|url\(\s*(?P<q>[\'"]?)(?P<url>.*?)(?P=q)\s*\)',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def asset_uri(result, mime_type, assets=None):
+    """Return a data URI for a fetched asset, or its reference in the AssetStore `assets`."""
+    if assets is not None:
+        # The body stays where the fetcher put it, see snapshot_archive
+        return assets.add(result.path or result.content, mime_type, result.digest, result.size)
+    # Encode the content in base64 and create a data URI
+    encoded = base64.b64encode(result.content).decode('utf-8')
+    return f'data:{mime_type};base64,{encoded}'
+
+
+def inline_css_resources(css_content, css_base_url, fetcher, assets=None, _import_chain=()):
+    """
+    Replace every url(...) in a stylesheet by a data URI and inline @import'ed stylesheets.
+
+    The stylesheet is tokenized once and rewritten in a single pass. Each distinct URL is
+    fetched and encoded only once, and @import cycles are detected via the chain of
+    stylesheets currently being inlined. With an AssetStore, url(...) references the
+    stored asset instead of a data URI.
+    """
+    import_chain = _import_chain + (css_base_url,)
+    matches = list(CSS_TOKEN_PATTERN.finditer(css_content))
+
+    # Start downloading all referenced resources and imports in parallel
+    urls = set()
+    for match in matches:
+        url = match.group('url') or match.group('import_url') or match.group('import_str')
+        if url and not url.strip().startswith(('data:', '#')):
+            urls.add(urljoin(css_base_url, url.strip()))
+    fetcher.prefetch(urls)
+
+    data_uris = {}
+
+    def replace_token(match):
+        if match.group('comment'):
+            return match.group(0)
+
+        import_url = match.group('import_url') or match.group('import_str')
+        if import_url:
+            full_url = urljoin(css_base_url, import_url.strip())
+            if full_url in import_chain:
+                print(f"Skipping cyclic CSS import: {full_url}")
+                return ''
+            res = fetcher.get(full_url)
+            if not res.ok:
+                print(f"Failed to fetch CSS import: {full_url}")
+                return match.group(0)
+            imported_css = inline_css_resources(res.text, full_url, fetcher, assets, import_chain)
+            media = match.group('media').strip()
+            return f'@media {media} {{\n{imported_css}\n}}' if media else imported_css
+
+        url = (match.group('url') or '').strip()
+        if not url or url.startswith(('data:', '#')):
+            return match.group(0)
         # Resolve the full URL relative to the CSS base URL
         full_url = urljoin(css_base_url, url)
-        try:
-            # Fetch the resource synchronously using requests
-            res = requests.get(full_url)
-            res.raise_for_status()  # Ensure the request was successful
-            # Get the MIME type from the response headers
-            mime_type = res.headers.get('Content-Type', 'application/octet-stream')
-            # Read the content of the resource
-            content = res.content
-            # Encode the content in base64
-            encoded = base64.b64encode(content).decode('utf-8')
-            # Create a data URI with the MIME type and encoded content
-            data_uri = f'data:{mime_type};base64,{encoded}'
-            # Replace the original URL in the CSS with the data URI
-            original_url_pattern = re.compile(re.escape(f'url({url})'))
-            css_content = original_url_pattern.sub(f'url({data_uri})', css_content)
-        except requests.RequestException:
-            # Print a message if the resource cannot be fetched
-            print(f"Failed to fetch CSS resource: {full_url}")
-    return css_content
-
-
-def inline_resources(html_content, base_url):
-    # Parse the HTML content using BeautifulSoup
-    soup = BeautifulSoup(html_content, 'html.parser')
+        if full_url not in data_uris:
+            # Wait for the resource fetched in the background
+            res = fetcher.get(full_url)
+            if res.ok:
+                # Get the MIME type from the response headers
+                mime_type = res.content_type if res.content_type is not None else 'application/octet-stream'
+                data_uris[full_url] = asset_uri(res, mime_type, assets)
+            else:
+                # Print a message if the resource cannot be fetched
+                print(f"Failed to fetch CSS resource: {full_url}")
+                data_uris[full_url] = None
+        data_uri = data_uris[full_url]
+        return f'url({data_uri})' if data_uri else match.group(0)
+
+    return CSS_TOKEN_PATTERN.sub(replace_token, css_content)
+
+
+def inline_resources(html_content, base_url, fetcher=None):
+    """Return `html_content` with stylesheets, images, iframes and PDFs inlined."""
+    return inline_document(take_document(base_url, html_content), fetcher).serialize()
+
+
+def inline_document(document, fetcher=None, frames=None, assets=None, _frame_chain=()):
+    """
+    Inline the resources of an HtmlDocument into its parse tree. Returns the document.
+
+    Iframes are replaced by the content from `frames` (see fetch_frames, looked up if not
+    given), a frame embedded twice is inlined twice. Iframes without captured content are
+    removed, so the snapshot loads nothing from the web; a frame that contains itself is
+    replaced by a link to it. Images and the assets of stylesheets become
+    data URIs, or references to the AssetStore `assets`, whose spool directory then
+    receives the downloads.
+    """
+    if frames is None:
+        frames = fetch_frames(document)
+
+    # The outermost call owns the fetcher; iframes reuse it so connections are shared
+    if fetcher is None:
+        spool_dir = assets.spool_dir if assets is not None else None
+        with span("inline", url=document.url) as inline_span, \
+                ResourceFetcher(asset_cache=asset_cache, spool_dir=spool_dir) as fetcher:
+            inline_document(document, fetcher, frames, assets, (frame_key(document.url),))
+            fetcher.report()
+            asset_count, failed, total_bytes = fetcher.totals()
+            inline_span.add(bytes=total_bytes, items=asset_count, failed=failed)
+        return document
+
+    soup = document.soup
+    base_url = document.url
 
     # Remove <div> elements with specific IDs
     for id_to_remove in ['cmpbox', 'cmpbox2']:
@@ -98,69 +301,80 @@ def inline_resources(html_content, base_url):
     for script_tag in soup.find_all('script'):
         script_tag.decompose()
 
+    # The asset paths of an archive are relative to the page, a <base> tag would redirect them
+    if assets is not None:
+        for base_tag in soup.find_all('base'):
+            base_tag.decompose()
+
+    # Start downloading all stylesheets and images in parallel
+    link_tags = soup.find_all('link', rel='stylesheet')
+    img_tags = soup.find_all('img')
+    fetcher.prefetch(urljoin(base_url, tag.get('href')) for tag in link_tags if tag.get('href'))
+    fetcher.prefetch(urljoin(base_url, tag.get('src')) for tag in img_tags if tag.get('src'))
+
     # Inline external CSS files
-    for link_tag in soup.find_all('link', rel='stylesheet'):
+    for link_tag in link_tags:
         href = link_tag.get('href')
         if href:
             # Resolve the full URL of the CSS file
             css_url = urljoin(base_url, href)
-            try:
-                # Fetch the CSS file synchronously using requests
-                css_response = requests.get(css_url)
-                css_response.raise_for_status()
-                # Read the CSS content
-                css_content = css_response.text
-                # Inline any resources referenced within the CSS content
-                css_content = inline_css_resources(css_content, css_url)
-                # Create a new <style> tag with the inlined CSS content
-                new_tag = soup.new_tag('style')
-                new_tag.string = css_content
-                # Replace the original <link> tag with the new <style> tag
-                link_tag.replace_with(new_tag)
-            except requests.RequestException:
+            # Wait for the CSS file fetched in the background
+            css_response = fetcher.get(css_url)
+            if not css_response.ok:
                 # Print a message if the CSS file cannot be fetched
                 print(f"Failed to fetch CSS: {css_url}")
+                continue
+            # Inline any resources referenced within the CSS content
+            css_content = inline_css_resources(css_response.text, css_url, fetcher, assets)
+            # Create a new <style> tag with the inlined CSS content
+            new_tag = soup.new_tag('style')
+            new_tag.string = css_content
+            # Replace the original <link> tag with the new <style> tag
+            link_tag.replace_with(new_tag)
 
     # Inline <img> tags by converting their sources to data URIs
-    for img_tag in soup.find_all('img'):
+    for img_tag in img_tags:
         src = img_tag.get('src')
         if src:
             # Resolve the full URL of the image
             img_url = urljoin(base_url, src)
-            try:
-                # Fetch the image synchronously using requests
-                img_response = requests.get(img_url)
-                img_response.raise_for_status()
-                # Get the MIME type from the response headers
-                mime_type = img_response.headers.get('Content-Type', 'image/png')
-                # Read the image content
-                content = img_response.content
-                # Encode the image content in base64
-                encoded_string = base64.b64encode(content).decode('utf-8')
-                # Set the 'src' attribute to the data URI
-                img_tag['src'] = f'data:{mime_type};base64,{encoded_string}'
-            except requests.RequestException:
+            # Wait for the image fetched in the background
+            img_response = fetcher.get(img_url)
+            if not img_response.ok:
                 # Print a message if the image cannot be fetched
                 print(f"Failed to fetch Image: {img_url}")
+                continue
+            # Get the MIME type from the response headers
+            mime_type = img_response.content_type or 'image/png'
+            # Set the 'src' attribute to the data URI or the stored asset
+            img_tag['src'] = asset_uri(img_response, mime_type, assets)
 
-    # Inline iframe content by fetching and processing it recursively
+    # Inline the captured iframe content, processing it recursively
     for iframe_tag in soup.find_all('iframe'):
         src = iframe_tag.get('src')
         if src:
-            # Resolve the full URL of the iframe
-            iframe_url = urljoin(base_url, src)
+            # Resolve the full URL of the iframe, normalized like the keys of `frames`
+            iframe_url = frame_key(urljoin(base_url, src))
+            iframe_content = frames.get(iframe_url)
+            if iframe_content is None:
+                # Not captured (depth limit, denied origin, failed)
+                iframe_tag.decompose()
+                continue
+            if iframe_url in _frame_chain:
+                # The frame contains itself, inlining it again would not end
+                placeholder = soup.new_tag('div')
+                link = soup.new_tag('a', href=iframe_url)
+                link.string = iframe_url
+                placeholder.append(link)
+                iframe_tag.replace_with(placeholder)
+                continue
             try:
-                # Fetch the rendered content of the iframe
-                iframe_content, error = fetch_rendered_page(iframe_url)
-                if error:
-                    # Print an error message if fetching fails
-                    print(f"Failed to fetch iframe content: {iframe_url}. Error: {error}")
-                    continue
                 # Process the iframe content to inline its resources
-                inlined_iframe_content = inline_resources(iframe_content, iframe_url)
-                # Create a new <div> tag with the inlined iframe content
+                iframe_document = inline_document(take_document(iframe_url, iframe_content), fetcher, frames,
+                                                  assets, _frame_chain + (iframe_url,))
+                # Create a new <div> tag with the inlined iframe content, the parsed tree is moved over
                 new_tag = soup.new_tag('div')
-                new_tag.append(BeautifulSoup(inlined_iframe_content, 'html.parser'))
+                new_tag.append(iframe_document.soup)
                 # Replace the original <iframe> tag with the new <div> tag
                 iframe_tag.replace_with(new_tag)
             except Exception as e:
@@ -185,40 +399,30 @@ def inline_resources(html_content, base_url):
                 # Remove the style attribute if empty
                 del body_tag['style']
 
-    # Inline PDF content
-    for a_tag in soup.find_all('a', href=True):
-        href = a_tag['href']
-        if href.endswith('.pdf'):
-            pdf_url = urljoin(base_url, href)
-            try:
-                # Extrahiere den PDF-Text und füge ihn in die HTML ein
-                pdf_text = extract_text_from_pdf(pdf_url)
-                # Erstelle ein neues <div>-Tag für den PDF-Inhalt
-                new_tag = soup.new_tag('div')
-                new_tag.string = f"PDF-Inhalt von {pdf_url}:\n\n{pdf_text}"
-                # Füge den PDF-Inhalt direkt nach dem <a>-Tag ein
-                a_tag.insert_after(new_tag)
-            except Exception as e:
-                print(f"Failed to fetch PDF content from: {pdf_url}. Error: {e}")
+    # Inline PDF content, the PDFs are downloaded and parsed in parallel
+    pdf_links = [a_tag for a_tag in soup.find_all('a', href=True) if a_tag['href'].endswith('.pdf')]
+    pdf_jobs = [fetcher.submit(extract_text_from_pdf, urljoin(base_url, a_tag['href'])) for a_tag in pdf_links]
+    for a_tag, pdf_job in zip(pdf_links, pdf_jobs):
+        pdf_url = urljoin(base_url, a_tag['href'])
+        try:
+            # Extrahiere den PDF-Text und füge ihn in die HTML ein
+            pdf_text = pdf_job.result()
+            # Erstelle ein neues <div>-Tag für den PDF-Inhalt
+            new_tag = soup.new_tag('div')
+            new_tag.string = f"PDF-Inhalt von {pdf_url}:\n\n{pdf_text}"
+            # Füge den PDF-Inhalt direkt nach dem <a>-Tag ein
+            a_tag.insert_after(new_tag)
+        except Exception as e:
+            print(f"Failed to fetch PDF content from: {pdf_url}. Error: {e}")
 
-    # Return the modified HTML content as a string
-    return str(soup)
+    return document
 
 
 def extract_text_from_pdf(pdf_url):
+    import requests
+
     try:
-        # Download the PDF content
-        response = requests.get(pdf_url)
-        response.raise_for_status()
-
-        # Load the PDF content into PyPDF2
-        with BytesIO(response.content) as pdf_file:
-            reader = PyPDF2.PdfReader(pdf_file)
-            text = ""
-            # Extract text from each page
-            for page in reader.pages:
-                text += page.extract_text()
-        return text
+        return extract_pdf_text(pdf_url)
 
     except requests.RequestException as e:
         print(f"Failed to download PDF from {pdf_url}. Error: {e}")
@@ -229,18 +433,37 @@ def extract_text_from_pdf(pdf_url):
         return "Error: Could not process PDF."
 
 
-def save_webpage(url, output_file):
+def save_webpage(url, output_file, cancel_token=None, snapshot_format=DEFAULT_FORMAT):
+    """
+    Save the rendered page with all resources inlined as `output_file`.
+
+    `snapshot_format` is 'html' (one file with data URIs) or an archive format of
+    snapshot_archive ('mhtml', 'zip') that stores every distinct asset once. Assets are
+    downloaded to temporary files and written to `output_file` in chunks, see
+    snapshot_archive.
+
+    Returns a tuple (success, error). If `cancel_token` is cancelled before the file is
+    written, nothing is written and the error says so.
+    """
+    if snapshot_format not in SNAPSHOT_FORMATS:
+        return False, f"Unknown snapshot format '{snapshot_format}'."
     try:
-        rendered_html, error = fetch_rendered_page(url)
+        rendered_html, error = fetch_page(url)
         if error:
             return False, error
-        
-        # Process the HTML content to inline resources
-        rendered_html = inline_resources(rendered_html, url)
+        if cancel_token is not None and cancel_token.cancelled:
+            return False, "Snapshot cancelled."
 
-        # Write the processed HTML content to the specified output file
-        with open(output_file, 'w', encoding='utf-8') as file:
-            file.write(rendered_html)
+        with AssetStore(snapshot_format) as assets:
+            # Process the HTML content to inline resources, reusing the tree parsed for the text extraction
+            document = inline_document(take_document(url, rendered_html), assets=assets)
+            if cancel_token is not None and cancel_token.cancelled:
+                return False, "Snapshot cancelled."
+            assets.report()
+            with span("write", path=output_file, format=snapshot_format) as write_span:
+                # Serialize the tree and the assets straight into the output file
+                write_snapshot(output_file, url, document.iter_serialize(), assets)
+                write_span.add(bytes=os.path.getsize(output_file), items=len(assets.assets))
         # Return success
         return True, None
 
@@ -0,0 +1,96 @@
+import os
+import zipfile
+
+from docx_template import SUPPORTED_EXTENSIONS, template_cache
+from tracing import span
+
+PLACEHOLDER = "[BEWERBUNGSTEXT]"
+
+
+def create_word_document(word_template, word_docx_path, generated_text, placeholder=PLACEHOLDER):
+    """
+    Create a Word document from `word_template`, replace the placeholder with the generated
+    text and save it as `word_docx_path`.
+
+    .docx and .dotx templates are rendered directly from the OOXML package, other
+    templates (e.g. .dot or .doc) are rendered by Word over COM.
+
+    Returns a tuple (success, error) like save_webpage.
+    """
+    native = os.path.splitext(word_template)[1].lower() in SUPPORTED_EXTENSIONS
+    with span("word", template=word_template, renderer="native" if native else "com") as word_span:
+        if native:
+            success, error = render_word_document(word_template, word_docx_path, generated_text, placeholder)
+        else:
+            success, error = create_word_document_com(word_template, word_docx_path, generated_text, placeholder)
+        if success:
+            word_span.add(bytes=os.path.getsize(word_docx_path))
+        else:
+            word_span.error = error
+    return success, error
+
+
+def render_word_document(word_template, word_docx_path, generated_text, placeholder=PLACEHOLDER):
+    """Render the document from the cached template without Word. Returns a tuple (success, error)."""
+    try:
+        template = template_cache.get(word_template, placeholder)
+        if not template.render(word_docx_path, generated_text):
+            print(f"word_document.render_word_document: Placeholder '{placeholder}' not found.")
+        print(f"word_document.render_word_document: Word document created: {word_docx_path}")
+        return True, None
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+        return False, f"Error creating Word document: {str(e)}"
+
+
+def create_word_document_com(word_template, word_docx_path, generated_text, placeholder=PLACEHOLDER):
+    """Create the document with Word over COM (Windows only). Returns a tuple (success, error)."""
+    # Imported here, starting the GUI does not need Word
+    import pythoncom
+    import win32com.client as win32  # Für die Interaktion mit Word
+
+    pythoncom.CoInitialize()
+    word_app = None
+    try:
+        print("word_document.create_word_document_com: Trying to generate word document.")
+        word_app = win32.Dispatch("Word.Application")
+        word_app.Visible = False  # Word im Hintergrund starten
+
+        doc = word_app.Documents.Add(word_template)
+
+        print("word_document.create_word_document_com: Trying to Replace placeholder text in word document with ChatGPT's text.")
+        if not replace_placeholder_in_word(doc, placeholder, generated_text):
+            print(f"word_document.create_word_document_com: Placeholder '{placeholder}' not found.")
+
+        doc.SaveAs(word_docx_path)
+        doc.Close()
+
+        print(f"word_document.create_word_document_com: Word document created: {word_docx_path}")
+        return True, None
+
+    except Exception as e:
+        return False, f"Error creating Word document: {str(e)}"
+    finally:
+        if word_app is not None:
+            word_app.Quit()
+        pythoncom.CoUninitialize()
+
+
+def replace_placeholder_in_word(doc, placeholder, replacement_text):
+    """Replaces the placeholder text in a Word document with the given replacement text. Returns False if it is missing."""
+    # Suche im gesamten Dokument nach dem Platzhalter
+    find = doc.Content.Find
+    find.Text = placeholder
+
+    # Entferne den Platzhalter [BEWERBUNGSTEXT], wenn er gefunden wurde
+    find.Execute(Replace=0)  # wdReplaceNone = 0
+
+    # Füge den generierten Text an der Position des Platzhalters ein
+    if not find.Found:
+        return False
+    range_obj = find.Parent
+    # Lösche den Platzhalter
+    range_obj.Text = ""
+    # Füge den generierten Text in Abschnitten ein, um Längenbeschränkungen zu vermeiden
+    for paragraph in replacement_text.split("\n"):
+        range_obj.InsertAfter(paragraph + "\n")
+    return True